@@ -0,0 +1,95 @@
+# Headless batch runner
+# Runs jobs on a process pool, each in its own console, and streams per-job results back as they
+# finish. A job is one ROM run for a number of frames or CPU cycles, with an optional input script.
+# Consoles run with frame skip and draw nothing, results only depend on the emulated state.
+import argparse
+import concurrent.futures
+import hashlib
+import time
+
+import cpu
+import nes
+import rom
+import scheduler
+
+STOP_ERROR = 'error'
+
+class Job:
+	# rom is a path or a buffer holding the image. pc overrides the reset vector, nestest starts
+	# its automated mode at $C000. script is a sequence of (frame, address, value) writes made
+	# before that frame runs, the console has no controller ports so input is poked into memory.
+	def __init__(self, rom, frames=None, cycles=None, script=(), pc=None, name=None):
+		if (frames is None) == (cycles is None):
+			raise Exception('Job needs either frames or cycles')
+		self.rom = rom
+		self.frames = frames
+		self.cycles = cycles
+		self.script = sorted(script)
+		self.pc = pc
+		self.name = name if name is not None else rom if isinstance(rom, str) else 'job'
+
+class Result:
+	def __init__(self, job, reason, stateHash=None, cycles=0, frames=0, elapsed=0.0, error=None):
+		self.job = job
+		self.reason = reason
+		# sha1 of the final save state
+		self.stateHash = stateHash
+		self.cycles = cycles
+		self.frames = frames
+		self.elapsed = elapsed
+		self.error = error
+
+	def __repr__(self):
+		return '{} {} {} cycles:{} frames:{} {:.3f}s{}'.format(self.job.name, self.reason, self.stateHash, self.cycles,
+			self.frames, self.elapsed, ' ' + self.error if self.error else '')
+
+# run a single job in this process
+def runJob(job):
+	start = time.perf_counter()
+	frames = 0
+	try:
+		console = nes.NES(rom.ROM(job.rom), renderInterval=0)
+		processor = console.cpu
+		processor.PC = job.pc if job.pc is not None else processor.memory.read16(0xFFFC)
+		if job.cycles is not None:
+			for frame, address, value in job.script:
+				processor.memory.write(address, value)
+			reason = processor.run(max_cycles=job.cycles)
+		else:
+			script = iter(job.script)
+			poke = next(script, None)
+			reason = cpu.STOP_CYCLES
+			while frames < job.frames and reason == cpu.STOP_CYCLES:
+				while poke is not None and poke[0] <= frames:
+					processor.memory.write(poke[1], poke[2])
+					poke = next(script, None)
+				reason = console.runFrame()
+				frames += 1
+		stateHash = hashlib.sha1(console.saveState()).hexdigest()
+		return Result(job, reason, stateHash, processor.cycles // scheduler.DOTS_PER_CPU_CYCLE, frames, time.perf_counter() - start)
+	except Exception as error:
+		return Result(job, STOP_ERROR, frames=frames, elapsed=time.perf_counter() - start, error=str(error))
+
+# run jobs on a pool of worker processes, yields results in completion order
+def runBatch(jobs, workers=None):
+	with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+		futures = [pool.submit(runJob, job) for job in jobs]
+		for future in concurrent.futures.as_completed(futures):
+			yield future.result()
+
+def main():
+	parser = argparse.ArgumentParser(description='Run ROMs headless on a process pool')
+	parser.add_argument('roms', nargs='+')
+	parser.add_argument('--frames', type=int)
+	parser.add_argument('--cycles', type=int)
+	parser.add_argument('--pc', type=lambda value: int(value, 0))
+	parser.add_argument('--workers', type=int)
+	args = parser.parse_args()
+	if args.frames is None and args.cycles is None:
+		args.frames = 60
+	jobs = [Job(path, args.frames, args.cycles, pc=args.pc) for path in args.roms]
+	for result in runBatch(jobs, args.workers):
+		print(result)
+
+if __name__ == '__main__':
+	main()
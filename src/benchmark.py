@@ -0,0 +1,268 @@
+# Throughput benchmarks
+# Times the nestest run with tracing on and off, every opcode in CPU.instructions and every
+# addressing mode on their own, and PPU frame rendering. Results are JSON and can be compared
+# with a baseline file, flagging metrics that got worse by more than a threshold so performance
+# changes can be gated. Single micro benchmarks are too noisy to gate on, so the gate is the
+# geometric mean of each suite's speedups. The baseline of the reference machine is kept in
+# BASELINE, --check compares with it and exits with 1 when a suite regressed, --output with the
+# default options refreshes it after a deliberate change:
+#   python benchmark.py --check
+#   python benchmark.py --output benchmarks/baseline.json
+#   python benchmark.py --baseline other.json --threshold 0.1
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+import addressing
+import cpu
+import nes
+import ppu
+import scheduler
+
+VERSION = 1
+
+NESTEST_START = 0xC000
+
+DOTS_PER_FRAME = ppu.DOTS_PER_SCANLINE * ppu.SCANLINES
+
+# whether a larger value of a metric is better
+METRICS = {
+	'instructions_per_second': True,
+	'cycles_per_second': True,
+	'seconds_per_frame': False,
+	'ns_per_instruction': False,
+	'ns_per_access': False,
+}
+
+SUITES = ('nestest', 'opcodes', 'modes', 'ppu')
+
+# committed results of the reference machine, the default of --check
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+# operand bytes for the micro benchmarks, $10 in zero page points at $0300
+CODE = 0x0200
+OPERANDS = (0x10, 0x03)
+POINTER = 0x10
+
+def rates(instructions, dots, elapsed):
+	return {
+		'instructions_per_second': instructions / elapsed,
+		'cycles_per_second': (dots // scheduler.DOTS_PER_CPU_CYCLE) / elapsed,
+		'seconds_per_frame': elapsed / (dots / DOTS_PER_FRAME),
+	}
+
+# the nestest automated run from $C000 to its first unmapped opcode, best of repeat runs. With
+# tracing off the cold run includes translating every block, the warm run reruns from a save
+# state with the blocks cached.
+def nestest(repeat=3):
+	instructions = tracedCount()
+	results = {}
+	for name, debug, warm in (('nestest.traced', True, False), ('nestest.untraced', False, False),
+	                          ('nestest.untraced.warm', False, True)):
+		best = None
+		for i in range(repeat):
+			processor = cpu.CPU()
+			processor.PC = NESTEST_START
+			if warm:
+				state = processor.saveState()
+				processor.debug = False
+				processor.run()
+				processor.loadState(state)
+			processor.debug = debug
+			start = time.perf_counter()
+			processor.run()
+			elapsed = time.perf_counter() - start
+			best = elapsed if best is None else min(best, elapsed)
+		results[name] = best, processor.cycles
+	return {name: rates(instructions, cycles, elapsed) for name, (elapsed, cycles) in results.items()}
+
+# the number of instructions the run executes is only known from the trace
+def tracedCount():
+	processor = cpu.CPU()
+	processor.PC = NESTEST_START
+	processor.run()
+	return processor.trace.count
+
+def microCPU():
+	processor = cpu.CPU()
+	processor.debug = False
+	memory = processor.memory
+	memory.write(CODE + 1, OPERANDS[0])
+	memory.write(CODE + 2, OPERANDS[1])
+	memory.write(POINTER, 0x00)
+	memory.write(POINTER + 1, 0x03)
+	return processor
+
+# fastest of repeat timings of function, in seconds. The micro benchmarks are short enough that
+# a single timing is too noisy to compare with a baseline.
+def best(function, repeat):
+	timings = []
+	for i in range(repeat):
+		start = time.perf_counter()
+		function()
+		timings.append(time.perf_counter() - start)
+	return min(timings)
+
+# each opcode fetched and executed on its own from the same state, the time includes resetting PC and SP
+def opcodes(iterations=2000, repeat=3):
+	processor = microCPU()
+	results = {}
+	fetch = processor.fetch
+	def execute():
+		for i in range(iterations):
+			processor.PC = CODE
+			processor.SP = 0x01FF
+			fetch()
+	for opcode in sorted(processor.instructions):
+		processor.memory.write(CODE, opcode)
+		name = processor.instructions[opcode][0].__name__.lstrip('_')
+		elapsed = best(execute, repeat)
+		results['opcode.{:02X}.{}'.format(opcode, name)] = {'ns_per_instruction': elapsed / iterations * 1e9}
+	return results
+
+# operand reads, and writes for the modes that store, through each addressing mode in use
+def modes(iterations=5000, repeat=3):
+	processor = microCPU()
+	processor.PC = CODE
+	results = {}
+	seen = set()
+	for instruction, mode, cycles in processor.instructions.values():
+		kind = mode.__class__.__name__
+		if kind in seen:
+			continue
+		seen.add(kind)
+		def read():
+			for i in range(iterations):
+				mode.get()
+		results['mode.{}.read'.format(kind)] = {'ns_per_access': best(read, repeat) / iterations * 1e9}
+		if type(mode).write is not addressing.AddressingMode.write:
+			def write():
+				for i in range(iterations):
+					mode.set(0x55)
+			results['mode.{}.write'.format(kind)] = {'ns_per_access': best(write, repeat) / iterations * 1e9}
+	return results
+
+# frames drawn with background and sprites from random nametables, palettes and OAM, scrolled
+# every frame so the background bitmap is sliced at a new offset
+def rendering(frames=30, repeat=3):
+	console = nes.NES()
+	generator = random.Random(0)
+	memory = console.cpu.memory
+	for address in range(0x2000, 0x3000):
+		console.ppu.write(address, generator.randrange(256))
+	for address in range(0x3F00, 0x3F20):
+		console.ppu.write(address, generator.randrange(64))
+	for address in range(0x0200, 0x0300):
+		memory.write(address, generator.randrange(256))
+	memory.write(0x4014, 0x02)
+	memory.write(0x2001, 0x1E)
+	console.ppu.stepFrame()
+
+	def drawn():
+		for frame in range(frames):
+			memory.write(0x2005, frame)
+			memory.write(0x2005, frame)
+			console.ppu.stepFrame()
+	results = {'ppu.frame': {'seconds_per_frame': best(drawn, repeat) / frames}}
+
+	def rgba():
+		for frame in range(frames):
+			console.ppu.framebuffer.toRGBA()
+	results['ppu.framebuffer.rgba'] = {'seconds_per_frame': best(rgba, repeat) / frames}
+
+	# the same frames skipped, only the PPUSTATUS flags are worked out. A nametable byte is written
+	# every frame, as games do, which a drawn frame would redraw the background bitmap for.
+	def headless():
+		for frame in range(frames):
+			console.ppu.write(0x2000 + frame * 33, frame)
+			memory.write(0x2005, frame)
+			memory.write(0x2005, frame)
+			console.ppu.stepFrame()
+	console.ppu.renderInterval = 0
+	results['ppu.frame.headless'] = {'seconds_per_frame': best(headless, repeat) / frames}
+	return results
+
+def run(suites=SUITES, repeat=3, iterations=2000, frames=30):
+	results = {}
+	if 'nestest' in suites:
+		results.update(nestest(repeat))
+	if 'opcodes' in suites:
+		results.update(opcodes(iterations, repeat))
+	if 'modes' in suites:
+		results.update(modes(iterations, repeat))
+	if 'ppu' in suites:
+		results.update(rendering(frames, repeat))
+	return {'version': VERSION, 'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+
+# metrics in both reports as (benchmark, metric, baseline, current, change, regression), change is
+# the relative change in the direction of better so a regression has a negative change
+def compare(baseline, current, threshold=0.1):
+	rows = []
+	for name, metrics in sorted(current['results'].items()):
+		old = baseline['results'].get(name)
+		if old is None:
+			continue
+		for metric, value in sorted(metrics.items()):
+			if metric not in old or not old[metric]:
+				continue
+			change = (value - old[metric]) / old[metric]
+			if not METRICS[metric]:
+				change = -change
+			rows.append((name, metric, old[metric], value, change, change < -threshold))
+	return rows
+
+# (suite, change, regression) from the rows of compare, change is the geometric mean of the
+# suite's speedups minus one. Suites are named by the first part of the benchmark names.
+def summarize(rows, threshold=0.1):
+	speedups = {}
+	for name, metric, old, new, change, regression in rows:
+		speedups.setdefault(name.split('.')[0], []).append(new / old if METRICS[metric] else old / new)
+	suites = []
+	for suite, values in sorted(speedups.items()):
+		change = math.exp(sum(math.log(value) for value in values) / len(values)) - 1
+		suites.append((suite, change, change < -threshold))
+	return suites
+
+def main():
+	parser = argparse.ArgumentParser(description='Run the emulator throughput benchmarks')
+	parser.add_argument('--suite', action='append', choices=SUITES, help='suites to run, all by default')
+	parser.add_argument('--output', help='write results as JSON to this file')
+	parser.add_argument('--baseline', help='compare with the results in this file')
+	parser.add_argument('--check', action='store_true', help='compare with the committed baseline, ' + BASELINE)
+	parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown counted as a regression')
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--iterations', type=int, default=2000)
+	parser.add_argument('--frames', type=int, default=30)
+	args = parser.parse_args()
+	if args.check and args.baseline is None:
+		args.baseline = BASELINE
+
+	report = run(args.suite or SUITES, args.repeat, args.iterations, args.frames)
+	if args.output:
+		with open(args.output, 'w') as file:
+			json.dump(report, file, indent=1, sort_keys=True)
+	if args.baseline is None:
+		if not args.output:
+			json.dump(report, sys.stdout, indent=1, sort_keys=True)
+		return 0
+	with open(args.baseline) as file:
+		baseline = json.load(file)
+	rows = compare(baseline, report, args.threshold)
+	for name, metric, old, new, change, regression in rows:
+		print('{:<32} {:<24} {:>14.6g} {:>14.6g} {:>+7.1%}{}'.format(name, metric, old, new, change,
+			'  slower' if regression else ''))
+	regressions = 0
+	for suite, change, regression in summarize(rows, args.threshold):
+		if regression:
+			regressions += 1
+		print('suite {:<26} {:>+7.1%}{}'.format(suite, change, '  REGRESSION' if regression else ''))
+	print('{} suites regressed beyond {:.0%}'.format(regressions, args.threshold))
+	return 1 if regressions else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -4,17 +4,41 @@
 import memory
 import addressing
 import rom
+import translator
+import tracer
+import savestate
+import scheduler
+
+# reasons CPU.run stops
+STOP_CYCLES = 'cycles'
+STOP_INSTRUCTIONS = 'instructions'
+STOP_PC = 'pc'
+STOP_TRAP = 'trap'
+STOP_BREAK = 'break'
+
+# limit used when run is not given one
+UNLIMITED = 1 << 62
 
 class CPU:
 
-    def __init__(self):
+    def __init__(self, cartridge=None):
         self.console = None
         self.memory = memory.Memory(0x10000)
-        self.memory.loadROM(rom.ROM())
+        self.cartridge = cartridge if cartridge is not None else rom.ROM()
+        self.memory.loadROM(self.cartridge)
         self.clock = None
         self.cycles = 0
+        #timed events of the console, run between instructions once cycles reaches their time
+        self.scheduler = scheduler.Scheduler()
+        #reason set by a stop requested through requestStop, ends run once its event comes up
+        self.stopReason = None
+        #set by an enabled profiler.Profiler, runs go through the dispatch table while it is
+        self.profiler = None
+        #predecoded code of the ROM, set by an attached disassembler.Disassembly
+        self.disassembly = None
         self.debug = True
-        self.logFile = open('log.txt', 'w')
+        #ring buffer of executed instructions, recorded while debug is on
+        self.trace = tracer.TraceRecorder(self)
 
         #status flags
         self.C = 0
@@ -252,11 +276,180 @@ class CPU:
 
         }
 
+        #flat dispatch table indexed by opcode, entries in form ({operation}, {addressing mode}, {size}, {clock cycles})
+        #unmapped opcodes dispatch to trap
+        self.dispatch = self.buildDispatchTable()
+        #functions wrapping the table, installed by the profiler and debugger, see installDispatch
+        self.baseDispatch = self.dispatch
+        self.dispatchLayers = []
+
+        #compiled basic blocks, executed by fetchBlock
+        self.translator = translator.Translator(self)
+
+    # install layer, a function from the dispatch table below it to the table wrapping it, on top
+    # of the installed layers. Installing it again moves it to the top and rebuilds the tables.
+    def installDispatch(self, layer):
+        if layer in self.dispatchLayers:
+            self.dispatchLayers.remove(layer)
+        self.dispatchLayers.append(layer)
+        self.rebuildDispatch()
+
+    def removeDispatch(self, layer):
+        if layer in self.dispatchLayers:
+            self.dispatchLayers.remove(layer)
+            self.rebuildDispatch()
+
+    def rebuildDispatch(self):
+        table = self.baseDispatch
+        for layer in self.dispatchLayers:
+            table = layer(table)
+        self.dispatch = table
+
+    # load a ROM from a path or buffer, replacing the current cartridge
     def loadROM(self, filepath):
-        pass
-
-    def run(self):
-        pass
+        if self.disassembly is not None:
+            self.disassembly.detach()
+        self.cartridge = rom.ROM(filepath)
+        self.memory.loadROM(self.cartridge)
+        self.translator.flush()
+
+    # snapshot of the registers and memory as a binary blob, see savestate
+    def saveState(self):
+        return savestate.save(self)
+
+    def loadState(self, state):
+        savestate.load(state, self)
+
+    # run until max_cycles CPU cycles have elapsed, max_instructions have executed or PC reaches until_pc,
+    # returns the reason it stopped. Stops on an unmapped opcode without executing it.
+    # Scheduled events run at the first instruction boundary at or after their time, blocks that
+    # would run past the next event are stepped one instruction at a time.
+    # Polling loops found by the translator are fast-forwarded: once a loop has gone round, the
+    # iterations that end before the next event, or before PPUSTATUS can change, are counted in
+    # cycles and instructions without running them.
+    def run(self, max_cycles=None, max_instructions=None, until_pc=None):
+        cycleLimit = self.cycles + scheduler.toDots(max_cycles) if max_cycles is not None else UNLIMITED
+        instructionLimit = max_instructions if max_instructions is not None else UNLIMITED
+        until = until_pc if until_pc is not None else -1
+        if self.debug or self.profiler is not None:
+            return self.runInstructions(cycleLimit, instructionLimit, until)
+
+        blocks = self.translator.blocks
+        compile = self.translator.compile
+        events = self.scheduler
+        PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles = (
+            self.PC, self.A, self.X, self.Y, self.SP, self.C, self.Z, self.I, self.D, self.B, self.V, self.N, self.cycles)
+        executed = 0
+        #cycle count at which a polling loop last went round, events can end the polling
+        looped = -1
+        while True:
+            limit = events.next
+            if cycles >= limit:
+                looped = -1
+                (self.PC, self.A, self.X, self.Y, self.SP, self.C, self.Z, self.I, self.D, self.B, self.V, self.N,
+                 self.cycles) = PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles
+                events.run(cycles)
+                PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles = (
+                    self.PC, self.A, self.X, self.Y, self.SP, self.C, self.Z, self.I, self.D, self.B, self.V, self.N, self.cycles)
+                if self.stopReason is not None:
+                    reason, self.stopReason = self.stopReason, None
+                    break
+                continue
+            if PC == until:
+                reason = STOP_PC
+                break
+            if cycles >= cycleLimit:
+                reason = STOP_CYCLES
+                break
+            if executed >= instructionLimit:
+                reason = STOP_INSTRUCTIONS
+                break
+            block = blocks.get(PC)
+            if block is None:
+                block = compile(PC)
+            if cycleLimit < limit:
+                limit = cycleLimit
+            if (block is None or block.idle or cycles + block.cycles > limit or executed + block.length > instructionLimit
+                    or block.start < until < block.end):
+                if block is not None and block.idle and not block.start < until < block.end:
+                    #a polling loop that just went round goes round the same way until what it reads
+                    #can change, the whole iterations before then are skipped
+                    if cycles == looped:
+                        bound = self.console.ppu.statusStableUntil(cycles) if block.status else limit
+                        if bound > limit:
+                            bound = limit
+                        iterations = min((bound - cycles) // block.cycles, (instructionLimit - executed) // block.length)
+                        if iterations > 0:
+                            cycles += iterations * block.cycles
+                            executed += iterations * block.length
+                            continue
+                    if cycles + block.cycles <= limit and executed + block.length <= instructionLimit:
+                        PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles, count = block.function(
+                            A, X, Y, SP, C, Z, I, D, B, V, N, cycles)
+                        executed += count
+                        looped = cycles if PC == block.start else -1
+                        continue
+                #finish close to a limit one instruction at a time, and step instructions that
+                #do not compile, like those at breakpoints
+                if block is None and self.trapsAt(PC):
+                    reason = STOP_TRAP
+                    break
+                (self.PC, self.A, self.X, self.Y, self.SP, self.C, self.Z, self.I, self.D, self.B, self.V, self.N,
+                 self.cycles) = PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles
+                self.fetch()
+                executed += 1
+                PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles = (
+                    self.PC, self.A, self.X, self.Y, self.SP, self.C, self.Z, self.I, self.D, self.B, self.V, self.N, self.cycles)
+                continue
+            PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles, count = block.function(A, X, Y, SP, C, Z, I, D, B, V, N, cycles)
+            executed += count
+
+        (self.PC, self.A, self.X, self.Y, self.SP, self.C, self.Z, self.I, self.D, self.B, self.V, self.N,
+         self.cycles) = PC, A, X, Y, SP, C, Z, I, D, B, V, N, cycles
+        return reason
+
+    # run one instruction at a time through fetch, used while tracing
+    def runInstructions(self, cycleLimit, instructionLimit, until):
+        events = self.scheduler
+        executed = 0
+        while True:
+            if self.cycles >= events.next:
+                events.run(self.cycles)
+                if self.stopReason is not None:
+                    reason, self.stopReason = self.stopReason, None
+                    return reason
+            if self.PC == until:
+                return STOP_PC
+            if self.cycles >= cycleLimit:
+                return STOP_CYCLES
+            if executed >= instructionLimit:
+                return STOP_INSTRUCTIONS
+            if self.trapsAt(self.PC):
+                return STOP_TRAP
+            self.fetch()
+            executed += 1
+
+    #whether the opcode at address is unmapped, looked up without the side effects of a read
+    def trapsAt(self, address):
+        opcode = self.memory.peek(address)
+        return opcode is not None and self.dispatch[opcode] is self.unmapped
+
+    # stop run at the next instruction boundary it reaches, through an event due now so the
+    # loop only looks for a stop when it runs events
+    def requestStop(self, reason=STOP_BREAK):
+        def stop():
+            self.stopReason = reason
+        self.scheduler.schedule(self.cycles, stop)
+
+    # non-maskable interrupt, taken between instructions: push PC and status with B clear and
+    # jump through the vector at $FFFA
+    def nmi(self):
+        self.pushStack((self.PC >> 8) & 0xFF)
+        self.pushStack(self.PC & 0xFF)
+        self.pushStack(self.getProcessorStatus() & 0xEF)
+        self.I = 1
+        self.PC = self.memory.read16(0xFFFA)
+        self.cycles += scheduler.toDots(7)
 
     #stack is located at 0x0100-0x01FF, top-down, wraps to start of stack if overflow
     def pushStack(self, value):
@@ -288,38 +481,32 @@ class CPU:
     def setSP(self, value):
         self.SP = 0x100 + (value & 0xFF)
 
+    def buildDispatchTable(self):
+        self.unmapped = (self.trap, self.NONE, 0, 0)
+        table = [self.unmapped] * 0x100
+        for opcode, (instruction, addressingMode, cycles) in self.instructions.items():
+            table[opcode] = (instruction, addressingMode, addressingMode.size, cycles)
+        return table
+
     def fetch(self):
-        opcode = self.memory.read(self.PC)
-        self.execute(*self.instructions[opcode])
+        instruction, addressingMode, size, cycles = self.dispatch[self.memory.read(self.PC)]
+        if self.debug:
+            self.trace.record()
+        instruction(addressingMode)
+        self.PC += size
+        self.cycles += scheduler.toDots(cycles)
+
+    # execute the basic block at PC, returns the number of instructions executed
+    def fetchBlock(self):
+        return self.translator.step()
 
     # execute an instruction        
     def execute(self, instruction, addressingMode, cycles):
         if self.debug == True:
-            self.logOperation(instruction, addressingMode)
+            self.trace.record()
         instruction(addressingMode)
         self.PC += addressingMode.size
-        self.cycles += cycles * 3
-
-    def logOperation(self, instruction, addressingMode):
-        name = instruction.__name__
-        ops = addressingMode.size if addressingMode.size > 0 else 3 if name[0] == 'j' else 2
-        log = str("{:04x}".format(self.PC)) + ' '
-
-        for i in range(ops):
-            log += ' ' + str("{:02x}".format(self.memory.read(self.PC + i)))
-        log += ' ' * (16 - len(log))
-        log += ' ' + instruction.__name__
-        log += ' ' + addressingMode.format()
-        if name == 'stx': log += ' = {:02x}'.format(self.X)
-        if name == 'sty': log += ' = {:02x}'.format(self.Y) 
-        if name == 'sta': log += ' = {:02x}'.format(self.A) 
-
-
-        #log += ' {:04x}'.format(addressingMode.get())
-        log += ' ' * (48 - len(log))
-        spaces = '  ' if self.cycles % 341 < 10 else (' ' if self.cycles % 341 < 100 else '')
-        log+= ' A:{:02x} X:{:02x} Y:{:02x} P:{:02x} SP:{:02x} CYC:{}{}\n'.format(self.A, self.X, self.Y, self.getProcessorStatus(), self.SP, spaces, self.cycles % 341)
-        self.logFile.write(log.upper())
+        self.cycles += scheduler.toDots(cycles)
 
     # OPERATIONS 
     # http://www.obelisk.me.uk/6502/reference.html
@@ -333,21 +520,21 @@ class CPU:
         self.A = result & 0xFF
         self.C = result > 0xFF
         self.setZN(result)
-        self.cycles += mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # logical and [A,Z,N = A&M]
     def _and(self, mode):
         result = mode.get() & self.A
         self.setZN(result)
         self.A = result
-        self.cycles += mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # arithmetic left shift [A,Z,C,N = M*2],[M,Z,C,N = M*2]
     def asl(self, mode):
         result = mode.get() << 1;
         self.C = result > 0xFF
         self.setZN(result)
-        mode.set(result)
+        mode.set(result & 0xFF)
 
     # branch if carry clear
     def bcc(self, mode):
@@ -355,7 +542,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # branch if carry set
@@ -364,7 +551,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # branch if equal
@@ -373,7 +560,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # bit test [A&M, N=M7, V=M6]
@@ -390,7 +577,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # branch not equal
@@ -399,7 +586,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # branch if positive
@@ -408,7 +595,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # force interrupt
@@ -427,7 +614,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # branch if overflow set
@@ -436,7 +623,7 @@ class CPU:
             self.PC += 2
             return
         relAddr = mode.get()
-        self.cycles += 3*mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 3
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
         self.PC = relAddr
 
     # clear carry flag
@@ -461,7 +648,7 @@ class CPU:
         self.C = self.A >= operand
         diff = (self.A - operand) & 0xFF
         self.setZN(diff)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
 
     # compare X register [Z,C,N = X-M]
@@ -498,7 +685,7 @@ class CPU:
     def eor(self, mode):
         self.A = self.A ^ mode.get()
         self.setZN(self.A)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # increment memory [M,Z,N = M+1]
     def inc(self, mode):
@@ -533,25 +720,25 @@ class CPU:
         self.A = value
         self.X = value
         self.setZN(self.A)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # load accumulator [A,Z,N = M]
     def lda(self, mode):
         self.A = mode.get()
         self.setZN(self.A)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # load X register [X,Z,N = M]
     def ldx(self, mode):
         self.X = mode.get()
         self.setZN(self.X)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # load Y register
     def ldy(self, mode):
         self.Y = mode.get()
         self.setZN(self.Y)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # logical right shift
     def lsr(self, mode):
@@ -565,12 +752,16 @@ class CPU:
     def nop(self, mode):
         pass
 
+    # unmapped opcode
+    def trap(self, mode):
+        raise Exception('Unmapped opcode ${:02x} at ${:04x}'.format(self.memory.read(self.PC), self.PC))
+
     # logical inclusive or [A,Z,N = A|M]
     def ora(self, mode):
         result = self.A | mode.get()
         self.setZN(result)
         self.A = result & 0xFF
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # push accumulator
     def pha(self, mode):
@@ -625,7 +816,7 @@ class CPU:
         self.V = int(((self.A ^ value) & 0x80 != 0) and ((self.A ^ result) & 0x80 != 0))
         self.A = result & 0xFF
         self.setZN(result)
-        self.cycles += 3*mode.getCrossPageCycles(self.PC + 1)
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
 
     # set carry flag
     def sec(self, mode):
@@ -678,3 +869,165 @@ class CPU:
     def tya(self, mode):
         self.A = self.Y
         self.setZN(self.A)
+
+
+# CPU with lazily evaluated flags. Z and N are kept as the last result and C and V as the
+# values they derive from, and are only worked out when read by a branch, getProcessorStatus
+# or the log. Explicit flag writes go through the same properties, so behaviour matches CPU.
+class LazyFlagsCPU(CPU):
+
+    def __init__(self, cartridge=None):
+        # Z is set when zResult & 0xFF is 0, N is bit 7 of nResult
+        self.zResult = 1
+        self.nResult = 0
+        # C is set when carrySource is above 0xFF
+        self.carrySource = 0
+        # V is worked out from the accumulator, operand and result of the last adc/sbc
+        self.overflowSource = (0, 0, 0)
+        super().__init__(cartridge)
+
+    def getZ(self):
+        return 1 if self.zResult & 0xFF == 0 else 0
+
+    def setZ(self, value):
+        self.zResult = 0 if value else 1
+
+    def getN(self):
+        return (self.nResult & 0xFF) >> 7
+
+    def setN(self, value):
+        self.nResult = 0x80 if value else 0
+
+    def getC(self):
+        return 1 if self.carrySource > 0xFF else 0
+
+    def setC(self, value):
+        self.carrySource = 0x100 if value else 0
+
+    def getV(self):
+        a, m, r = self.overflowSource
+        return 1 if ~(a ^ m) & (a ^ r) & 0x80 else 0
+
+    def setV(self, value):
+        self.overflowSource = (0, 0, 0x80) if value else (0, 0, 0)
+
+    Z = property(getZ, setZ)
+    N = property(getN, setN)
+    C = property(getC, setC)
+    V = property(getV, setV)
+
+    def setZN(self, value):
+        self.zResult = self.nResult = value
+
+    # branches test the flag sources directly
+    def branch(self, mode):
+        relAddr = mode.get()
+        self.cycles += scheduler.toDots(mode.crossPageCycles if ((self.PC+2) >> 8) != (relAddr >> 8) else 1)
+        self.PC = relAddr
+
+    def bcc(self, mode):
+        if self.carrySource > 0xFF:
+            self.PC += 2
+        else:
+            self.branch(mode)
+
+    def bcs(self, mode):
+        if self.carrySource > 0xFF:
+            self.branch(mode)
+        else:
+            self.PC += 2
+
+    def beq(self, mode):
+        if self.zResult & 0xFF:
+            self.PC += 2
+        else:
+            self.branch(mode)
+
+    def bne(self, mode):
+        if self.zResult & 0xFF:
+            self.branch(mode)
+        else:
+            self.PC += 2
+
+    def bmi(self, mode):
+        if self.nResult & 0x80:
+            self.branch(mode)
+        else:
+            self.PC += 2
+
+    def bpl(self, mode):
+        if self.nResult & 0x80:
+            self.PC += 2
+        else:
+            self.branch(mode)
+
+    def adc(self, mode):
+        value = mode.get()
+        result = value + self.A + (self.carrySource > 0xFF)
+        self.overflowSource = (self.A, value, result)
+        self.A = result & 0xFF
+        self.zResult = self.nResult = self.carrySource = result
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
+
+    def sbc(self, mode):
+        value = mode.get()
+        result = self.A - value - (self.carrySource <= 0xFF)
+        # A - M is overflow tested as A + ~M
+        self.overflowSource = (self.A, value ^ 0xFF, result)
+        self.A = result & 0xFF
+        self.zResult = self.nResult = result
+        self.carrySource = 0x100 if result >> 8 == 0 else 0
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
+
+    def asl(self, mode):
+        result = mode.get() << 1
+        self.zResult = self.nResult = self.carrySource = result
+        mode.set(result & 0xFF)
+
+    def lsr(self, mode):
+        operand = mode.get()
+        result = (operand >> 1) & 0b01111111
+        self.carrySource = (operand & 1) << 8
+        self.zResult = self.nResult = result
+        mode.set(result)
+
+    def clc(self, mode):
+        self.carrySource = 0
+
+    def sec(self, mode):
+        self.carrySource = 0x100
+
+    # the difference plus 0x100 carries exactly when the register is not less than the operand
+    def cmp(self, mode):
+        self.zResult = self.nResult = self.carrySource = self.A - mode.get() + 0x100
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
+
+    def cpx(self, mode):
+        self.zResult = self.nResult = self.carrySource = self.X - mode.get() + 0x100
+
+    def cpy(self, mode):
+        self.zResult = self.nResult = self.carrySource = self.Y - mode.get() + 0x100
+
+    def lda(self, mode):
+        self.A = self.zResult = self.nResult = mode.get()
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
+
+    def ldx(self, mode):
+        self.X = self.zResult = self.nResult = mode.get()
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
+
+    def ldy(self, mode):
+        self.Y = self.zResult = self.nResult = mode.get()
+        self.cycles += scheduler.toDots(mode.getCrossPageCycles(self.PC + 1))
+
+    def dex(self, mode):
+        self.X = self.zResult = self.nResult = (self.X - 1) & 0xFF
+
+    def dey(self, mode):
+        self.Y = self.zResult = self.nResult = (self.Y - 1) & 0xFF
+
+    def inx(self, mode):
+        self.X = self.zResult = self.nResult = (self.X + 1) & 0xFF
+
+    def iny(self, mode):
+        self.Y = self.zResult = self.nResult = (self.Y + 1) & 0xFF
@@ -0,0 +1,263 @@
+# Debugger
+# Breakpoints and watchpoints cost nothing until they are armed, and then only on what they touch:
+# - a PC breakpoint installs a dispatch layer, see CPU.installDispatch, whose entry for the opcode
+#   at its address checks the PC before running the operation below it, and keeps the translator
+#   from compiling the address into a block, so the run loop steps it through the table
+# - a watchpoint routes the reads or writes of the pages holding its addresses, and the pages
+#   mirroring them, through memory watchers
+# A hit asks the CPU to stop with STOP_BREAK. Breakpoints stop before their instruction runs.
+# Watchpoints stop after the instruction that made the access when the CPU runs one instruction
+# at a time, as it does while tracing, and at the end of the compiled block otherwise.
+# Conditions are called with the CPU for breakpoints and with the address and value for
+# watchpoints, a hit is only taken when they return true.
+import functools
+
+import disassembler
+import scheduler
+import tracer
+import translator
+
+READ = 'read'
+WRITE = 'write'
+ACCESS = 'access'
+
+REGISTERS = ('PC', 'A', 'X', 'Y', 'SP', 'C', 'Z', 'I', 'D', 'B', 'V', 'N', 'cycles')
+
+class Breakpoint:
+	def __init__(self, address, condition=None):
+		self.address = address
+		self.condition = condition
+		self.hits = 0
+
+class Watchpoint:
+	# addresses in [start, end) accessed as kind, READ, WRITE or ACCESS for both
+	def __init__(self, start, end, kind, condition=None):
+		self.start = start
+		self.end = end
+		self.kind = kind
+		self.condition = condition
+		self.hits = 0
+		# backing buffer addresses of the range, set when the watchpoints are armed
+		self.addresses = frozenset()
+
+class Hit:
+	# what stopped the CPU: the breakpoint or watchpoint, the access kind or 'pc' for breakpoints,
+	# the address and value read or written, and the PC of the instruction that hit it
+	def __init__(self, point, kind, address, value, pc):
+		self.point = point
+		self.kind = kind
+		self.address = address
+		self.value = value
+		self.pc = pc
+
+class Debugger:
+	def __init__(self, cpu):
+		self.cpu = cpu
+		self.breakpoints = {}
+		self.watchpoints = []
+		# the last hit, None until one is taken
+		self.hit = None
+		# entries below the layer of the opcodes it armed
+		self.armed = {}
+		# breakpoint address run from, not taken for the first instruction of a run
+		self.resumeAt = None
+		# pages armed for read and for write watchpoints
+		self.readPages = []
+		self.writePages = []
+
+	# BREAKPOINTS
+
+	def addBreakpoint(self, address, condition=None):
+		point = Breakpoint(address, condition)
+		self.breakpoints[address] = point
+		self.armBreakpoints()
+		return point
+
+	def removeBreakpoint(self, address):
+		del self.breakpoints[address]
+		self.armBreakpoints()
+
+	# install the dispatch layer while there are breakpoints. Opcodes are read when arming, code
+	# written over a breakpoint later is armed again by the next run.
+	def armBreakpoints(self):
+		cpu = self.cpu
+		blocks = cpu.translator
+		for address in blocks.breaks | set(self.breakpoints):
+			blocks.invalidate(address)
+		blocks.breaks = set(self.breakpoints)
+		if self.breakpoints:
+			cpu.installDispatch(self.layer)
+		else:
+			cpu.removeDispatch(self.layer)
+			self.armed = {}
+
+	# dispatch layer, the entries for the opcodes at breakpoints check the PC
+	def layer(self, table):
+		cpu = self.cpu
+		self.armed = {}
+		dispatch = list(table)
+		for address in self.breakpoints:
+			opcode = self.peek(address)
+			entry = table[opcode] if opcode is not None else cpu.unmapped
+			if entry is not cpu.unmapped and opcode not in self.armed:
+				self.armed[opcode] = entry
+				dispatch[opcode] = self.checking(entry)
+		return dispatch
+
+	def checking(self, entry):
+		instruction, mode, size, cycles = entry
+		cpu = self.cpu
+		breakpoints = self.breakpoints
+		dots = scheduler.toDots(cycles)
+
+		# fetch traces the instruction and adds size and cycles after the operation, they are
+		# taken back when the hit leaves the instruction for later
+		@functools.wraps(instruction)
+		def checked(addressingMode):
+			pc = cpu.PC
+			point = breakpoints.get(pc)
+			if point is not None and pc != self.resumeAt and (point.condition is None or point.condition(cpu)):
+				point.hits += 1
+				self.hit = Hit(point, 'pc', pc, None, pc)
+				cpu.requestStop()
+				cpu.PC -= size
+				cpu.cycles -= dots
+				if cpu.debug:
+					cpu.trace.drop()
+				return
+			self.resumeAt = None
+			instruction(addressingMode)
+		return (checked, mode, size, cycles)
+
+	# WATCHPOINTS
+
+	def addWatchpoint(self, start, end=None, kind=WRITE, condition=None):
+		point = Watchpoint(start, end if end is not None else start + 1, kind, condition)
+		self.watchpoints.append(point)
+		self.armWatchpoints()
+		return point
+
+	def removeWatchpoint(self, point):
+		self.watchpoints.remove(point)
+		self.armWatchpoints()
+
+	# watch every page whose accesses reach a watched byte, directly or through a mirror
+	def armWatchpoints(self):
+		memory = self.cpu.memory
+		for page in self.readPages:
+			memory.unwatchReads(page, self.onRead)
+		for page in self.writePages:
+			memory.unwatch(page, self.onWrite)
+		reads = set()
+		writes = set()
+		for point in self.watchpoints:
+			point.addresses = frozenset(self.backing(address) for address in range(point.start, point.end))
+			pages = {address >> 8 for address in point.addresses}
+			if point.kind != WRITE:
+				reads |= pages
+			if point.kind != READ:
+				writes |= pages
+		self.readPages = [page for page in range(memory.pageCount) if self.backing(page << 8) >> 8 in reads]
+		self.writePages = [page for page in range(memory.pageCount) if self.backing(page << 8) >> 8 in writes]
+		for page in self.readPages:
+			memory.watchReads(page, self.onRead)
+		for page in self.writePages:
+			memory.watch(page, self.onWrite)
+		# polling loops compiled before the pages were watched would skip their reads
+		if reads:
+			self.cpu.translator.flush()
+
+	# address in the backing buffer that address reaches, the address itself off the buffer
+	def backing(self, address):
+		page = self.cpu.memory.backingPage(address >> 8)
+		return (page << 8) | (address & 0xFF) if page is not None else address
+
+	def onRead(self, address, value):
+		self.watched(READ, address, value)
+
+	def onWrite(self, address):
+		self.watched(WRITE, address, self.peek(address))
+
+	# cpu.PC is the accessing instruction's, compiled blocks set it before calling memory handlers
+	def watched(self, kind, address, value):
+		target = self.backing(address)
+		for point in self.watchpoints:
+			if point.kind in (kind, ACCESS) and target in point.addresses and (
+			   point.condition is None or point.condition(address, value)):
+				point.hits += 1
+				self.hit = Hit(point, kind, address, value, self.cpu.PC)
+				self.cpu.requestStop()
+
+	# EXECUTION
+
+	# run until a hit, an unmapped opcode or a limit, see CPU.run. A breakpoint at the PC the run
+	# starts from is passed over.
+	def resume(self, max_cycles=None, max_instructions=None, until_pc=None):
+		self.hit = None
+		if self.breakpoints:
+			self.armBreakpoints()
+		self.resumeAt = self.cpu.PC if self.cpu.PC in self.breakpoints else None
+		try:
+			return self.cpu.run(max_cycles, max_instructions, until_pc)
+		finally:
+			self.resumeAt = None
+
+	# execute count instructions
+	def step(self, count=1):
+		return self.resume(max_instructions=count)
+
+	# execute the next instruction, running a subroutine it calls to its return
+	def stepOver(self):
+		cpu = self.cpu
+		if self.peek(cpu.PC) == 0x20:
+			return self.runTo(cpu.PC + 3)
+		return self.step()
+
+	def runTo(self, address, max_cycles=None):
+		return self.resume(max_cycles, until_pc=address)
+
+	# INSPECTION
+
+	def registers(self):
+		return {register: int(getattr(self.cpu, register)) for register in REGISTERS}
+
+	def setRegister(self, register, value):
+		if register not in REGISTERS:
+			raise Exception('Unknown register ' + register)
+		setattr(self.cpu, register, value)
+
+	# byte at address without the side effects of a read, None for IO registers served by handlers
+	def peek(self, address):
+		return self.cpu.memory.peek(address)
+
+	def peekRange(self, start, length):
+		return [self.peek((start + offset) & 0xFFFF) for offset in range(length)]
+
+	def poke(self, address, value):
+		self.cpu.memory.write(address, value)
+
+	# listing of count instructions from address, decoded by an attached disassembly where it can be
+	def disassemble(self, address, count=1):
+		cpu = self.cpu
+		decoded = cpu.disassembly.instructions if cpu.disassembly is not None else {}
+		lines = []
+		for _ in range(count):
+			instruction = decoded.get(address)
+			opcode = self.peek(address)
+			if opcode is None:
+				break
+			if instruction is None:
+				entry = cpu.dispatch[opcode]
+				operand, high = [byte or 0 for byte in self.peekRange(address + 1, 2)]
+				instruction = translator.Instruction(address, entry[0].__name__, entry[1], tracer.instructionLength(entry),
+				                                     entry[3], operand, operand | (high << 8))
+			lines.append(disassembler.formatInstruction(cpu, instruction, opcode))
+			address = (address + instruction.length) & 0xFFFF
+		return lines
+
+	# remove every breakpoint and watchpoint, leaving the CPU as it was
+	def clear(self):
+		self.breakpoints.clear()
+		self.armBreakpoints()
+		self.watchpoints = []
+		self.armWatchpoints()
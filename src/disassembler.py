@@ -0,0 +1,207 @@
+# Static recursive-descent disassembler
+# Walks PRG ROM from the reset, NMI and IRQ vectors, following branches, JMP and JSR targets,
+# and classifies every byte of $8000-$FFFF as an opcode, an operand or data. Instructions are
+# decoded once through the CPU's dispatch table into translator.Instruction objects, so the
+# translator, debuggers and trace listings can use them instead of reading operands again.
+# Targets of indirect jumps, RTS and RTI are not known statically, bytes only reached through
+# them stay data.
+# A disassembly is persisted as JSON named after the SHA-1 of the PRG ROM, see cached.
+import hashlib
+import json
+import os
+
+import tracer
+import translator
+
+START = 0x8000
+END = 0x10000
+
+# byte classes in the map
+DATA = 0
+OPCODE = 1
+OPERAND = 2
+
+KINDS = ('data', 'opcode', 'operand')
+
+VECTORS = {'nmi': 0xFFFA, 'reset': 0xFFFC, 'irq': 0xFFFE}
+
+# operations after which execution does not continue with the next instruction
+NO_FALL_THROUGH = {'jmp', 'rts', 'rti', 'brk', 'trap'}
+
+VERSION = 1
+
+# listing line of a decoded instruction, its bytes and text with the operand as nestest shows it
+def formatInstruction(cpu, instruction, opcode):
+	operands = (instruction.operand, instruction.operand16 >> 8)[:instruction.length - 1]
+	code = ' '.join('{:02X}'.format(byte) for byte in (opcode,) + operands)
+	text = '{} {}'.format(instruction.name.lstrip('_').upper(), cpu.trace.formatOperand(
+		instruction.address, instruction.mode, instruction.operand, instruction.operand16 >> 8)).rstrip()
+	return '{:04X}  {:<8}  {}'.format(instruction.address, code, text)
+
+# content hash of a cartridge's PRG ROM, the key disassemblies are stored under
+def romHash(cartridge):
+	return hashlib.sha1(cartridge.prg_rom).hexdigest()
+
+class Disassembly:
+	def __init__(self, cpu, entries=()):
+		self.cpu = cpu
+		self.hash = romHash(cpu.cartridge)
+		# addresses the walk started from besides the vectors
+		self.entries = sorted(entries)
+		self.map = bytearray(END - START)
+		# decoded instructions by address
+		self.instructions = {}
+		self.attached = False
+
+	# walk the code reachable from the vectors and entries
+	def walk(self):
+		read = self.cpu.memory.read
+		pending = [read(vector) | (read(vector + 1) << 8) for vector in VECTORS.values()] + list(self.entries)
+		while pending:
+			pc = pending.pop()
+			while START <= pc < END and pc not in self.instructions:
+				instruction = self.decode(pc)
+				if instruction is None:
+					break
+				self.add(instruction)
+				name = instruction.name
+				if instruction.mode.__class__.__name__ == 'Relative':
+					offset = instruction.operand - 256 if instruction.operand > 0x7F else instruction.operand
+					pending.append((pc + 2 + offset) & 0xFFFF)
+				elif name in ('jmp', 'jsr') and instruction.mode.__class__.__name__ == 'JumpAbsolute':
+					pending.append(instruction.operand16)
+				if name in NO_FALL_THROUGH:
+					break
+				pc += instruction.length
+		return self
+
+	# instruction at pc, None for unmapped opcodes and instructions overlapping decoded code
+	def decode(self, pc):
+		read = self.cpu.memory.read
+		entry = self.cpu.dispatch[read(pc)]
+		if entry is self.cpu.unmapped:
+			return None
+		length = tracer.instructionLength(entry)
+		if pc + length > END or any(self.map[address - START] for address in range(pc, pc + length)):
+			return None
+		instruction, mode, size, cycles = entry
+		return translator.Instruction(pc, instruction.__name__, mode, length, cycles,
+		                              read((pc + 1) & 0xFFFF), read((pc + 1) & 0xFFFF) | (read((pc + 2) & 0xFFFF) << 8))
+
+	def add(self, instruction):
+		self.instructions[instruction.address] = instruction
+		offset = instruction.address - START
+		self.map[offset] = OPCODE
+		self.map[offset + 1:offset + instruction.length] = bytes([OPERAND]) * (instruction.length - 1)
+
+	def kind(self, address):
+		return KINDS[self.map[address - START]] if START <= address < END else 'data'
+
+	def isCode(self, address):
+		return START <= address < END and self.map[address - START] != DATA
+
+	# (start, end, kind) runs of code and data, operands are part of code runs
+	def ranges(self):
+		runs = []
+		start = START
+		code = self.map[0] != DATA
+		for address in range(START + 1, END):
+			isCode = self.map[address - START] != DATA
+			if isCode != code:
+				runs.append((start, address, 'code' if code else 'data'))
+				start = address
+				code = isCode
+		runs.append((start, END, 'code' if code else 'data'))
+		return runs
+
+	# listing lines, decoded instructions in the nestest layout and data as .byte rows
+	def lines(self, start=START, end=END):
+		read = self.cpu.memory.read
+		address = start
+		while address < end:
+			instruction = self.instructions.get(address)
+			if instruction is not None:
+				yield formatInstruction(self.cpu, instruction, read(address))
+				address += instruction.length
+				continue
+			run = address
+			while address < end and address - run < 8 and not self.isCode(address):
+				address += 1
+			if address == run:
+				# operand byte of an instruction starting before start
+				address += 1
+			yield '{:04X}  .byte {}'.format(run, ', '.join('${:02X}'.format(read(a)) for a in range(run, address)))
+
+	# predecoded instructions replace reads of memory in the translator while attached. Writes to
+	# the pages holding code drop the instructions they land on.
+	def attach(self):
+		if self.attached:
+			return
+		self.cpu.disassembly = self
+		for page in self.pages():
+			self.cpu.memory.watch(page, self.invalidate)
+		self.attached = True
+
+	def detach(self):
+		if not self.attached:
+			return
+		for page in self.pages():
+			self.cpu.memory.unwatch(page, self.invalidate)
+		if self.cpu.disassembly is self:
+			self.cpu.disassembly = None
+		self.attached = False
+
+	def pages(self):
+		return sorted({address >> 8 for address in range(START, END) if self.map[address - START] != DATA})
+
+	# memory watcher, a written byte is no longer known to be code
+	def invalidate(self, address):
+		if not self.isCode(address):
+			return
+		pc = address
+		while self.map[pc - START] != OPCODE:
+			pc -= 1
+		instruction = self.instructions.pop(pc)
+		self.map[pc - START:pc - START + instruction.length] = bytes(instruction.length)
+
+	def toJSON(self):
+		return json.dumps({
+			'version': VERSION,
+			'hash': self.hash,
+			'entries': self.entries,
+			'map': [[start, end, kind] for start, end, kind in self.ranges()],
+			'instructions': [[address, instruction.length] for address, instruction in sorted(self.instructions.items())],
+		})
+
+	# restore a disassembly saved by toJSON for the same ROM, instructions are decoded again
+	# from the bytes they cover. Returns None if the data is for another ROM or version.
+	@classmethod
+	def fromJSON(cls, cpu, text):
+		data = json.loads(text)
+		disassembly = cls(cpu, data['entries'])
+		if data['version'] != VERSION or data['hash'] != disassembly.hash:
+			return None
+		for address, length in data['instructions']:
+			instruction = disassembly.decode(address)
+			if instruction is None or instruction.length != length:
+				raise Exception('Invalid disassembly at ${:04X}'.format(address))
+			disassembly.add(instruction)
+		return disassembly
+
+# disassemble the CPU's ROM
+def disassemble(cpu, entries=()):
+	return Disassembly(cpu, entries).walk()
+
+# disassembly of the CPU's ROM from directory, disassembled and saved there on a miss
+def cached(cpu, directory, entries=()):
+	path = os.path.join(directory, romHash(cpu.cartridge) + '.json')
+	if os.path.exists(path):
+		with open(path) as file:
+			disassembly = Disassembly.fromJSON(cpu, file.read())
+		if disassembly is not None and disassembly.entries == sorted(entries):
+			return disassembly
+	disassembly = disassemble(cpu, entries)
+	os.makedirs(directory, exist_ok=True)
+	with open(path, 'w') as file:
+		file.write(disassembly.toJSON())
+	return disassembly
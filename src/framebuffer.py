@@ -0,0 +1,79 @@
+# RGB framebuffer
+# The renderer draws palette RAM values, one byte per pixel, into a preallocated 240x256 buffer.
+# They are converted to RGB or RGBA through lookup tables, one for each combination of the
+# PPUMASK grayscale and color emphasis bits, into preallocated arrays with np.take, so a frame
+# is converted without per-pixel work in Python. The arrays support the buffer protocol and
+# can be handed to frontends and encoders as they are.
+import numpy as np
+
+import renderer
+
+# 2C02 palette, RGB by palette value
+COLORS = np.array([
+	(84, 84, 84), (0, 30, 116), (8, 16, 144), (48, 0, 136), (68, 0, 100), (92, 0, 48), (84, 4, 0), (60, 24, 0),
+	(32, 42, 0), (8, 58, 0), (0, 64, 0), (0, 60, 0), (0, 50, 60), (0, 0, 0), (0, 0, 0), (0, 0, 0),
+	(152, 150, 152), (8, 76, 196), (48, 50, 236), (92, 30, 228), (136, 20, 176), (160, 20, 100), (152, 34, 32), (120, 60, 0),
+	(84, 90, 0), (40, 114, 0), (8, 124, 0), (0, 118, 40), (0, 102, 120), (0, 0, 0), (0, 0, 0), (0, 0, 0),
+	(236, 238, 236), (76, 154, 236), (120, 124, 236), (176, 98, 236), (228, 84, 236), (236, 88, 180), (236, 106, 100), (212, 136, 32),
+	(160, 170, 0), (116, 196, 0), (76, 208, 32), (56, 204, 108), (56, 180, 204), (60, 60, 60), (0, 0, 0), (0, 0, 0),
+	(236, 238, 236), (168, 204, 236), (188, 188, 236), (212, 178, 236), (236, 174, 236), (236, 174, 212), (236, 180, 176), (228, 196, 144),
+	(204, 210, 120), (180, 222, 120), (168, 226, 144), (152, 226, 180), (160, 214, 228), (160, 162, 160), (0, 0, 0), (0, 0, 0),
+], np.uint8)
+
+# each emphasis bit darkens the other two channels
+ATTENUATION = 0.816
+
+# color mode: bit 0 grayscale, bits 1-3 red, green and blue emphasis as in PPUMASK bits 0 and 5-7
+MODES = 16
+
+def buildTables():
+	values = np.arange(64)
+	tables = np.zeros((MODES, 64, 4), np.uint8)
+	for mode in range(MODES):
+		colors = COLORS[values & 0x30 if mode & 1 else values].astype(np.float64)
+		emphasis = mode >> 1
+		for channel in range(3):
+			colors[:, channel] *= ATTENUATION ** bin(emphasis & ~(1 << channel)).count('1')
+		tables[mode, :, :3] = np.round(colors)
+		tables[mode, :, 3] = 0xFF
+	return tables
+
+RGBA = buildTables()
+RGB = np.ascontiguousarray(RGBA[:, :, :3])
+# RGBA tables as native 32-bit words, so a pixel converts with one lookup
+RGBA32 = RGBA.view(np.uint32).reshape(MODES, 64)
+
+class Framebuffer:
+	def __init__(self, ppu):
+		self.ppu = ppu
+		self.pixels = ppu.renderer.pixels
+		self.modes = ppu.renderer.modes
+		self.rgba = np.zeros((renderer.HEIGHT, renderer.WIDTH, 4), np.uint8)
+		self.rgb = np.zeros((renderer.HEIGHT, renderer.WIDTH, 3), np.uint8)
+		self.rgba32 = self.rgba.view(np.uint32).reshape(renderer.HEIGHT, renderer.WIDTH)
+
+	# runs of lines drawn with the same color mode as (start, end, mode)
+	def runs(self):
+		modes = self.modes
+		starts = np.flatnonzero(np.diff(modes)) + 1
+		bounds = [0] + starts.tolist() + [len(modes)]
+		return [(start, end, modes[start]) for start, end in zip(bounds, bounds[1:])]
+
+	# convert the current frame, returns the (240, 256, 4) array, it is reused by every call
+	def toRGBA(self):
+		for start, end, mode in self.runs():
+			np.take(RGBA32[mode], self.pixels[start:end], out=self.rgba32[start:end])
+		return self.rgba
+
+	# as toRGBA with (240, 256, 3) pixels
+	def toRGB(self):
+		for start, end, mode in self.runs():
+			np.take(RGB[mode], self.pixels[start:end], axis=0, out=self.rgb[start:end])
+		return self.rgb
+
+	# zero-copy views of the converted frame for consumers of the buffer protocol
+	def rgbaBuffer(self):
+		return memoryview(self.toRGBA())
+
+	def rgbBuffer(self):
+		return memoryview(self.toRGB())
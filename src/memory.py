@@ -1,25 +1,231 @@
+# Memory bus
+# The address space is split into 256-byte pages. Each page is either mapped to a 256-byte
+# view of a buffer, read and written with a single index, or served by read/write handlers
+# for memory mapped IO. Mirrors map several pages to the same view.
+
 class Memory:
 	def __init__(self, size):
-		self.memory = [0 for i in range(size)]
+		self.memory = bytearray(size)
+		self.pageCount = (size + 0xFF) >> 8
+		view = memoryview(self.memory)
+		# page tables: a view for direct pages, None for pages served by the handlers
+		self.readPages = [view[page << 8:(page + 1) << 8] for page in range(self.pageCount)]
+		self.writePages = list(self.readPages)
+		self.readHandlers = [None] * self.pageCount
+		self.writeHandlers = [None] * self.pageCount
+		# write watchers by page, and the mapping a watched page had before it was armed
+		self.watchers = [None] * self.pageCount
+		self.watchedPages = {}
+		# read watchers by page, and the read side a page had before it was armed
+		self.readWatchers = [None] * self.pageCount
+		self.readWatchedPages = {}
+		# backing buffer page by the id of its view, to find where a page's writes land
+		self.views = list(self.readPages)
+		self.viewPages = {id(view): page for page, view in enumerate(self.views)}
+		# backing pages written since the last takeDirty and the pages disarmed by those writes
+		self.dirty = None
+		self.disarmed = []
 
 	def write(self, address, value):
-		self.memory[address] = value
+		page = self.writePages[address >> 8]
+		if page is None:
+			self.writeHandlers[address >> 8](address, value & 0xFF)
+		else:
+			page[address & 0xFF] = value & 0xFF
 
 	def read(self, address):
-		return self.memory[address]
+		page = self.readPages[address >> 8]
+		if page is None:
+			return self.readHandlers[address >> 8](address)
+		return page[address & 0xFF]
+
+	# byte at address without the side effects of a read, None for pages served by handlers
+	def peek(self, address):
+		page = address >> 8
+		view = self.readWatchedPages.get(page, (self.readPages[page],))[0]
+		return view[address & 0xFF] if view is not None else None
 
 	def read16(self, address):
 		if address == 0xFF:
-			return self.memory[address] + (self.memory[0] << 8)
-		return self.memory[address] + (self.memory[address + 1] << 8)
+			return self.read(address) + (self.read(0) << 8)
+		return self.read(address) + (self.read(address + 1) << 8)
 
 	def write16(self, address, value):
-		if address == 0xFF: 
-			self.memory[address] + value & 0xFF
-			self.memory[0x00] = (value >> 8) & 0xFF
-		self.memory[address] = value & 0xFF
-		self.memory[address + 1] = (value >> 8) & 0xFF
+		if address == 0xFF:
+			self.write(0x00, (value >> 8) & 0xFF)
+		self.write(address, value & 0xFF)
+		self.write(address + 1, (value >> 8) & 0xFF)
+
+	# map [start, end) onto a buffer, which may be shorter than the range and is then mirrored
+	def mapBuffer(self, start, end, buffer, writable=True):
+		view = memoryview(buffer)
+		for page in range(start >> 8, end >> 8):
+			offset = ((page << 8) - start) % len(view)
+			self.setPage(page, view[offset:offset + 0x100], view[offset:offset + 0x100] if writable else None,
+			             None, None if writable else self.ignoreWrite)
+
+	# map [start, end) as a mirror of the pages in [source, source + length)
+	def mirror(self, start, end, source, length):
+		for page in range(start >> 8, end >> 8):
+			sourcePage = (source >> 8) + (page - (start >> 8)) % (length >> 8)
+			readPage, readHandler = self.readWatchedPages.get(sourcePage,
+				(self.readPages[sourcePage], self.readHandlers[sourcePage]))
+			original = self.watchedPages.get(sourcePage)
+			if original is None:
+				original = (readPage, self.writePages[sourcePage], readHandler, self.writeHandlers[sourcePage])
+			self.setPage(page, readPage, original[1], readHandler, original[3])
+
+	# serve [start, end) through handlers, read(address) returns a byte and write(address, value)
+	def mapHandlers(self, start, end, read, write):
+		for page in range(start >> 8, end >> 8):
+			self.setPage(page, None, None, read, write)
+
+	def setPage(self, page, readPage, writePage, readHandler, writeHandler):
+		if page in self.readWatchedPages:
+			self.readWatchedPages[page] = (readPage, readHandler)
+		else:
+			self.readPages[page] = readPage
+			self.readHandlers[page] = readHandler
+		if page in self.watchedPages:
+			self.watchedPages[page] = (readPage, writePage, readHandler, writeHandler)
+		else:
+			self.writePages[page] = writePage
+			self.writeHandlers[page] = writeHandler
+
+	def ignoreWrite(self, address, value):
+		pass
+
+	# call watcher(address) after every write to page. Watching a page routes its writes
+	# through watchedWrite, so unwatched pages keep the direct path.
+	def watch(self, page, watcher):
+		if self.watchers[page] is None:
+			self.watchers[page] = []
+			self.watchedPages[page] = (self.readPages[page], self.writePages[page],
+			                           self.readHandlers[page], self.writeHandlers[page])
+			self.writePages[page] = None
+			self.writeHandlers[page] = self.watchedWrite
+		self.watchers[page].append(watcher)
+
+	def unwatch(self, page, watcher):
+		watchers = self.watchers[page]
+		watchers.remove(watcher)
+		if not watchers:
+			self.watchers[page] = None
+			readPage, writePage, readHandler, writeHandler = self.watchedPages.pop(page)
+			self.writePages[page] = writePage
+			self.writeHandlers[page] = writeHandler
+
+	def watchedWrite(self, address, value):
+		page = address >> 8
+		readPage, writePage, readHandler, writeHandler = self.watchedPages[page]
+		if writePage is None:
+			writeHandler(address, value)
+		else:
+			writePage[address & 0xFF] = value
+		for watcher in list(self.watchers[page]):
+			watcher(address)
+
+	# call watcher(address, value) after every read of page, routing its reads through watchedRead
+	def watchReads(self, page, watcher):
+		if self.readWatchers[page] is None:
+			self.readWatchers[page] = []
+			self.readWatchedPages[page] = (self.readPages[page], self.readHandlers[page])
+			self.readPages[page] = None
+			self.readHandlers[page] = self.watchedRead
+		self.readWatchers[page].append(watcher)
+
+	def unwatchReads(self, page, watcher):
+		watchers = self.readWatchers[page]
+		watchers.remove(watcher)
+		if not watchers:
+			self.readWatchers[page] = None
+			self.readPages[page], self.readHandlers[page] = self.readWatchedPages.pop(page)
+
+	def watchedRead(self, address):
+		page = address >> 8
+		readPage, readHandler = self.readWatchedPages[page]
+		value = readHandler(address) if readPage is None else readPage[address & 0xFF]
+		for watcher in list(self.readWatchers[page]):
+			watcher(address, value)
+		return value
+
+	# dirty page tracking: the first write to an armed page marks the backing page it writes to
+	# and disarms it, so later writes take the direct path until takeDirty arms it again
+	def trackDirty(self):
+		self.dirty = set()
+		self.disarmed = []
+		for page in range(self.pageCount):
+			self.watch(page, self.markDirty)
+
+	def untrackDirty(self):
+		for page in range(self.pageCount):
+			if page not in self.disarmed:
+				self.unwatch(page, self.markDirty)
+		self.dirty = None
+		self.disarmed = []
+
+	def markDirty(self, address):
+		page = address >> 8
+		backing = self.backingPage(page)
+		if backing is not None:
+			self.dirty.add(backing)
+		self.unwatch(page, self.markDirty)
+		self.disarmed.append(page)
+
+	# sorted backing pages written since the last call, rearms the pages those writes disarmed
+	def takeDirty(self):
+		dirty = self.dirty
+		for page in self.disarmed:
+			self.watch(page, self.markDirty)
+		self.dirty = set()
+		self.disarmed = []
+		return sorted(dirty)
+
+	# backing buffer page that writes to page land in, None when they go to another buffer.
+	# Pages served by handlers are assumed to keep their state in their own backing page.
+	def backingPage(self, page):
+		original = self.watchedPages.get(page)
+		writePage = original[1] if original is not None else self.writePages[page]
+		if writePage is None:
+			return page
+		return self.viewPages.get(id(writePage))
+
+	# replace the whole backing buffer with data. Watchers are told about every byte that changes
+	# on a watched page, so compiled code in restored memory is invalidated.
+	def restore(self, data):
+		views = {page: self.readWatchedPages.get(page, (self.readPages[page],))[0] for page in self.watchedPages}
+		watched = [(page, bytes(view)) for page, view in views.items() if view is not None]
+		self.memory[:] = data
+		for page, before in watched:
+			after = views[page]
+			if after != before:
+				for offset in range(0x100):
+					if after[offset] != before[offset]:
+						for watcher in list(self.watchers[page] or ()):
+							watcher((page << 8) | offset)
+
+	# NES CPU address space
+	# $0000-$07FF RAM, mirrored through $1FFF
+	# $2000-$2007 PPU registers, mirrored through $3FFF
+	# $4000-$401F APU and IO registers, $4014 is OAM DMA
+	# $4020-$FFFF cartridge space: expansion ROM, SRAM at $6000-$7FFF and PRG ROM at $8000-$FFFF
+	def mapConsole(self, ppu):
+		self.mirror(0x0800, 0x2000, 0x0000, 0x0800)
+		self.mapHandlers(0x2000, 0x4000,
+			lambda address: ppu.readRegister(0x2000 | (address & 7)),
+			lambda address, value: ppu.writeRegister(0x2000 | (address & 7), value))
+		io = self.readPages[0x40]
+		def writeIO(address, value):
+			if address == 0x4014:
+				ppu.writeRegister(address, value)
+			io[address & 0xFF] = value
+		self.mapHandlers(0x4000, 0x4100, lambda address: io[address & 0xFF], writeIO)
 
+	# map PRG ROM read-only into $8000-$FFFF without copying, a single 16KB bank is mirrored at
+	# $C000. Larger ROMs power up with the first bank at $8000 and the last at $C000.
 	def loadROM(self, rom):
-		self.memory[0xC000:(0xC000 + 0x4000 * rom.prg_rom_size)] = rom.prg_rom
-		
\ No newline at end of file
+		if len(rom.prg_rom) <= 0x8000:
+			self.mapBuffer(0x8000, 0x10000, rom.prg_rom, False)
+		else:
+			self.mapBuffer(0x8000, 0xC000, rom.prg_banks[0], False)
+			self.mapBuffer(0xC000, 0x10000, rom.prg_banks[-1], False)
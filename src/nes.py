@@ -0,0 +1,36 @@
+# NES console, wires the CPU and PPU together over the CPU memory bus
+import cpu
+import ppu
+import savestate
+import scheduler
+
+class NES:
+	# cartridge is a rom.ROM, nestest is loaded when it is not given. renderInterval sets the
+	# PPU's frame skip, 0 runs headless and draws only frames asked for with ppu.requestFrame.
+	# The console runs the untraced block path, set cpu.debug to trace.
+	def __init__(self, cartridge=None, renderInterval=1):
+		self.cpu = cpu.CPU(cartridge)
+		self.cpu.debug = False
+		self.cpu.console = self
+		self.ppu = ppu.PPU(self)
+		self.ppu.renderInterval = renderInterval
+		self.cpu.memory.mapConsole(self.ppu)
+		self.ppu.loadROM(self.cpu.cartridge)
+
+	# run the CPU to the start of the next frame, vblank and its NMI are handled by scheduled
+	# events on the way. Returns the CPU stop reason.
+	def runFrame(self):
+		return self.runUntil(self.ppu.nextFrame())
+
+	# run the CPU until its cycle count, in PPU dots, reaches cycles
+	def runUntil(self, cycles):
+		if self.cpu.cycles >= cycles:
+			return cpu.STOP_CYCLES
+		return self.cpu.run(max_cycles=scheduler.toCycles(cycles - self.cpu.cycles))
+
+	# snapshot of the CPU and PPU as a binary blob, see savestate
+	def saveState(self):
+		return savestate.save(self.cpu, self.ppu)
+
+	def loadState(self, state):
+		savestate.load(state, self.cpu, self.ppu)
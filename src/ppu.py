@@ -11,15 +11,46 @@
 # $3F20-$3FFF	$00E0	Mirrors of $3F00-$3F1F
 
 
+import framebuffer
 import memory
+import renderer
+import rom
+import scheduler
+import sprites
+import tiles
+
+DOTS_PER_SCANLINE = 341
+SCANLINES = 262
+VISIBLE_SCANLINES = 240
+VBLANK_SCANLINE = 241
+PRERENDER_SCANLINE = 261
+
+def paletteIndex(address):
+	index = address & 0x1F
+	return index & 0x0F if index & 0x13 == 0x10 else index
 
 class PPU:
-	def __init__(self, nes)
+	def __init__(self, nes):
+		self.nes = nes
 		self.memory = memory.Memory(0x4000)
 		self.cpuMemory = self.nes.cpu.memory
-		self.nes = nes
 		self.scanline = 0
 		self.cycle = 0
+		self.frames = 0
+		# CPU cycle count, in PPU dots, the PPU has been run up to
+		self.clock = 0
+		# set when vblank starts or NMI is enabled during vblank, cleared when the CPU takes it
+		self.nmiPending = 0
+		self.scheduler = self.nes.cpu.scheduler
+		self.vblankEvent = None
+		self.frameEvent = None
+		self.nmiEvent = None
+		# frame skip: every renderInterval-th frame is drawn, none but requested ones when it is 0.
+		# Skipped frames keep the timing and PPUSTATUS flags, the last drawn frame stays in pixels.
+		self.renderInterval = 1
+		self.renderRequested = False
+		# whether the current frame is drawn, decided when its first line is
+		self.drawing = True
 
 		self.shift16_1 = 0
 		self.shift16_2 = 0
@@ -44,7 +75,8 @@ class PPU:
 		self.flag_grayscale = 0
 
 		# PPUSTATUS ($2002)
-		self.ppustatus = 0 #TODO: flags?
+		self.ppustatus = 0
+		self.flag_vblank = 0
 		self.flag_sprite_zero_hit = 0
 		self.flag_sprite_overflow = 0
 
@@ -53,6 +85,8 @@ class PPU:
 
 		# OAMDATA ($2004)
 		self.oamdata = 0
+		# object attribute memory, 64 sprites of Y, tile, attributes and X
+		self.oam = bytearray(256)
 
 		# PPUSCROLL ($2005)
 		self.ppuscroll = 0
@@ -62,6 +96,7 @@ class PPU:
 		self.ppuaddr = 0
 		self.ppuaddrBuffer = 0
 		self.addressLatch = 0
+		self.fineX = 0
 
 		# PPUDATA ($2007)
 		self.ppudata = 0
@@ -69,158 +104,368 @@ class PPU:
 		# OAMDMA ($4014)
 		self.oamdma = 0
 
+		# register handlers indexed by address & 7
+		self.registerReads = [None, None, self.read_ppustatus, None, self.read_oamdata, None, None, self.read_ppudata]
+		self.registerWrites = [self.write_ppuctrl, self.write_ppumask, None, self.write_oamaddr,
+		                       self.write_oamdata, self.write_ppuscroll, self.write_ppuaddr, self.write_ppudata]
+
+		self.palette = self.memory.views[0x3F]
+		self.memory.mapHandlers(0x3F00, 0x4000, self.readPalette, self.writePalette)
+
+		self.events = self.buildEvents()
+		self.sprites = sprites.SpriteIndex(self)
+		self.tiles = tiles.TileCache(self)
+		self.renderer = renderer.Renderer(self)
+		self.framebuffer = framebuffer.Framebuffer(self)
+		self.schedule()
+
+	# map CHR ROM read-only into the pattern tables and set up nametable mirroring, CHR RAM stays
+	# in PPU memory
+	def loadROM(self, cartridge):
+		if len(cartridge.chr_rom):
+			self.memory.mapBuffer(0x0000, 0x2000, cartridge.chr_banks[0], False)
+		if cartridge.mirroring == rom.HORIZONTAL:
+			self.memory.mirror(0x2400, 0x2800, 0x2000, 0x400)
+			self.memory.mirror(0x2C00, 0x3000, 0x2800, 0x400)
+		elif cartridge.mirroring == rom.VERTICAL:
+			self.memory.mirror(0x2800, 0x3000, 0x2000, 0x800)
+		self.memory.mirror(0x3000, 0x3F00, 0x2000, 0x1000)
+		self.tiles.rebuild()
 
 	def read(self, address):
-		return self.memory[address]
+		return self.memory.read(address)
 
 	def write(self, address, value):
-		self.memory[address] = value & 0xFF
+		self.memory.write(address, value & 0xFF)
 
+	# advance one dot, scanline events run on the dot they happen
 	def step(self):
-		renderLine = self.scanline < 240
-		vBlankLine = self.scanline == 241
-		preRenderLine = self.scanline == 261
-		renderingEnabled = self.flag_show_background or self.flag_show_sprites
-
-		if preRender:
-			pass
-
-		if renderingEnabled:
-			if renderLine:
-				if  1 <= self.cycle <= 256:
-					self.renderPixel()
-
-				#fetch Name Table byte
-				self.fetchNameTableByte()
-				#fetch Attribute Table byte
-				self.fetchAttributeTableByte()
-				#fetch Low Tile byte
-				self.fetchLowTileByte()
-				#fetch High Tile byte
-				self.fetchHighTileByte()
-
-				#cycle 256,257 inc X and Y
-				pass 
-
-			if self.cycle == 257:
-				self.evaluateSprites() #TODO
-
-		#do nothing on scanlines 240, 242-260 ??
-
-		elif vBlankLine:
-			# set vblank
-			pass
-
-		# TODO: advance to next frame
-		elif preRenderLine:
-			# TODO: load first two tiles of next scanline
-			if self.cycle == 340:
-				self.cycle = -1
-				self.scanline = 0
-
-		# advance to next scanline
-		if self.cycle >= 340
-			self.scanline += 1
-			self.cycle = -1
-
-		self.cycle += 1
-
-	def renderPixel():
-		raise Exception('renderPixel not implemented')
-
-	def fetchNameTableByte():
-		raise Exception('fetchNameTableByte not implemented')
-
-	def fetchAttributeTableByte():
-		raise Exception('fetchAttributeTableByte not implemented')
-
-	def fetchLowTileByte():
-		raise Exception('fetchLowTileByte not implemented')
-
-	def fetchHighTileByte():
-		raise Exception('fetchHighTileByte not implemented')
-
+		self.advance(1)
+		self.clock += 1
+
+	# run the rest of the current scanline's events and advance to the start of the next
+	def stepScanline(self):
+		self.clock += DOTS_PER_SCANLINE - self.cycle
+		self.finishScanline()
+
+	# advance to the start of the next frame
+	def stepFrame(self):
+		frames = self.frames
+		while self.frames == frames:
+			self.stepScanline()
+
+	# Catch-up: the PPU is not stepped alongside the CPU. It runs the dots between its clock and
+	# the CPU's cycle count when a register is accessed and when the console runs to a PPU event,
+	# so the state the CPU sees is the same as if it had been stepped all along.
+	def catchUp(self, cycles=None):
+		if cycles is None:
+			cycles = self.nes.cpu.cycles
+		if cycles > self.clock:
+			self.advance(cycles - self.clock)
+			self.clock = cycles
+
+	# run the events of the next dots without moving the clock
+	def advance(self, dots):
+		while dots:
+			remaining = DOTS_PER_SCANLINE - self.cycle
+			if dots >= remaining:
+				self.finishScanline()
+				dots -= remaining
+			else:
+				end = self.cycle + dots
+				for dot, event in self.events[self.scanline]:
+					if self.cycle <= dot < end:
+						event()
+				self.cycle = end
+				dots = 0
+
+	def finishScanline(self):
+		for dot, event in self.events[self.scanline]:
+			if dot >= self.cycle:
+				event()
+		self.nextScanline()
+
+	# clock value once the PPU has run the given dot, the next time it is reached
+	def cycleAt(self, scanline, dot):
+		dots = (scanline - self.scanline) * DOTS_PER_SCANLINE + dot - self.cycle
+		if dots < 0:
+			dots += SCANLINES * DOTS_PER_SCANLINE
+		return self.clock + dots + 1
+
+	# clock value by which the next vblank has started
+	def nextVBlank(self):
+		return self.cycleAt(VBLANK_SCANLINE, 1)
+
+	# clock value at the start of the next frame
+	def nextFrame(self):
+		return self.clock + (SCANLINES - self.scanline) * DOTS_PER_SCANLINE - self.cycle
+
+	# clock value before which PPUSTATUS reads keep returning what a read at cycles returns:
+	# the next start or end of vblank, the first line sprite zero could hit on, or the next line
+	# with more than 8 sprites. The clock itself while on such a line or the one after it, as
+	# the flag may have been set since the loop last read it.
+	def statusStableUntil(self, cycles):
+		self.catchUp(cycles)
+		bound = min(self.nextVBlank(), self.cycleAt(PRERENDER_SCANLINE, 1))
+		if self.flag_show_background and self.flag_show_sprites:
+			first = self.oam[0] + 1
+			if first <= self.scanline <= first + (16 if self.flag_sprite_size else 8):
+				return self.clock
+			if not self.flag_sprite_zero_hit and self.scanline < first < VISIBLE_SCANLINES:
+				bound = min(bound, self.cycleAt(first, 0))
+		if self.renderingEnabled() and self.scanline <= VISIBLE_SCANLINES:
+			self.sprites.update()
+			previous = max(self.scanline - 1, 0)
+			lines = self.sprites.overflow[previous:].nonzero()[0] + previous
+			if len(lines):
+				if lines[0] <= self.scanline:
+					return self.clock
+				if not self.flag_sprite_overflow:
+					bound = min(bound, self.cycleAt(int(lines[0]), 0))
+		return bound
+
+	# (re)schedule the vblank and end of frame events from the clock, and a pending NMI, after
+	# construction and when a state is loaded
+	def schedule(self):
+		for event in (self.vblankEvent, self.frameEvent, self.nmiEvent):
+			self.scheduler.cancel(event)
+		self.vblankEvent = self.scheduler.schedule(self.nextVBlank(), self.onVBlank)
+		self.frameEvent = self.scheduler.schedule(self.nextFrame(), self.onFrame)
+		self.nmiEvent = self.scheduler.schedule(self.clock, self.takeNMI) if self.nmiPending else None
+
+	# catch up when vblank is due so its NMI is raised on time
+	def onVBlank(self):
+		self.catchUp()
+		self.vblankEvent = self.scheduler.schedule(self.nextVBlank(), self.onVBlank)
+
+	# catch up at the end of every frame so it is complete when the CPU stops there
+	def onFrame(self):
+		self.catchUp()
+		self.frameEvent = self.scheduler.schedule(self.nextFrame(), self.onFrame)
+
+	# the NMI is taken by the CPU at the next instruction boundary
+	def raiseNMI(self):
+		self.nmiPending = 1
+		self.scheduler.cancel(self.nmiEvent)
+		self.nmiEvent = self.scheduler.schedule(self.clock, self.takeNMI)
+
+	def takeNMI(self):
+		self.nmiEvent = None
+		if self.nmiPending:
+			self.nmiPending = 0
+			self.nes.cpu.nmi()
+
+	def nextScanline(self):
+		self.cycle = 0
+		self.scanline += 1
+		if self.scanline == SCANLINES:
+			self.scanline = 0
+			self.frames += 1
+
+	# events by scanline as (dot, event)
+	def buildEvents(self):
+		events = [[] for line in range(SCANLINES)]
+		for line in range(VISIBLE_SCANLINES):
+			events[line].append((256, self.renderScanline))
+		events[VBLANK_SCANLINE].append((1, self.startVBlank))
+		events[PRERENDER_SCANLINE].append((1, self.endVBlank))
+		events[PRERENDER_SCANLINE].append((304, self.prepareFrame))
+		return events
+
+	# grayscale and emphasis bits selecting the framebuffer color table
+	def colorMode(self):
+		return self.flag_grayscale | (self.flag_red_tint << 1) | (self.flag_green_tint << 2) | (self.flag_blue_tint << 3)
+
+	def renderingEnabled(self):
+		return self.flag_show_background or self.flag_show_sprites
+
+	# the whole line is drawn at once with the registers in effect at its end, then v moves
+	# to the next line as the per-dot increments would have left it
+	def renderScanline(self):
+		if self.scanline == 0:
+			self.drawing = self.renderRequested or (self.renderInterval > 0 and self.frames % self.renderInterval == 0)
+			self.renderRequested = False
+		if self.renderingEnabled():
+			if self.drawing:
+				self.renderer.renderScanline(self.scanline)
+			else:
+				self.renderer.renderFlags(self.scanline)
+			self.incrementY()
+			self.copyX()
+		elif self.drawing:
+			self.renderer.renderBackdrop(self.scanline)
+
+	# draw the next frame whatever the frame skip, when asked before its first line
+	def requestFrame(self):
+		self.renderRequested = True
+
+	def startVBlank(self):
+		self.flag_vblank = 1
+		if self.flag_nmi_enable:
+			self.raiseNMI()
+
+	def endVBlank(self):
+		self.flag_vblank = 0
+		self.flag_sprite_zero_hit = 0
+		self.flag_sprite_overflow = 0
 
+	def prepareFrame(self):
+		if self.renderingEnabled():
+			self.copyX()
+			self.copyY()
+
+	# https://wiki.nesdev.com/w/index.php/PPU_scrolling
+	# v is ppuaddr, t is ppuaddrBuffer, x is fineX and w is addressLatch
+	def incrementY(self):
+		v = self.ppuaddr
+		if (v & 0x7000) != 0x7000:
+			v += 0x1000
+		else:
+			v &= 0x0FFF
+			y = (v & 0x03E0) >> 5
+			if y == 29:
+				y = 0
+				v ^= 0x0800
+			elif y == 31:
+				y = 0
+			else:
+				y += 1
+			v = (v & 0x7C1F) | (y << 5)
+		self.ppuaddr = v
+
+	# v: ....F.. ...EDCBA = t: ....F.. ...EDCBA
+	def copyX(self):
+		self.ppuaddr = (self.ppuaddr & 0x7BE0) | (self.ppuaddrBuffer & 0x041F)
+
+	# v: IHGF.ED CBA..... = t: IHGF.ED CBA.....
+	def copyY(self):
+		self.ppuaddr = (self.ppuaddr & 0x041F) | (self.ppuaddrBuffer & 0x7BE0)
+
+	# palette RAM lives in the backing page of $3F00, $3F10/$3F14/$3F18/$3F1C mirror $3F00/$3F04/$3F08/$3F0C
+	def readPalette(self, address):
+		return self.palette[paletteIndex(address)]
+
+	def writePalette(self, address, value):
+		self.palette[paletteIndex(address)] = value & 0x3F
+
+	# CPU reads of $2000-$2007, write-only registers read back as 0
 	def readRegister(self, address):
-		#PPUSTATUS
-		if address == 0x2002:
-			return self.read_ppustatus()
-		#OAMDATA
-		if address == 0x2004:
-			return self.read_oamdata()
-		#PPUDATA
-		if address == 0x2007:
-			return self.read_ppudata()
-
-	def writeRegister(self,address):
-		# PPUCTRL
-		if address == 0x2000:
-			return self.write_ppuctrl()
-		#PPUMASK
-		if address == 0x2001:
-			return self.write_ppumask()
-		#OAMADDR
-		if address == 0x2003:
-			return self.write_oamaddr()
-		#OAMDATA
-		if address == 0x2004:
-			return self.write_oamdata()
-		#PPUSCROLL
-		if address == 0x2005:
-			return self.write_ppuscroll()
-		#PPUADDR
-		if address == 0x2006:
-			return self.write_ppuaddr()
-		#PPUDATA
-		if address == 0x2007:
-			return self.write_ppudata()
+		self.catchUp()
+		handler = self.registerReads[address & 7]
+		if handler is None:
+			return 0
+		return handler()
+
+	# CPU writes of $2000-$2007 and $4014
+	def writeRegister(self, address, value):
+		self.catchUp()
 		#OAMDMA
 		if address == 0x4014:
-			return self.write_oamdma()
+			return self.write_oamdma(value)
+		handler = self.registerWrites[address & 7]
+		if handler is not None:
+			handler(value)
 
 	def read_ppustatus(self):
+		# a sprite zero hit on the current line happens at its dot, before the line is drawn
+		if not self.flag_sprite_zero_hit and self.scanline < VISIBLE_SCANLINES and 1 < self.cycle <= 256:
+			hit = self.renderer.spriteZeroHit(self.scanline)
+			if hit is not None and self.cycle > hit + 1:
+				self.flag_sprite_zero_hit = 1
 		self.addressLatch = 0
-		pass
+		self.ppustatus = (self.flag_vblank << 7) | (self.flag_sprite_zero_hit << 6) | (self.flag_sprite_overflow << 5)
+		self.flag_vblank = 0
+		return self.ppustatus
 	def read_oamdata(self):
-		pass
+		return self.oam[self.oamaddr]
+	# reads below the palette return the previous read and buffer this one, palette reads are
+	# returned at once and buffer the nametable byte underneath
 	def read_ppudata(self):
+		address = self.ppuaddr & 0x3FFF
+		value = self.ppudata
+		self.ppudata = self.read(address)
+		if address >= 0x3F00:
+			value = self.ppudata
+			self.ppudata = self.read(address - 0x1000)
 		self.inc_ppuaddr()
-		pass
-	def write_ppuctrl(self):
-		pass
-	def write_ppumask(self):
-		pass
-	def write_oamaddr(self):
-		pass
-	def write_oamdata(self):
-		pass
-	def write_ppuscroll(self):
-		pass
+		return value
+	def write_ppuctrl(self, value):
+		self.flag_nametable_select = value & 3
+		self.flag_increment_mode = (value >> 2) & 1
+		self.flag_sprite_table = (value >> 3) & 1
+		self.flag_background_table = (value >> 4) & 1
+		self.flag_sprite_size = (value >> 5) & 1
+		self.flag_master_slave = (value >> 6) & 1
+		# enabling NMI during vblank raises it at once
+		if value & 0x80 and not self.flag_nmi_enable and self.flag_vblank:
+			self.raiseNMI()
+		self.flag_nmi_enable = (value >> 7) & 1
+		# t: ...BA.. ........ = d: ......BA
+		self.ppuaddrBuffer = (self.ppuaddrBuffer & 0x73FF) | ((value & 3) << 10)
+	def write_ppumask(self, value):
+		self.flag_grayscale = value & 1
+		self.flag_show_left_background = (value >> 1) & 1
+		self.flag_show_left_sprites = (value >> 2) & 1
+		self.flag_show_background = (value >> 3) & 1
+		self.flag_show_sprites = (value >> 4) & 1
+		self.flag_red_tint = (value >> 5) & 1
+		self.flag_green_tint = (value >> 6) & 1
+		self.flag_blue_tint = (value >> 7) & 1
+	def write_oamaddr(self, value):
+		self.oamaddr = value
+	def write_oamdata(self, value):
+		self.oamdata = value
+		self.oam[self.oamaddr] = value & 0xE3 if self.oamaddr & 3 == 2 else value
+		self.oamaddr = (self.oamaddr + 1) & 0xFF
+	def write_ppuscroll(self, value):
+		self.ppuscroll = value
+		if self.addressLatch == 0:
+			# t: ....... ...HGFED = d: HGFED...
+			# x:              CBA = d: .....CBA
+			# w:                  = 1
+			self.ppuaddrBuffer = (self.ppuaddrBuffer & 0x7FE0) | (value >> 3)
+			self.fineX = value & 7
+			self.addressLatch = 1
+		else:
+			# t: CBA..HG FED..... = d: HGFEDCBA
+			# w:                  = 0
+			self.ppuaddrBuffer = (self.ppuaddrBuffer & 0x0C1F) | ((value & 7) << 12) | ((value & 0xF8) << 2)
+			self.addressLatch = 0
 	def write_ppuaddr(self, value):
 		if self.addressLatch == 0:
-			# t: ..FEDCBA ........ = d: ..FEDCBA
-			# t: .X...... ........ = 0
-			# w:                   = 1
-			self.ppuaddrBuffer = self.ppuaddrBuffer & 0x80FF
+			# t: .FEDCBA ........ = d: ..FEDCBA
+			# t: X...... ........ = 0
+			# w:                  = 1
+			self.ppuaddrBuffer = self.ppuaddrBuffer & 0x00FF
 			self.ppuaddrBuffer |= (value & 0x3F) << 8
 			self.addressLatch = 1
 		else:
-			# t: ........ HGFEDCBA = d: HGFEDCBA
-			# v                    = t
-			# w:                   = 0	
-			self.ppuaddrBuffer = (self.ppuaddrBuffer & 0xFF00) | (value & 0xFF)
+			# t: ....... HGFEDCBA = d: HGFEDCBA
+			# v                   = t
+			# w:                  = 0
+			self.ppuaddrBuffer = (self.ppuaddrBuffer & 0x7F00) | (value & 0xFF)
 			self.ppuaddr = self.ppuaddrBuffer
 			self.addressLatch = 0
 
-	def write_ppudata(self):
+	def write_ppudata(self, value):
+		self.write(self.ppuaddr & 0x3FFF, value)
 		self.inc_ppuaddr()
-		pass
-	def write_oamdma(self):
-		pass
+	# copy a CPU page to OAM starting at OAMADDR, the CPU is halted for 513 cycles plus one when
+	# the write lands on an odd cycle
+	def write_oamdma(self, value):
+		self.oamdma = value
+		start = self.oamaddr
+		page = self.cpuMemory.readPages[value]
+		if page is None:
+			page = bytes(self.cpuMemory.read((value << 8) | offset) for offset in range(256))
+		self.oam[start:] = page[:256 - start]
+		self.oam[:start] = page[256 - start:]
+		self.oam[2::4] = self.oam[2::4].translate(sprites.ATTRIBUTE_MASK)
+		cpu = self.nes.cpu
+		cpu.cycles += scheduler.toDots(513 + (cpu.cycles // scheduler.DOTS_PER_CPU_CYCLE & 1))
 
 	def inc_ppuaddr(self):
 		if self.flag_increment_mode == 0:
-			self.ppuaddr += 1
+			self.ppuaddr = (self.ppuaddr + 1) & 0x7FFF
 		else:
-			self.ppuaddr += 32
-
+			self.ppuaddr = (self.ppuaddr + 32) & 0x7FFF
@@ -0,0 +1,124 @@
+# Execution profiler
+# Enabling installs a dispatch layer whose operations wrap those of the table below it to count
+# executions and cycles per opcode, see CPU.installDispatch, and wraps getCrossPageCycles on the
+# addressing modes that charge page crossings. Disabling removes the layer and puts the methods
+# back, so a CPU without a profiler runs exactly the code it always did. While enabled, run() executes one instruction
+# at a time through the table instead of compiled blocks.
+# Every `interval`-th instruction its PC is sampled, the most frequent are the hot PCs.
+import collections
+import functools
+import json
+
+import scheduler
+
+DEFAULT_INTERVAL = 16
+
+class Profiler:
+	def __init__(self, cpu, interval=DEFAULT_INTERVAL):
+		self.cpu = cpu
+		self.interval = interval
+		self.original = None
+		self.reset()
+
+	def reset(self):
+		self.counts = [0] * 0x100
+		# PPU dots spent per opcode, including penalties charged by the operation
+		self.dots = [0] * 0x100
+		# page crossing penalty returned by getCrossPageCycles, counted per mode
+		self.crossPage = collections.defaultdict(collections.Counter)
+		self.samples = collections.Counter()
+		self.countdown = self.interval
+
+	@property
+	def enabled(self):
+		return self.original is not None
+
+	def enable(self):
+		if self.enabled:
+			return
+		cpu = self.cpu
+		cpu.installDispatch(self.layer)
+		for mode in self.penaltyModes():
+			mode.getCrossPageCycles = self.wrapPenalty(mode)
+		cpu.profiler = self
+
+	def disable(self):
+		if not self.enabled:
+			return
+		cpu = self.cpu
+		for mode in self.penaltyModes():
+			del mode.getCrossPageCycles
+		cpu.removeDispatch(self.layer)
+		cpu.profiler = None
+		self.original = None
+
+	# dispatch layer, table is the one below the profiler
+	def layer(self, table):
+		self.original = table
+		return [entry if entry is self.cpu.unmapped else self.wrap(opcode, entry) for opcode, entry in enumerate(table)]
+
+	# addressing modes that override getCrossPageCycles
+	def penaltyModes(self):
+		modes = {}
+		for instruction, mode, size, cycles in self.original:
+			if 'getCrossPageCycles' in type(mode).__dict__:
+				modes[id(mode)] = mode
+		return modes.values()
+
+	def wrap(self, opcode, entry):
+		instruction, mode, size, cycles = entry
+		cpu = self.cpu
+		counts = self.counts
+		dots = self.dots
+		base = scheduler.toDots(cycles)
+
+		@functools.wraps(instruction)
+		def profiled(addressingMode):
+			counts[opcode] += 1
+			self.countdown -= 1
+			if not self.countdown:
+				self.countdown = self.interval
+				self.samples[cpu.PC] += 1
+			before = cpu.cycles
+			instruction(addressingMode)
+			dots[opcode] += base + cpu.cycles - before
+		return (profiled, mode, size, cycles)
+
+	def wrapPenalty(self, mode):
+		original = type(mode).getCrossPageCycles.__get__(mode)
+		histogram = self.crossPage[mode.__class__.__name__]
+		def getCrossPageCycles(address):
+			cycles = original(address)
+			histogram[cycles] += 1
+			return cycles
+		return getCrossPageCycles
+
+	# structured results: totals, per opcode and per mode counts and CPU cycles, page crossing
+	# histograms and the `hot` most sampled PCs
+	def report(self, hot=20):
+		dispatch = self.original if self.enabled else self.cpu.dispatch
+		opcodes = {}
+		modes = collections.defaultdict(lambda: {'count': 0, 'cycles': 0})
+		for opcode, count in enumerate(self.counts):
+			if not count:
+				continue
+			instruction, mode, size, cycles = dispatch[opcode]
+			kind = mode.__class__.__name__
+			spent = self.dots[opcode] // scheduler.DOTS_PER_CPU_CYCLE
+			opcodes['{:02X}'.format(opcode)] = {'name': instruction.__name__.lstrip('_'), 'mode': kind,
+			                                    'count': count, 'cycles': spent}
+			modes[kind]['count'] += count
+			modes[kind]['cycles'] += spent
+		return {
+			'instructions': sum(self.counts),
+			'cycles': sum(self.dots) // scheduler.DOTS_PER_CPU_CYCLE,
+			'opcodes': opcodes,
+			'modes': dict(modes),
+			'crossPage': {kind: {str(cycles): count for cycles, count in sorted(histogram.items())}
+			              for kind, histogram in self.crossPage.items() if histogram},
+			'sampleInterval': self.interval,
+			'hotPCs': [['{:04X}'.format(pc), count] for pc, count in self.samples.most_common(hot)],
+		}
+
+	def toJSON(self, hot=20):
+		return json.dumps(self.report(hot), indent=1, sort_keys=True)
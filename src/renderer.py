@@ -0,0 +1,279 @@
+# Scanline renderer
+# Draws a whole 256 pixel scanline at once with NumPy. The four nametables are kept pre-rendered
+# in a 512x480 background bitmap that is patched only where nametable bytes, attributes or tiles
+# changed, so a line is a slice of the bitmap at the scroll position looked up through palette
+# RAM. Lines scrolled into the attribute rows (coarse Y 30 and 31) gather their 33 tiles from the
+# nametables directly. Sprites from the per-line sprite index are drawn over the background as
+# palette indices and the line is looked up through palette RAM once. Pixels are palette RAM
+# values, one byte per pixel.
+import numpy as np
+
+WIDTH = 256
+HEIGHT = 240
+
+# tiles touched by a scanline, one more than fits when fine X scroll is not 0
+TILES = np.arange(33)
+
+NAMETABLE_PAGES = range(0x20, 0x3F)
+NAMETABLE_SIZE = 0x400
+ATTRIBUTES = 0x3C0
+CELLS = np.arange(ATTRIBUTES)
+# tile cells covered by each of the 64 attribute bytes
+ATTRIBUTE_CELLS = np.array([[((a >> 3) * 4 + y) * 32 + (a & 7) * 4 + x for y in range(4) for x in range(4)]
+                            for a in range(64)])
+PIXELS = np.arange(8)
+
+class Renderer:
+	def __init__(self, ppu):
+		self.ppu = ppu
+		self.vram = np.frombuffer(ppu.memory.memory, np.uint8)
+		self.palette = np.frombuffer(ppu.palette, np.uint8)
+		self.tiles = ppu.tiles.tiles
+		self.pixels = np.zeros((HEIGHT, WIDTH), np.uint8)
+		# PPUMASK color mode each line was drawn with, see framebuffer
+		self.modes = np.zeros(HEIGHT, np.uint8)
+		self.oam = np.frombuffer(ppu.oam, np.uint8).reshape(-1, 4)
+		# scratch lines: the line being composed and the winning sprites
+		self.indices = np.zeros(WIDTH, np.uint8)
+		self.spriteValues = np.zeros(WIDTH, np.uint8)
+		self.spriteBehind = np.zeros(WIDTH, bool)
+		self.background = Background(ppu, self)
+
+	# offset of each of the four nametables in PPU memory after mirroring
+	def nametables(self):
+		memory = self.ppu.memory
+		return np.array([memory.backingPage(0x20 + 4 * table) << 8 for table in range(4)])
+
+	def renderBackdrop(self, line):
+		self.modes[line] = self.ppu.colorMode()
+		self.pixels[line] = self.palette[0]
+
+	# a line is composed as palette indices, 0 where transparent, and looked up in palette RAM once
+	def renderScanline(self, line):
+		ppu = self.ppu
+		self.modes[line] = ppu.colorMode()
+		indices = self.indices
+		self.renderBackground(indices)
+		if ppu.flag_show_sprites:
+			self.renderSprites(line, indices)
+		if ppu.sprites.overflow[line]:
+			ppu.flag_sprite_overflow = 1
+		self.pixels[line] = self.palette[indices]
+
+	# the PPUSTATUS flags drawing a line sets, for lines of skipped frames
+	def renderFlags(self, line):
+		ppu = self.ppu
+		if ppu.flag_show_sprites:
+			ppu.sprites.update()
+			if not ppu.flag_sprite_zero_hit and self.spriteZeroHit(line) is not None:
+				ppu.flag_sprite_zero_hit = 1
+		if ppu.sprites.overflow[line]:
+			ppu.flag_sprite_overflow = 1
+
+	# background indices from the scroll position in v and fine X
+	def renderBackground(self, indices):
+		ppu = self.ppu
+		if not ppu.flag_show_background:
+			indices[:] = 0
+			return
+		if (ppu.ppuaddr >> 5) & 0x1F < 30:
+			self.background.renderScanline(indices)
+		else:
+			self.renderTiles(indices)
+		if not ppu.flag_show_left_background:
+			indices[:8] = 0
+
+	# gather the tiles under the line from the nametables
+	def renderTiles(self, indices):
+		ppu = self.ppu
+		v = ppu.ppuaddr
+		coarseX = v & 0x1F
+		coarseY = (v >> 5) & 0x1F
+		table = (v >> 10) & 3
+		fineY = (v >> 12) & 7
+
+		# columns past 31 wrap into the horizontally adjacent nametable
+		columns = coarseX + TILES
+		bases = self.nametables()[(table & 2) | ((table & 1) ^ ((columns >> 5) & 1))]
+		columns &= 0x1F
+		tiles = self.vram[bases + (coarseY << 5) + columns]
+		attributes = self.vram[bases + ATTRIBUTES + ((coarseY >> 2) << 3) + (columns >> 2)]
+		palettes = (attributes >> (((coarseY & 2) << 1) | (columns & 2))) & 3
+
+		pixels = self.tiles[(ppu.flag_background_table << 8) + tiles.astype(np.intp), fineY]
+		colors = np.where(pixels, (palettes[:, None] << 2) | pixels, 0).ravel()
+		indices[:] = colors[ppu.fineX:ppu.fineX + WIDTH]
+
+	# background pattern pixels, 0 where transparent, of count screen columns from start. The tiles
+	# are read from the nametables one by one, so the background bitmap is not brought up to date.
+	def backgroundPixels(self, start, count):
+		ppu = self.ppu
+		memory = ppu.memory
+		v = ppu.ppuaddr
+		coarseY = (v >> 5) & 0x1F
+		table = (v >> 10) & 3
+		fineY = (v >> 12) & 7
+		pattern = ppu.flag_background_table << 8
+		first = start + ppu.fineX
+		rows = []
+		for column in range((v & 0x1F) + (first >> 3), (v & 0x1F) + ((first + count - 1) >> 3) + 1):
+			# columns past 31 wrap into the horizontally adjacent nametable
+			base = memory.backingPage(0x20 + 4 * ((table & 2) | ((table & 1) ^ ((column >> 5) & 1)))) << 8
+			rows.append(self.tiles[pattern + int(self.vram[base + (coarseY << 5) + (column & 0x1F)]), fineY])
+		pixels = np.concatenate(rows)[first & 7:(first & 7) + count]
+		if start < 8 and not ppu.flag_show_left_background:
+			pixels[:8 - start] = 0
+		return pixels
+
+	# pixel values and screen columns of OAM entries on a line, as (sprites, 8) arrays
+	def spritePixels(self, line, entries):
+		ppu = self.ppu
+		y, tile, attributes, x = entries.T
+		height = 16 if ppu.flag_sprite_size else 8
+		rows = line - y - 1
+		rows = np.where(attributes & 0x80, height - 1 - rows, rows)
+		if ppu.flag_sprite_size:
+			# 8x16 sprites take the pattern table from bit 0 of the tile number
+			tiles = ((tile & 1) << 8) | ((tile & 0xFE) + (rows >> 3))
+			rows &= 7
+		else:
+			tiles = (ppu.flag_sprite_table << 8) | tile
+		pixels = self.tiles[tiles, rows]
+		pixels = np.where((attributes & 0x40)[:, None] != 0, pixels[:, ::-1], pixels)
+		return pixels, x[:, None] + PIXELS
+
+	# draw the line's sprites over the background indices and check for a sprite zero hit.
+	# Of overlapping opaque sprite pixels the lowest OAM index wins even when it is behind the
+	# background, so a sprite behind the background can hide the ones after it.
+	def renderSprites(self, line, indices):
+		ppu = self.ppu
+		sprites = ppu.sprites.onLine(line)
+		if not len(sprites):
+			return
+		entries = self.oam[sprites].astype(np.intp)
+		pixels, columns = self.spritePixels(line, entries)
+		visible = (pixels != 0) & (columns < WIDTH)
+		if not ppu.flag_show_left_sprites:
+			visible &= columns >= 8
+		opaque = indices != 0
+		if sprites[0] == 0 and not ppu.flag_sprite_zero_hit:
+			if (visible[0] & opaque[columns[0] & 0xFF] & (columns[0] != 255)).any():
+				ppu.flag_sprite_zero_hit = 1
+		values = 0x10 | ((entries[:, 2] & 3) << 2)[:, None] | pixels
+		behind = np.broadcast_to((entries[:, 2] & 0x20)[:, None] != 0, pixels.shape)
+		# written lowest priority first so the last write to a column is the winning sprite
+		visible = visible[::-1]
+		spriteValues = self.spriteValues
+		spriteBehind = self.spriteBehind
+		spriteValues[:] = 0
+		spriteValues[columns[::-1][visible]] = values[::-1][visible]
+		spriteBehind[columns[::-1][visible]] = behind[::-1][visible]
+		shown = (spriteValues != 0) & ~(spriteBehind & opaque)
+		indices[shown] = spriteValues[shown]
+
+	# column of the first sprite zero hit on a line drawn with the current registers, or None.
+	# Lines are drawn whole at dot 256, this lets a PPUSTATUS read earlier in the line see a hit.
+	# Only the background under sprite zero is looked at, skipped frames call this for every line.
+	def spriteZeroHit(self, line):
+		ppu = self.ppu
+		if not (ppu.flag_show_background and ppu.flag_show_sprites):
+			return None
+		sprites = ppu.sprites.onLine(line)
+		if not len(sprites) or sprites[0] != 0:
+			return None
+		pixels, columns = self.spritePixels(line, self.oam[:1].astype(np.intp))
+		background = self.backgroundPixels(int(columns[0][0]), 8)
+		hits = (pixels[0] != 0) & (columns[0] < 255) & (background != 0)
+		if not ppu.flag_show_left_sprites:
+			hits &= columns[0] >= 8
+		if not hits.any():
+			return None
+		return int(columns[0][hits][0])
+
+# The four nametables pre-rendered as 4-bit palette indices, laid out 2x2 as they are scrolled.
+# Writes to nametable pages, including mirrors, mark the bytes they land on, and tiles re-decoded
+# by the tile cache mark the cells showing them. Only marked cells are redrawn, the whole bitmap
+# is redrawn when the mirroring or background pattern table changes.
+class Background:
+	def __init__(self, ppu, renderer):
+		self.ppu = ppu
+		self.renderer = renderer
+		self.vram = renderer.vram
+		self.tiles = renderer.tiles
+		self.bitmap = np.zeros((HEIGHT * 2, WIDTH * 2), np.uint8)
+		# nametable bytes written since the last refresh, by offset from $2000 in PPU memory
+		self.dirty = np.zeros(0x1000, bool)
+		self.changedTiles = set()
+		self.pending = False
+		# nametable offsets and pattern table the bitmap was drawn with
+		self.layout = None
+		for page in NAMETABLE_PAGES:
+			ppu.memory.watch(page, self.write)
+		ppu.tiles.listeners.append(self.tileChanged)
+
+	# nametable watcher
+	def write(self, address):
+		backing = self.ppu.memory.backingPage(address >> 8)
+		if backing is not None and 0x20 <= backing < 0x30:
+			self.dirty[((backing - 0x20) << 8) | (address & 0xFF)] = True
+		else:
+			self.layout = None
+		self.pending = True
+
+	# tile cache listener
+	def tileChanged(self, tile):
+		if tile is None:
+			self.layout = None
+		else:
+			self.changedTiles.add(tile)
+		self.pending = True
+
+	def renderScanline(self, indices):
+		ppu = self.ppu
+		self.refresh()
+		v = ppu.ppuaddr
+		y = ((v >> 11) & 1) * HEIGHT + ((v >> 5) & 0x1F) * 8 + ((v >> 12) & 7)
+		x = ((v >> 10) & 1) * WIDTH + (v & 0x1F) * 8 + ppu.fineX
+		line = self.bitmap[y]
+		if x <= WIDTH:
+			indices[:] = line[x:x + WIDTH]
+		else:
+			indices[:WIDTH * 2 - x] = line[x:]
+			indices[WIDTH * 2 - x:] = line[:x - WIDTH]
+
+	# redraw the cells changed since the last refresh
+	def refresh(self):
+		bases = self.renderer.nametables()
+		layout = (tuple(bases), self.ppu.flag_background_table)
+		if layout != self.layout:
+			for table, base in enumerate(bases):
+				self.drawCells(table, base, CELLS)
+			self.layout = layout
+		elif self.pending:
+			tiles = np.array(sorted(tile & 0xFF for tile in self.changedTiles
+			                        if tile >> 8 == self.ppu.flag_background_table), np.uint8)
+			for table, base in enumerate(bases):
+				dirty = self.dirty[base - 0x2000:base - 0x2000 + NAMETABLE_SIZE]
+				cells = [np.flatnonzero(dirty[:ATTRIBUTES]), ATTRIBUTE_CELLS[np.flatnonzero(dirty[ATTRIBUTES:])].ravel()]
+				if len(tiles):
+					cells.append(np.flatnonzero(np.isin(self.vram[base:base + ATTRIBUTES], tiles)))
+				cells = np.unique(np.concatenate(cells))
+				if len(cells):
+					self.drawCells(table, base, cells[cells < ATTRIBUTES])
+		else:
+			return
+		self.dirty[:] = False
+		self.changedTiles.clear()
+		self.pending = False
+
+	def drawCells(self, table, base, cells):
+		columns = cells & 0x1F
+		rows = cells >> 5
+		names = self.vram[base + cells].astype(np.intp) + (self.ppu.flag_background_table << 8)
+		attributes = self.vram[base + ATTRIBUTES + ((rows >> 2) << 3) + (columns >> 2)]
+		palettes = (attributes >> (((rows & 2) << 1) | (columns & 2))) & 3
+		pixels = self.tiles[names]
+		values = np.where(pixels, (palettes[:, None, None] << 2) | pixels, 0)
+		y = ((table >> 1) * HEIGHT + rows * 8)[:, None, None] + PIXELS[None, :, None]
+		x = ((table & 1) * WIDTH + columns * 8)[:, None, None] + PIXELS[None, None, :]
+		self.bitmap[y, x] = values
@@ -0,0 +1,122 @@
+# Rewind buffer
+# Checkpoints are taken once per frame. Every keyframeInterval checkpoints a full save state is
+# stored as a keyframe, in between only the registers and the memory pages written since the
+# previous checkpoint are kept, found through the memory bus's dirty page tracking. Restoring
+# a checkpoint patches its keyframe with the page lists of the checkpoints up to it.
+import collections
+import savestate
+
+# one minute at 60 frames per second
+DEFAULT_LENGTH = 3600
+DEFAULT_KEYFRAME_INTERVAL = 60
+
+PAGE_SIZE = 0x100
+
+class Checkpoint:
+	def __init__(self, registers, cpuPages, ppuPages):
+		self.registers = registers
+		# (backing page, contents) written since the previous checkpoint
+		self.cpuPages = cpuPages
+		self.ppuPages = ppuPages
+		self.size = len(registers) + PAGE_SIZE * (len(cpuPages) + len(ppuPages))
+
+# a keyframe and the checkpoints taken after it
+class Group:
+	def __init__(self, keyframe):
+		self.keyframe = keyframe
+		self.checkpoints = []
+		self.size = len(keyframe)
+
+class Rewind:
+	# length is the number of checkpoints kept and budget an optional limit in bytes. The oldest
+	# keyframe and its checkpoints are dropped together, once that still leaves length checkpoints
+	# or while the budget is exceeded
+	def __init__(self, cpu, ppu=None, length=DEFAULT_LENGTH, keyframeInterval=DEFAULT_KEYFRAME_INTERVAL, budget=None):
+		self.cpu = cpu
+		self.ppu = ppu
+		self.length = length
+		self.keyframeInterval = keyframeInterval
+		self.budget = budget
+		self.groups = collections.deque()
+		self.count = 0
+		self.size = 0
+		self.cpuRegisters, self.cpuMemory, self.ppuRegisters, self.ppuMemory = savestate.layout(len(cpu.memory.memory))
+		self.memories = [cpu.memory] if ppu is None else [cpu.memory, ppu.memory]
+		for memory in self.memories:
+			memory.trackDirty()
+
+	def __len__(self):
+		return self.count
+
+	def close(self):
+		for memory in self.memories:
+			memory.untrackDirty()
+
+	def checkpoint(self):
+		cpuDirty = self.cpu.memory.takeDirty()
+		ppuDirty = self.ppu.memory.takeDirty() if self.ppu is not None else []
+		if not self.groups or len(self.groups[-1].checkpoints) + 1 >= self.keyframeInterval:
+			self.groups.append(Group(bytes(savestate.save(self.cpu, self.ppu))))
+			self.size += self.groups[-1].size
+		else:
+			registers = bytearray(savestate.CPU_STATE.size + (savestate.PPU_REGISTERS if self.ppu is not None else 0))
+			savestate.packCPU(registers, 0, self.cpu)
+			if self.ppu is not None:
+				savestate.packPPU(registers, savestate.CPU_STATE.size, self.ppu)
+			checkpoint = Checkpoint(bytes(registers), self.pages(self.cpu.memory, cpuDirty),
+			                        self.pages(self.ppu.memory, ppuDirty) if self.ppu is not None else [])
+			group = self.groups[-1]
+			group.checkpoints.append(checkpoint)
+			group.size += checkpoint.size
+			self.size += checkpoint.size
+		self.count += 1
+		self.trim()
+
+	def pages(self, memory, dirty):
+		return [(page, bytes(memory.views[page])) for page in dirty]
+
+	def trim(self):
+		while len(self.groups) > 1:
+			group = self.groups[0]
+			if self.count - len(group.checkpoints) - 1 < self.length and (self.budget is None or self.size <= self.budget):
+				break
+			self.groups.popleft()
+			self.count -= len(group.checkpoints) + 1
+			self.size -= group.size
+
+	# restore the checkpoint `frames` before the latest one, clamped to the oldest, and drop the
+	# checkpoints after it. Returns the number of frames actually rewound.
+	def rewind(self, frames=1):
+		if not self.groups:
+			raise Exception('Nothing to rewind')
+		frames = min(frames, self.count - 1)
+		remaining = frames
+		while remaining > len(self.groups[-1].checkpoints):
+			group = self.groups.pop()
+			remaining -= len(group.checkpoints) + 1
+			self.size -= group.size
+		group = self.groups[-1]
+		for checkpoint in group.checkpoints[len(group.checkpoints) - remaining:]:
+			group.size -= checkpoint.size
+			self.size -= checkpoint.size
+		del group.checkpoints[len(group.checkpoints) - remaining:]
+		self.count -= frames
+
+		state = bytearray(group.keyframe)
+		for checkpoint in group.checkpoints:
+			for page, contents in checkpoint.cpuPages:
+				offset = self.cpuMemory + page * PAGE_SIZE
+				state[offset:offset + PAGE_SIZE] = contents
+			for page, contents in checkpoint.ppuPages:
+				offset = self.ppuMemory + page * PAGE_SIZE
+				state[offset:offset + PAGE_SIZE] = contents
+		if group.checkpoints:
+			registers = group.checkpoints[-1].registers
+			state[self.cpuRegisters:self.cpuRegisters + savestate.CPU_STATE.size] = registers[:savestate.CPU_STATE.size]
+			if self.ppu is not None:
+				state[self.ppuRegisters:self.ppuRegisters + savestate.PPU_REGISTERS] = registers[savestate.CPU_STATE.size:]
+		savestate.load(state, self.cpu, self.ppu)
+		# memory now matches the restored checkpoint
+		for memory in self.memories:
+			memory.takeDirty()
+		return frames
@@ -1,20 +1,89 @@
 # https://wiki.nesdev.com/w/index.php/INES
+# https://wiki.nesdev.com/w/index.php/NES_2.0
+# ROMs are loaded without copying: files are memory mapped read-only and PRG/CHR banks are
+# memoryview slices of the mapping. Memory and the PPU map them read-only whatever the buffer.
+import mmap
+
 filepath = 'tests/testROMs/nestest.nes'
 
+HEADER_SIZE = 16
+TRAINER_SIZE = 0x200
+PRG_BANK_SIZE = 0x4000
+CHR_BANK_SIZE = 0x2000
+
+# nametable mirroring
+HORIZONTAL = 0
+VERTICAL = 1
+FOUR_SCREEN = 2
+
 class ROM:
-	def __init__(self):
-		file = open(filepath, 'rb')
-		header = bytearray(file.read(16))
-
-		if header[0:3].decode('utf-8') != 'NES':
-			print('Invalid ROM')
-		self.prg_rom_size = header[4]
-		self.chr_rom_size = header[5]
-		self.prg_rom = file.read(0x4000 * self.prg_rom_size)
-		self.chr_rom = file.read(0x2000 * self.chr_rom_size)
-
-		self.data = header [16:]
-		#TODO: handle flags from data[6:10]
-		file.close()
-
-#print("{:02x}".format(self.data[i]))
+	# source is a file path or a buffer holding the whole image
+	def __init__(self, source=filepath):
+		if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+			self.buffer = source
+		else:
+			with open(source, 'rb') as file:
+				self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		view = memoryview(self.buffer)
+		header = view[0:HEADER_SIZE]
+
+		if len(header) < HEADER_SIZE or header[0:4] != b'NES\x1a':
+			raise Exception('Invalid ROM')
+		self.header = header
+		self.nes2 = (header[7] & 0x0C) == 0x08
+
+		# flags 6
+		self.mirroring = FOUR_SCREEN if header[6] & 0x08 else header[6] & 0x01
+		self.battery = (header[6] >> 1) & 1
+		self.mapper = (header[6] >> 4) | (header[7] & 0xF0)
+		self.submapper = 0
+		# flags 7
+		self.console_type = header[7] & 0x03
+
+		if self.nes2:
+			self.mapper |= (header[8] & 0x0F) << 8
+			self.submapper = header[8] >> 4
+			prg_size = self.romSize(header[4], header[9] & 0x0F, PRG_BANK_SIZE)
+			chr_size = self.romSize(header[5], header[9] >> 4, CHR_BANK_SIZE)
+			self.prg_ram_size = self.ramSize(header[10] & 0x0F)
+			self.prg_nvram_size = self.ramSize(header[10] >> 4)
+			self.chr_ram_size = self.ramSize(header[11] & 0x0F)
+			self.chr_nvram_size = self.ramSize(header[11] >> 4)
+			self.timing = header[12] & 0x03
+		else:
+			prg_size = header[4] * PRG_BANK_SIZE
+			chr_size = header[5] * CHR_BANK_SIZE
+			# flags 8, 0 means 8KB for compatibility
+			self.prg_ram_size = (header[8] or 1) * 0x2000
+			self.prg_nvram_size = self.prg_ram_size if self.battery else 0
+			self.chr_ram_size = 0 if chr_size else CHR_BANK_SIZE
+			self.chr_nvram_size = 0
+			# flags 9
+			self.timing = header[9] & 0x01
+
+		offset = HEADER_SIZE
+		self.trainer = None
+		if header[6] & 0x04:
+			self.trainer = view[offset:offset + TRAINER_SIZE]
+			offset += TRAINER_SIZE
+		self.prg_rom = view[offset:offset + prg_size]
+		offset += prg_size
+		self.chr_rom = view[offset:offset + chr_size]
+		if len(self.prg_rom) != prg_size or len(self.chr_rom) != chr_size:
+			raise Exception('Truncated ROM')
+
+		# sizes in 16KB PRG and 8KB CHR banks
+		self.prg_rom_size = prg_size // PRG_BANK_SIZE
+		self.chr_rom_size = chr_size // CHR_BANK_SIZE
+		self.prg_banks = [self.prg_rom[i:i + PRG_BANK_SIZE] for i in range(0, prg_size, PRG_BANK_SIZE)]
+		self.chr_banks = [self.chr_rom[i:i + CHR_BANK_SIZE] for i in range(0, chr_size, CHR_BANK_SIZE)]
+
+	# NES 2.0 ROM size from the LSB and MSB nibble, MSB nibble $F selects exponent-multiplier notation
+	def romSize(self, lsb, msb, unit):
+		if msb == 0x0F:
+			return (1 << (lsb >> 2)) * ((lsb & 0x03) * 2 + 1)
+		return ((msb << 8) | lsb) * unit
+
+	# NES 2.0 RAM size from a shift count, 0 means none
+	def ramSize(self, shift):
+		return 64 << shift if shift else 0
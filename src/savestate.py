@@ -0,0 +1,91 @@
+# Save states
+# A state is a versioned binary blob: a header, the CPU registers and CPU memory, followed by the
+# PPU registers, OAM and PPU memory when a PPU is saved. Memory is copied as whole buffers, so saving
+# is a few packs and slice copies into a blob sized up front and loading is the reverse. Each save
+# returns a new blob owned by the caller.
+# Cartridge ROM mapped from the ROM file is not part of the state.
+import struct
+
+MAGIC = b'NESS'
+VERSION = 4
+
+# magic, version, flags, CPU memory size, PPU memory size
+HEADER = struct.Struct('<4sHHII')
+HAS_PPU = 0x01
+
+# PC, A, X, Y, SP, P, cycles
+CPU_STATE = struct.Struct('<HBBBHBQ')
+
+# PPU attributes saved as signed 64-bit values, in blob order
+PPU_FIELDS = ('scanline', 'cycle', 'frames', 'clock', 'nmiPending', 'shift16_1', 'shift16_2',
+              'flag_nmi_enable', 'flag_master_slave', 'flag_sprite_size', 'flag_background_table',
+              'flag_sprite_table', 'flag_increment_mode', 'flag_nametable_select',
+              'flag_blue_tint', 'flag_green_tint', 'flag_red_tint', 'flag_show_sprites', 'flag_show_background',
+              'flag_show_left_sprites', 'flag_show_left_background', 'flag_grayscale',
+              'ppustatus', 'flag_vblank', 'flag_sprite_zero_hit', 'flag_sprite_overflow', 'oamaddr', 'oamdata', 'ppuscroll',
+              'ppuaddr', 'ppuaddrBuffer', 'addressLatch', 'fineX', 'ppudata', 'oamdma')
+PPU_STATE = struct.Struct('<' + 'q' * len(PPU_FIELDS))
+OAM_SIZE = 256
+# PPU registers followed by OAM
+PPU_REGISTERS = PPU_STATE.size + OAM_SIZE
+
+def save(cpu, ppu=None):
+	cpuMemory = cpu.memory.memory
+	ppuMemory = ppu.memory.memory if ppu is not None else b''
+	size = HEADER.size + CPU_STATE.size + len(cpuMemory)
+	if ppu is not None:
+		size += PPU_REGISTERS + len(ppuMemory)
+	state = bytearray(size)
+
+	HEADER.pack_into(state, 0, MAGIC, VERSION, HAS_PPU if ppu is not None else 0, len(cpuMemory), len(ppuMemory))
+	offset = HEADER.size
+	packCPU(state, offset, cpu)
+	offset += CPU_STATE.size
+	state[offset:offset + len(cpuMemory)] = cpuMemory
+	offset += len(cpuMemory)
+
+	if ppu is not None:
+		packPPU(state, offset, ppu)
+		offset += PPU_REGISTERS
+		state[offset:offset + len(ppuMemory)] = ppuMemory
+	return state
+
+def packCPU(state, offset, cpu):
+	CPU_STATE.pack_into(state, offset, cpu.PC, cpu.A, cpu.X, cpu.Y, cpu.SP, cpu.getProcessorStatus(), cpu.cycles)
+
+def packPPU(state, offset, ppu):
+	PPU_STATE.pack_into(state, offset, *[getattr(ppu, field) for field in PPU_FIELDS])
+	state[offset + PPU_STATE.size:offset + PPU_REGISTERS] = ppu.oam
+
+# offsets of the CPU registers, CPU memory, PPU registers and PPU memory in a state
+def layout(cpuSize):
+	cpuMemory = HEADER.size + CPU_STATE.size
+	return HEADER.size, cpuMemory, cpuMemory + cpuSize, cpuMemory + cpuSize + PPU_REGISTERS
+
+# restore a state returned by save, the PPU part is skipped when ppu is None
+def load(state, cpu, ppu=None):
+	view = memoryview(state)
+	if len(view) < HEADER.size:
+		raise Exception('Invalid save state')
+	magic, version, flags, cpuSize, ppuSize = HEADER.unpack_from(view, 0)
+	if magic != MAGIC:
+		raise Exception('Invalid save state')
+	if version != VERSION:
+		raise Exception('Unsupported save state version {}'.format(version))
+	if cpuSize != len(cpu.memory.memory) or (ppu is not None and (not flags & HAS_PPU or ppuSize != len(ppu.memory.memory))):
+		raise Exception('Save state does not match this console')
+
+	offset = HEADER.size
+	cpu.PC, cpu.A, cpu.X, cpu.Y, cpu.SP, status, cpu.cycles = CPU_STATE.unpack_from(view, offset)
+	cpu.setProcessorStatus(status)
+	offset += CPU_STATE.size
+	cpu.memory.restore(view[offset:offset + cpuSize])
+	offset += cpuSize
+
+	if ppu is not None:
+		for field, value in zip(PPU_FIELDS, PPU_STATE.unpack_from(view, offset)):
+			setattr(ppu, field, value)
+		ppu.oam[:] = view[offset + PPU_STATE.size:offset + PPU_REGISTERS]
+		offset += PPU_REGISTERS
+		ppu.memory.restore(view[offset:offset + ppuSize])
+		ppu.schedule()
@@ -0,0 +1,61 @@
+# Event scheduler
+# Timed work outside the CPU, like the vblank NMI and the end of a frame, is kept in one priority
+# queue keyed by master clock timestamp. The CPU run loop compares its cycle count with `next`,
+# the time of the earliest event, between blocks and runs the events that are due, instead of
+# asking each part of the console after every instruction.
+# The master clock counts PPU dots, three to a CPU cycle. Conversions between the two go
+# through this module.
+import heapq
+import itertools
+
+DOTS_PER_CPU_CYCLE = 3
+
+# timestamp of an empty queue
+NEVER = 1 << 62
+
+# master clock dots in CPU cycles
+def toDots(cycles):
+	return cycles * DOTS_PER_CPU_CYCLE
+
+# CPU cycles covering master clock dots, rounded up
+def toCycles(dots):
+	return -(-dots // DOTS_PER_CPU_CYCLE)
+
+class Event:
+	def __init__(self, time, callback):
+		self.time = time
+		self.callback = callback
+		self.cancelled = False
+
+class Scheduler:
+	def __init__(self):
+		# heap of (time, order, event), order keeps events at the same time first in first out
+		self.queue = []
+		self.order = itertools.count()
+		self.next = NEVER
+
+	# call callback once the master clock reaches time, returns the event for cancel
+	def schedule(self, time, callback):
+		event = Event(time, callback)
+		heapq.heappush(self.queue, (time, next(self.order), event))
+		if time < self.next:
+			self.next = time
+		return event
+
+	# cancelled events stay queued and are dropped when they come up
+	def cancel(self, event):
+		if event is not None:
+			event.cancelled = True
+
+	# run every event due at now, including ones scheduled by the events themselves
+	def run(self, now):
+		queue = self.queue
+		while queue and queue[0][0] <= now:
+			event = heapq.heappop(queue)[2]
+			if not event.cancelled:
+				event.callback()
+		self.next = queue[0][0] if queue else NEVER
+
+	def clear(self):
+		self.queue = []
+		self.next = NEVER
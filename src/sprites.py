@@ -0,0 +1,51 @@
+# Sprite evaluation
+# Which sprites are on each of the 240 visible lines is worked out for all lines at once with
+# NumPy, and only again when OAM or the sprite size has changed since, instead of scanning the
+# 64 OAM entries every scanline. Each line keeps the first 8 sprites in OAM order that cover it
+# and whether more than 8 did, which sets the sprite overflow flag. The hardware's buggy
+# overflow search that can miss or invent overflows is not modelled.
+import numpy as np
+
+import renderer
+
+SPRITES = 64
+SPRITES_PER_LINE = 8
+
+LINES = np.arange(renderer.HEIGHT)
+
+# attribute bits 2-4 do not exist and read back as 0
+ATTRIBUTE_MASK = bytes(value & 0xE3 for value in range(256))
+
+class SpriteIndex:
+	def __init__(self, ppu):
+		self.ppu = ppu
+		# OAM and sprite height the index was built from
+		self.oam = None
+		self.height = None
+		# OAM indices of the sprites on each line, padded with 0 past counts
+		self.lines = np.zeros((renderer.HEIGHT, SPRITES_PER_LINE), np.intp)
+		self.counts = np.zeros(renderer.HEIGHT, np.intp)
+		self.overflow = np.zeros(renderer.HEIGHT, bool)
+
+	def update(self):
+		oam = self.ppu.oam
+		height = 16 if self.ppu.flag_sprite_size else 8
+		if height == self.height and oam == self.oam:
+			return
+		# a sprite with OAM Y value y is drawn on lines y + 1 to y + height
+		y = np.frombuffer(oam, np.uint8)[0::4].astype(np.intp)
+		rows = LINES[:, None] - y[None, :] - 1
+		covers = (rows >= 0) & (rows < height)
+		counts = covers.sum(axis=1)
+		selected = covers & (np.cumsum(covers, axis=1) <= SPRITES_PER_LINE)
+		# stable sort moves the selected sprites to the front in OAM order
+		self.lines[:] = np.argsort(~selected, axis=1, kind='stable')[:, :SPRITES_PER_LINE]
+		self.counts[:] = np.minimum(counts, SPRITES_PER_LINE)
+		self.overflow[:] = counts > SPRITES_PER_LINE
+		self.oam = bytearray(oam)
+		self.height = height
+
+	# OAM indices of the sprites drawn on a line, highest priority first
+	def onLine(self, line):
+		self.update()
+		return self.lines[line, :self.counts[line]]
@@ -0,0 +1,41 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch import *
+
+NESTEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testROMs', 'nestest.nes')
+
+class BatchTests(unittest.TestCase):
+	def test_run_job(self):
+		result = runJob(Job(NESTEST, cycles=1000, pc=0xC000))
+		assert result.reason == cpu.STOP_CYCLES
+		assert 1000 <= result.cycles < 1010
+		assert len(result.stateHash) == 40
+
+	def test_frames_until_trap(self):
+		result = runJob(Job(NESTEST, frames=10, pc=0xC000))
+		assert result.reason == cpu.STOP_TRAP
+		assert result.frames == 1
+
+	def test_script(self):
+		plain = runJob(Job(NESTEST, frames=1, pc=0xC000))
+		scripted = runJob(Job(NESTEST, frames=1, pc=0xC000, script=[(0, 0x0700, 0x42)]))
+		assert plain.stateHash != scripted.stateHash
+
+	def test_error(self):
+		result = runJob(Job(b'not a rom', cycles=10))
+		assert result.reason == STOP_ERROR
+		assert result.error == 'Invalid ROM'
+
+	def test_batch_matches_in_process(self):
+		jobs = [Job(NESTEST, cycles=cycles, pc=0xC000, name=str(cycles)) for cycles in (500, 1000, 2000)]
+		results = {result.job.name: result for result in runBatch(jobs, workers=2)}
+		for job in jobs:
+			assert results[job.name].stateHash == runJob(job).stateHash
+
+	def test_job_needs_a_limit(self):
+		with self.assertRaises(Exception):
+			Job(NESTEST)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os, sys
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchmark
+import cpu
+
+class BenchmarkTests(unittest.TestCase):
+	def test_report(self):
+		report = benchmark.run(repeat=1, iterations=2, frames=1)
+		results = json.loads(json.dumps(report))['results']
+		assert len([name for name in results if name.startswith('opcode.')]) == len(cpu.CPU().instructions)
+		assert results['opcode.69.adc']['ns_per_instruction'] > 0
+		assert 'mode.IndirectY.read' in results and 'mode.Absolute.write' in results
+		assert 'mode.Immediate.write' not in results
+		for name in ('nestest.traced', 'nestest.untraced', 'nestest.untraced.warm'):
+			assert set(results[name]) == {'instructions_per_second', 'cycles_per_second', 'seconds_per_frame'}
+		# the same run with and without tracing
+		ratios = [results[name]['instructions_per_second'] / results[name]['cycles_per_second']
+		          for name in ('nestest.traced', 'nestest.untraced')]
+		assert abs(ratios[0] - ratios[1]) < 1e-9
+		assert results['ppu.frame']['seconds_per_frame'] > 0 and results['ppu.frame.headless']['seconds_per_frame'] > 0
+
+	def test_compare(self):
+		baseline = {'results': {
+			'a': {'instructions_per_second': 100.0, 'seconds_per_frame': 1.0},
+			'b': {'ns_per_access': 50.0},
+			'gone': {'ns_per_access': 1.0},
+		}}
+		current = {'results': {
+			'a': {'instructions_per_second': 85.0, 'seconds_per_frame': 0.5},
+			'b': {'ns_per_access': 54.0},
+			'new': {'ns_per_access': 1.0},
+		}}
+		rows = {(name, metric): (change, regression) for name, metric, old, new, change, regression
+		        in benchmark.compare(baseline, current, 0.1)}
+		assert set(rows) == {('a', 'instructions_per_second'), ('a', 'seconds_per_frame'), ('b', 'ns_per_access')}
+		assert rows['a', 'instructions_per_second'] == (-0.15, True)
+		assert rows['a', 'seconds_per_frame'] == (0.5, False)
+		change, regression = rows['b', 'ns_per_access']
+		assert abs(change + 0.08) < 1e-9 and not regression
+
+	def test_summarize(self):
+		rows = [('opcode.69.adc', 'ns_per_instruction', 100.0, 50.0, 0.5, False),
+		        ('opcode.E8.inx', 'ns_per_instruction', 100.0, 200.0, -1.0, True),
+		        ('nestest.traced', 'instructions_per_second', 100.0, 80.0, -0.2, True)]
+		suites = {suite: (change, regression) for suite, change, regression in benchmark.summarize(rows, 0.1)}
+		# twice as fast and twice as slow cancel out
+		assert abs(suites['opcode'][0]) < 1e-9 and not suites['opcode'][1]
+		assert abs(suites['nestest'][0] + 0.2) < 1e-9 and suites['nestest'][1]
+
+	def test_committed_baseline(self):
+		with open(benchmark.BASELINE) as file:
+			baseline = json.load(file)
+		assert baseline['version'] == benchmark.VERSION
+		report = benchmark.run(repeat=1, iterations=2, frames=1)
+		assert set(baseline['results']) == set(report['results'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import debugger
+import nes
+import profiler
+
+# LDX #3; STX $10; DEX; BNE $0202; JMP $0208
+PROGRAM = [0xa2, 0x03, 0x86, 0x10, 0xca, 0xd0, 0xfb, 0xea, 0x4c, 0x08, 0x02]
+
+class DebuggerTests(unittest.TestCase):
+	def setUp(self):
+		# a console CPU, with RAM mirrored
+		self.cpu = nes.NES().cpu
+		self.cpu.debug = False
+		for i, value in enumerate(PROGRAM):
+			self.cpu.memory.write(0x200 + i, value)
+		self.cpu.PC = 0x200
+		self.debugger = debugger.Debugger(self.cpu)
+
+	def test_unarmed_state(self):
+		dispatch = self.cpu.dispatch
+		point = self.debugger.addBreakpoint(0x204)
+		assert self.cpu.dispatch is not dispatch and self.cpu.dispatch[0xca][0].__name__ == 'dex'
+		assert self.cpu.dispatch[0xe8] is dispatch[0xe8]
+		self.debugger.addWatchpoint(0x10)
+		assert self.cpu.memory.writePages[0x00] is None and self.cpu.memory.writePages[0x08] is None
+		self.debugger.clear()
+		assert self.cpu.dispatch is dispatch and not self.cpu.translator.breaks
+		assert self.cpu.memory.writePages[0x00] is not None and self.cpu.memory.readPages[0x00] is not None
+
+	def test_breakpoint(self):
+		for traced in (False, True):
+			self.setUp()
+			self.cpu.debug = traced
+			point = self.debugger.addBreakpoint(0x204)
+			assert self.debugger.resume() == STOP_BREAK
+			assert (self.cpu.PC, self.cpu.X, self.cpu.cycles) == (0x204, 3, 5 * 3)
+			assert self.debugger.hit.point is point and self.debugger.hit.kind == 'pc'
+			# resuming from the breakpoint runs its instruction
+			assert self.debugger.resume() == STOP_BREAK
+			assert (self.cpu.PC, self.cpu.X, point.hits) == (0x204, 2, 2)
+			# the trace holds only the instructions that ran
+			if traced:
+				assert [record[0] for record in self.cpu.trace.records()] == [0x200, 0x202, 0x204, 0x205, 0x202]
+
+	def test_trap_check_is_not_a_read(self):
+		# JMP $0300 onto an unmapped opcode in a read watched page
+		for i, value in enumerate([0x4c, 0x00, 0x03]):
+			self.cpu.memory.write(0x208 + i, value)
+		self.cpu.memory.write(0x300, 0x02)
+		self.debugger.addWatchpoint(0x300, kind=debugger.READ)
+		for traced in (False, True):
+			self.cpu.debug = traced
+			self.cpu.PC = 0x208
+			assert self.cpu.run() == STOP_TRAP and self.cpu.PC == 0x300
+			assert self.debugger.hit is None
+
+	def test_conditional_breakpoint(self):
+		self.debugger.addBreakpoint(0x204, lambda cpu: cpu.X == 1)
+		assert self.debugger.resume() == STOP_BREAK
+		assert (self.cpu.PC, self.cpu.X) == (0x204, 1)
+		self.debugger.removeBreakpoint(0x204)
+		assert self.debugger.resume(max_instructions=10) == STOP_INSTRUCTIONS
+
+	def test_watchpoints(self):
+		write = self.debugger.addWatchpoint(0x10, kind=debugger.WRITE)
+		assert self.debugger.step(5) == STOP_BREAK
+		hit = self.debugger.hit
+		assert (hit.point, hit.kind, hit.address, hit.value) == (write, 'write', 0x10, 3)
+		# STX $10 inside the compiled block
+		assert hit.pc == 0x202
+		self.debugger.removeWatchpoint(write)
+		# reads through a RAM mirror
+		read = self.debugger.addWatchpoint(0x0810, kind=debugger.READ, condition=lambda address, value: value == 3)
+		# LDA $10; JMP $0300
+		for i, value in enumerate([0xa5, 0x10, 0x4c, 0x00, 0x03]):
+			self.cpu.memory.write(0x300 + i, value)
+		self.cpu.PC = 0x300
+		assert self.debugger.step(3) == STOP_BREAK
+		assert self.debugger.hit.point is read and self.debugger.hit.pc == 0x300 and self.cpu.A == 3
+		# a compiled block finishes before the stop, a traced run stops after the instruction
+		assert self.cpu.PC == 0x300
+		self.cpu.debug = True
+		assert self.debugger.step(3) == STOP_BREAK and self.cpu.PC == 0x302 and self.debugger.hit.pc == 0x300
+
+	def test_with_profiler(self):
+		dispatch = self.cpu.dispatch
+		profiled = profiler.Profiler(self.cpu)
+		profiled.enable()
+		point = self.debugger.addBreakpoint(0x204)
+		# the breakpoint is armed over the profiler, a hit does not count its instruction
+		assert self.debugger.resume() == STOP_BREAK and self.cpu.PC == 0x204
+		assert profiled.report()['instructions'] == 2
+		profiled.disable()
+		assert self.debugger.resume() == STOP_BREAK and point.hits == 2
+		assert profiled.report()['instructions'] == 2
+		profiled.reset()
+		profiled.enable()
+		self.debugger.removeBreakpoint(0x204)
+		assert self.cpu.dispatchLayers == [profiled.layer] and self.cpu.profiler is profiled
+		assert self.debugger.resume(max_instructions=3) == STOP_INSTRUCTIONS
+		assert profiled.report()['instructions'] == 3
+		profiled.disable()
+		assert self.cpu.dispatch is dispatch
+
+	def test_step_and_run_to(self):
+		assert self.debugger.step() == STOP_INSTRUCTIONS and self.cpu.PC == 0x202
+		assert self.debugger.runTo(0x207) == STOP_PC and self.cpu.X == 0
+		assert self.debugger.stepOver() == STOP_INSTRUCTIONS and self.cpu.PC == 0x208
+
+	def test_step_over_subroutine(self):
+		# JSR $0210 at $0300, the subroutine is INX; RTS
+		for address, value in ((0x300, 0x20), (0x301, 0x10), (0x302, 0x02), (0x210, 0xe8), (0x211, 0x60)):
+			self.cpu.memory.write(address, value)
+		self.cpu.PC = 0x300
+		self.cpu.SP = 0x1FD
+		assert self.debugger.stepOver() == STOP_PC
+		assert self.cpu.PC == 0x303 and self.cpu.X == 1
+
+	def test_inspection(self):
+		console = nes.NES()
+		inspector = debugger.Debugger(console.cpu)
+		status = console.ppu.readRegister(0x2002)
+		assert inspector.peek(0x2002) is None and inspector.peek(0xC000) == 0x4c
+		registers = inspector.registers()
+		assert registers['PC'] == console.cpu.PC and set(registers) == set(debugger.REGISTERS)
+		inspector.setRegister('A', 0x42)
+		assert console.cpu.A == 0x42
+		assert inspector.disassemble(0xC000, 2) == ['C000  4C F5 C5  JMP $C5F5', 'C003  60        RTS']
+		with self.assertRaises(Exception):
+			inspector.setRegister('Q', 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os, sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import disassembler
+
+class DisassemblerTests(unittest.TestCase):
+	def setUp(self):
+		self.cpu = CPU()
+		self.cpu.debug = False
+
+	def test_walk_from_vectors(self):
+		disassembly = disassembler.disassemble(self.cpu)
+		reset = self.cpu.memory.read16(0xFFFC)
+		assert reset == 0xC004 and disassembly.instructions[reset].name == 'sei'
+		# $C000 is only reached by nestest's automated start
+		assert 0xC000 not in disassembly.instructions
+		# LDA $2002 then BPL back to it
+		assert [disassembly.kind(address) for address in range(0xC009, 0xC00E)] == ['opcode', 'operand', 'operand', 'opcode', 'operand']
+		assert disassembly.instructions[0xC00C].operand16 & 0xFF == 0xFB
+
+	def test_entries_and_data(self):
+		disassembly = disassembler.disassemble(self.cpu, [0xC000])
+		assert disassembly.instructions[0xC000].name == 'jmp'
+		# JMP does not fall through, $C003 is an RTS nothing jumps to
+		assert not disassembly.isCode(0xC003)
+		assert (0xC003, 0xC004, 'data') in disassembly.ranges()
+		lines = list(disassembly.lines(0xC000, 0xC006))
+		assert lines == ['C000  4C F5 C5  JMP $C5F5', 'C003  .byte $60', 'C004  78        SEI', 'C005  D8        CLD']
+
+	def test_json_round_trip(self):
+		disassembly = disassembler.disassemble(self.cpu, [0xC000])
+		restored = disassembler.Disassembly.fromJSON(self.cpu, disassembly.toJSON())
+		assert restored.map == disassembly.map and restored.entries == [0xC000]
+		assert sorted(restored.instructions) == sorted(disassembly.instructions)
+
+	def test_cached_by_rom_hash(self):
+		with tempfile.TemporaryDirectory() as directory:
+			first = disassembler.cached(self.cpu, directory, [0xC000])
+			assert os.listdir(directory) == [disassembler.romHash(self.cpu.cartridge) + '.json']
+			second = disassembler.cached(CPU(), directory, [0xC000])
+			assert second.map == first.map and second.cpu is not first.cpu
+
+	def test_translator_uses_predecoded_instructions(self):
+		reference = CPU()
+		reference.debug = False
+		for cpu in (self.cpu, reference):
+			cpu.PC = 0xC000
+		disassembly = disassembler.disassemble(self.cpu, [0xC000])
+		disassembly.attach()
+		self.cpu.run()
+		reference.run()
+		assert (self.cpu.PC, self.cpu.A, self.cpu.cycles) == (reference.PC, reference.A, reference.cycles)
+		block = self.cpu.translator.blocks[0xC5F5]
+		assert block.instructions[0] is disassembly.instructions[0xC5F5]
+		disassembly.detach()
+		assert self.cpu.disassembly is None
+
+	def test_write_drops_instruction(self):
+		disassembly = disassembler.disassemble(self.cpu)
+		disassembly.attach()
+		self.cpu.memory.write(0xC00A, 0x00)
+		assert 0xC009 not in disassembly.instructions
+		assert not disassembly.isCode(0xC009) and not disassembly.isCode(0xC00B)
+		assert disassembly.isCode(0xC00C)
+
+if __name__ == '__main__':
+	unittest.main()
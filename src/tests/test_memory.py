@@ -0,0 +1,67 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from memory import Memory
+import nes
+
+class MemoryTests(unittest.TestCase):
+	def setUp(self):
+		self.memory = Memory(0x10000)
+
+	def test_read_write(self):
+		self.memory.write(0x1234, 0x1FF)
+		assert self.memory.read(0x1234) == 0xFF
+		assert self.memory.memory[0x1234] == 0xFF
+
+	def test_mirror(self):
+		self.memory.mirror(0x0800, 0x2000, 0x0000, 0x0800)
+		self.memory.write(0x1805, 0x42)
+		assert self.memory.read(0x0005) == 0x42
+		assert self.memory.read(0x0805) == 0x42
+
+	def test_handlers(self):
+		writes = []
+		self.memory.mapHandlers(0x2000, 0x2100, lambda address: address & 0xFF, lambda address, value: writes.append((address, value)))
+		assert self.memory.read(0x2010) == 0x10
+		self.memory.write(0x2020, 0x5)
+		assert writes == [(0x2020, 0x5)]
+
+	def test_read_only_buffer(self):
+		self.memory.mapBuffer(0x8000, 0x10000, bytes(range(256)) * 64, False)
+		self.memory.write(0xC001, 0x55)
+		assert self.memory.read(0xC001) == 0x01
+		assert self.memory.read(0x8001) == 0x01
+
+	def test_watch(self):
+		writes = []
+		self.memory.watch(0x03, writes.append)
+		self.memory.write(0x0310, 0x5)
+		self.memory.write(0x0410, 0x5)
+		assert writes == [0x0310]
+		assert self.memory.read(0x0310) == 0x5
+		self.memory.unwatch(0x03, writes.append)
+		self.memory.write(0x0311, 0x5)
+		assert writes == [0x0310]
+		assert self.memory.writePages[0x03] is not None
+
+class ConsoleMapTests(unittest.TestCase):
+	def setUp(self):
+		self.nes = nes.NES()
+		self.memory = self.nes.cpu.memory
+
+	def test_ram_mirror(self):
+		self.memory.write(0x1FFF, 0x7)
+		assert self.memory.read(0x07FF) == 0x7
+
+	def test_ppu_register_mirror(self):
+		self.memory.write(0x3FFE, 0x21)
+		self.memory.write(0x2006, 0x08)
+		assert self.nes.ppu.ppuaddr == 0x2108
+
+	def test_ppu_status_read(self):
+		self.nes.ppu.addressLatch = 1
+		self.memory.read(0x200A)
+		assert self.nes.ppu.addressLatch == 0
+
+if __name__ == '__main__':
+	unittest.main()
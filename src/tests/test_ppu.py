@@ -0,0 +1,554 @@
+import unittest
+import os, sys
+import random
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import framebuffer
+import nes
+import rom
+
+class PPUTests(unittest.TestCase):
+	def setUp(self):
+		self.nes = nes.NES()
+		self.ppu = self.nes.ppu
+		self.memory = self.nes.cpu.memory
+
+	def fill(self, seed):
+		generator = random.Random(seed)
+		for address in range(0x0000, 0x2000):
+			self.ppu.write(address, generator.randrange(256))
+		for address in range(0x2000, 0x3000):
+			self.ppu.write(address, generator.randrange(256))
+		for address in range(0x3F00, 0x3F20):
+			self.ppu.write(address, generator.randrange(64))
+
+	# per-pixel reference for a background pixel, from the loopy registers at the start of the line
+	def pixel(self, x):
+		ppu = self.ppu
+		v = ppu.ppuaddr
+		position = ppu.fineX + x
+		column = (v & 0x1F) + (position >> 3)
+		table = ((v >> 10) & 3) ^ ((column >> 5) & 1)
+		column &= 0x1F
+		coarseY = (v >> 5) & 0x1F
+		tile = ppu.read(0x2000 | (table << 10) | (coarseY << 5) | column)
+		attribute = ppu.read(0x23C0 | (table << 10) | ((coarseY >> 2) << 3) | (column >> 2))
+		palette = (attribute >> (((coarseY & 2) << 1) | (column & 2))) & 3
+		address = (ppu.flag_background_table << 12) + tile * 16 + ((v >> 12) & 7)
+		bit = 7 - (position & 7)
+		value = ((ppu.read(address) >> bit) & 1) | (((ppu.read(address + 8) >> bit) & 1) << 1)
+		return ppu.read(0x3F00 + (palette * 4 + value if value else 0))
+
+	def test_scanlines_match_reference(self):
+		self.fill(1)
+		for ctrl, scrollX, scrollY in ((0x00, 0, 0), (0x11, 13, 7), (0x03, 250, 235)):
+			self.memory.write(0x2000, ctrl)
+			self.memory.write(0x2001, 0x0A)
+			self.memory.write(0x2005, scrollX)
+			self.memory.write(0x2005, scrollY)
+			self.ppu.prepareFrame()
+			for line in range(240):
+				expected = [self.pixel(x) for x in range(256)]
+				self.ppu.scanline = line
+				self.ppu.renderScanline()
+				assert list(self.ppu.renderer.pixels[line]) == expected, (ctrl, scrollX, scrollY, line)
+
+	# render a frame and check every line against gathering its tiles directly
+	def checkFrame(self):
+		self.ppu.prepareFrame()
+		for line in range(240):
+			indices = np.zeros(256, np.uint8)
+			self.ppu.renderer.renderTiles(indices)
+			expected = self.ppu.renderer.palette[indices]
+			self.ppu.scanline = line
+			self.ppu.renderScanline()
+			assert list(self.ppu.renderer.pixels[line]) == list(expected), line
+
+	def test_background_bitmap_updates(self):
+		self.fill(3)
+		self.memory.write(0x2001, 0x0A)
+		self.memory.write(0x2005, 100)
+		self.memory.write(0x2005, 50)
+		self.checkFrame()
+		background = self.ppu.renderer.background
+		assert not background.pending
+		# nametable byte through a mirror, attribute byte, a CHR tile and a palette entry
+		self.ppu.write(0x2C45, 0x13)
+		self.ppu.write(0x33C9, 0xE4)
+		for address in range(0x0130, 0x0140):
+			self.ppu.write(address, 0x5A)
+		self.ppu.write(0x3F06, 0x21)
+		assert background.pending
+		self.checkFrame()
+		# switching the background pattern table redraws everything
+		self.memory.write(0x2000, 0x10)
+		self.checkFrame()
+
+	def test_left_column_and_backdrop(self):
+		self.fill(2)
+		self.memory.write(0x2001, 0x08)
+		self.ppu.prepareFrame()
+		self.ppu.renderScanline()
+		backdrop = self.ppu.read(0x3F00)
+		assert list(self.ppu.renderer.pixels[0][:8]) == [backdrop] * 8
+		self.memory.write(0x2001, 0x00)
+		self.ppu.scanline = 1
+		self.ppu.renderScanline()
+		assert list(self.ppu.renderer.pixels[1]) == [backdrop] * 256
+
+	def test_scroll_registers(self):
+		self.memory.write(0x2000, 0x02)
+		self.memory.write(0x2005, 0x7D)
+		assert self.ppu.ppuaddrBuffer == 0x080F and self.ppu.fineX == 5
+		self.memory.write(0x2005, 0x5E)
+		assert self.ppu.ppuaddrBuffer == 0x696F
+		self.memory.write(0x2006, 0x3D)
+		self.memory.write(0x2006, 0xF0)
+		assert self.ppu.ppuaddr == self.ppu.ppuaddrBuffer == 0x3DF0
+
+	def test_ppudata(self):
+		self.memory.write(0x2006, 0x21)
+		self.memory.write(0x2006, 0x00)
+		self.memory.write(0x2007, 0x11)
+		self.memory.write(0x2007, 0x22)
+		self.memory.write(0x2006, 0x21)
+		self.memory.write(0x2006, 0x00)
+		self.memory.read(0x2007)
+		assert self.memory.read(0x2007) == 0x11
+		assert self.memory.read(0x2007) == 0x22
+
+	def test_palette_mirrors(self):
+		self.ppu.write(0x3F10, 0x2A)
+		assert self.ppu.read(0x3F00) == 0x2A
+		assert self.ppu.read(0x3FE0) == 0x2A
+		self.ppu.write(0x3F01, 0x01)
+		self.ppu.write(0x3F11, 0x15)
+		assert self.ppu.read(0x3F01) == 0x01
+		assert self.ppu.read(0x3F31) == 0x15
+
+	def test_frame_timing(self):
+		self.ppu.stepFrame()
+		assert self.ppu.frames == 1 and self.ppu.scanline == 0
+		for line in range(242):
+			self.ppu.stepScanline()
+		assert self.ppu.flag_vblank == 1
+		assert self.memory.read(0x2002) & 0x80
+		assert self.ppu.flag_vblank == 0
+
+	def test_step_matches_scanlines(self):
+		for i in range(341 * 242):
+			self.ppu.step()
+		assert (self.ppu.scanline, self.ppu.cycle, self.ppu.flag_vblank) == (242, 0, 1)
+
+class FramebufferTests(unittest.TestCase):
+	def setUp(self):
+		self.nes = nes.NES()
+		self.ppu = self.nes.ppu
+		self.memory = self.nes.cpu.memory
+		generator = random.Random(4)
+		for address in range(0x3F00, 0x3F20):
+			self.ppu.write(address, generator.randrange(64))
+		for address in range(0x2000, 0x2400):
+			self.ppu.write(address, generator.randrange(256))
+
+	def test_modes(self):
+		self.memory.write(0x2001, 0x0A)
+		assert self.ppu.colorMode() == 0
+		self.memory.write(0x2001, 0x0B)
+		assert self.ppu.colorMode() == 1
+		self.memory.write(0x2001, 0xAA)
+		assert self.ppu.colorMode() == 0b1010
+
+	def test_tables(self):
+		assert list(framebuffer.RGBA[0][0x21]) == [76, 154, 236, 255]
+		# grayscale keeps the brightness column
+		assert list(framebuffer.RGBA[1][0x21]) == list(framebuffer.RGBA[0][0x20])
+		# red emphasis darkens green and blue
+		red = framebuffer.RGBA[0b0010][0x21]
+		assert red[0] == 76 and red[1] < 154 and red[2] < 236
+		assert (framebuffer.RGB == framebuffer.RGBA[:, :, :3]).all()
+
+	# draw a frame with the color mode switched partway down
+	def test_conversion(self):
+		self.memory.write(0x2001, 0x0A)
+		self.ppu.prepareFrame()
+		for line in range(240):
+			if line == 120:
+				self.memory.write(0x2001, 0x4B)
+			self.ppu.scanline = line
+			self.ppu.renderScanline()
+		pixels = self.ppu.renderer.pixels
+		rgba = self.ppu.framebuffer.toRGBA()
+		rgb = self.ppu.framebuffer.toRGB()
+		for line, x in ((0, 0), (57, 200), (119, 255), (120, 3), (239, 128)):
+			mode = 0 if line < 120 else 0b0101
+			assert list(rgba[line, x]) == list(framebuffer.RGBA[mode][pixels[line, x]]), (line, x)
+			assert list(rgb[line, x]) == list(framebuffer.RGB[mode][pixels[line, x]]), (line, x)
+
+	def test_buffers_are_not_copies(self):
+		buffer = self.ppu.framebuffer.rgbaBuffer()
+		assert buffer.shape == (240, 256, 4) and buffer.nbytes == 240 * 256 * 4
+		assert np.shares_memory(np.asarray(buffer), self.ppu.framebuffer.rgba)
+		assert self.ppu.framebuffer.toRGBA() is self.ppu.framebuffer.rgba
+		assert self.ppu.framebuffer.rgbBuffer().shape == (240, 256, 3)
+
+# console running a 16KB program at $C000 with the given NMI handler offset and CHR RAM
+def console(program, nmi=0):
+	prg = bytearray(0x4000)
+	prg[:len(program)] = program
+	prg[0x3FFA:0x3FFE] = bytes([nmi & 0xFF, 0xC0 | (nmi >> 8), 0x00, 0xC0])
+	return nes.NES(rom.ROM(bytes([0x4e, 0x45, 0x53, 0x1a, 1, 0] + [0] * 10) + bytes(prg)))
+
+class CatchUpTests(unittest.TestCase):
+	def test_catch_up_matches_stepping(self):
+		stepped = nes.NES().ppu
+		caught = nes.NES().ppu
+		for dots in (1, 255, 86, 341 * 240, 341 * 30 + 7, 2000):
+			for i in range(dots):
+				stepped.step()
+			caught.catchUp(caught.clock + dots)
+			assert (caught.scanline, caught.cycle, caught.frames, caught.flag_vblank, caught.clock) == \
+				(stepped.scanline, stepped.cycle, stepped.frames, stepped.flag_vblank, stepped.clock)
+
+	def test_status_stable_until(self):
+		console = nes.NES()
+		ppu = console.ppu
+		assert ppu.statusStableUntil(0) == ppu.nextVBlank()
+		ppu.flag_show_background = ppu.flag_show_sprites = 1
+		# sprites below the screen, so no line has more than 8
+		ppu.oam[:] = bytes([0xFF]) * 256
+		ppu.oam[0] = 100
+		assert ppu.statusStableUntil(0) == ppu.cycleAt(101, 0)
+		assert ppu.statusStableUntil(ppu.cycleAt(104, 20)) == ppu.clock
+		# the hit may have been set since the last read up to the line after the sprite
+		assert ppu.statusStableUntil(ppu.cycleAt(109, 20)) == ppu.clock
+		ppu.flag_sprite_zero_hit = 1
+		assert ppu.statusStableUntil(ppu.cycleAt(110, 0)) == ppu.nextVBlank()
+
+	def test_status_stable_until_overflow(self):
+		console = nes.NES()
+		ppu = console.ppu
+		ppu.flag_show_background = ppu.flag_show_sprites = 1
+		# 9 sprites on lines 101 to 108, the others and sprite zero below the screen
+		ppu.oam[:] = bytes([0xFF]) * 256
+		for sprite in range(1, 10):
+			ppu.oam[sprite * 4] = 100
+		assert ppu.statusStableUntil(0) == ppu.cycleAt(101, 0)
+		assert ppu.statusStableUntil(ppu.cycleAt(104, 20)) == ppu.clock and ppu.flag_sprite_overflow
+		# the flag set on line 101 only clears at the end of vblank
+		assert ppu.statusStableUntil(ppu.cycleAt(110, 0)) == ppu.nextVBlank()
+
+	def test_overflow_poll(self):
+		# LDA $2002; AND #$20; BEQ back to it, then spin, with 9 sprites on line 101
+		exits = []
+		for debug in (True, False):
+			machine = console([0xAD, 0x02, 0x20, 0x29, 0x20, 0xF0, 0xF9, 0x4C, 0x07, 0xC0])
+			machine.ppu.oam[:] = bytes([0xFF]) * 256
+			for sprite in range(9):
+				machine.ppu.oam[sprite * 4] = 100
+			machine.ppu.flag_show_sprites = 1
+			machine.cpu.PC = 0xC000
+			machine.cpu.debug = debug
+			assert machine.cpu.run(max_cycles=100000, until_pc=0xC007) == 'pc'
+			exits.append((machine.cpu.cycles, machine.ppu.scanline))
+		assert exits[0] == exits[1] and exits[0][1] == 101
+
+	def test_register_read_catches_up(self):
+		console = nes.NES()
+		vblank = console.ppu.nextVBlank()
+		console.cpu.cycles = vblank - 1
+		assert not console.cpu.memory.read(0x2002) & 0x80
+		console.cpu.cycles = vblank
+		assert console.cpu.memory.read(0x2002) & 0x80
+		assert console.ppu.scanline == 241 and console.ppu.clock == vblank
+
+	def test_vblank_poll(self):
+		# BIT $2002, BPL back to it, then spin
+		# the loop is 7 CPU cycles and the read that sees vblank is 6 cycles before the spin
+		exits = []
+		for debug in (True, False):
+			machine = console([0x2C, 0x02, 0x20, 0x10, 0xFB, 0x4C, 0x05, 0xC0])
+			machine.cpu.PC = 0xC000
+			machine.cpu.debug = debug
+			vblank = machine.ppu.nextVBlank()
+			assert machine.cpu.run(max_cycles=40000, until_pc=0xC005) == 'pc'
+			exits.append(machine.cpu.cycles - vblank)
+		assert 6 * 3 <= exits[0] < 13 * 3
+		assert exits[0] == exits[1]
+
+	def test_run_frame_takes_nmi(self):
+		# LDA #$80, STA $2000, spin; NMI handler at $C008 is INC $10, RTI
+		machine = console([0xA9, 0x80, 0x8D, 0x00, 0x20, 0x4C, 0x05, 0xC0, 0xE6, 0x10, 0x40], nmi=0x08)
+		machine.cpu.PC = 0xC000
+		for frame in range(3):
+			machine.runFrame()
+		assert machine.cpu.memory.read(0x10) == 3
+		# the console runs untraced unless asked to trace
+		assert machine.cpu.trace.count == 0
+		assert machine.ppu.frames == 3 and machine.cpu.cycles >= machine.ppu.clock
+		# enabling NMI during vblank raises it immediately
+		machine.cpu.memory.write(0x2000, 0x00)
+		machine.ppu.catchUp(machine.ppu.nextVBlank())
+		machine.cpu.memory.write(0x2000, 0x80)
+		assert machine.ppu.nmiPending
+
+class SpriteTests(unittest.TestCase):
+	def setUp(self):
+		self.nes = nes.NES()
+		self.ppu = self.nes.ppu
+		self.memory = self.nes.cpu.memory
+		self.generator = random.Random(5)
+
+	def randomOAM(self):
+		for address in range(0x200, 0x300):
+			self.memory.write(address, self.generator.randrange(256))
+		self.memory.write(0x4014, 0x02)
+
+	def test_dma(self):
+		for address in range(0x300, 0x400):
+			self.memory.write(address, address & 0xFF)
+		self.memory.write(0x2003, 0x10)
+		self.nes.cpu.cycles = 0
+		self.memory.write(0x4014, 0x03)
+		assert self.nes.cpu.cycles == 513 * 3
+		assert self.ppu.oam[0x10] == 0x00 and self.ppu.oam[0x0F] == 0xFF
+		# attribute bytes lose bits 2-4
+		assert self.ppu.oam[0x12] == 0x02 and self.ppu.oam[0x1E] == 0x0E & 0xE3
+		self.nes.cpu.cycles = 3
+		self.memory.write(0x4014, 0x03)
+		assert self.nes.cpu.cycles == 3 + 514 * 3
+		self.memory.write(0x2003, 0x11)
+		assert self.memory.read(0x2004) == 0x01
+
+	def test_dma_stalls_cpu(self):
+		# LDA #$02, STA $4014, then spin
+		for debug in (True, False):
+			machine = console([0xA9, 0x02, 0x8D, 0x14, 0x40, 0x4C, 0x05, 0xC0])
+			machine.cpu.PC = 0xC000
+			machine.cpu.debug = debug
+			machine.cpu.run(until_pc=0xC005)
+			assert machine.cpu.cycles == (2 + 4 + 513) * 3, debug
+
+	def test_oamdata(self):
+		self.memory.write(0x2003, 0xFE)
+		for value in (0x11, 0x22, 0x33, 0xFF):
+			self.memory.write(0x2004, value)
+		# $FE is an attribute byte
+		assert self.ppu.oam[0xFE] == 0x11 & 0xE3 and self.ppu.oam[0xFF] == 0x22
+		assert self.ppu.oam[0x00] == 0x33 and self.ppu.oam[0x01] == 0xFF
+		assert self.ppu.oamaddr == 0x02
+
+	def test_sprite_index(self):
+		for size in (0x00, 0x20):
+			self.memory.write(0x2000, size)
+			height = 16 if size else 8
+			for seed in range(3):
+				self.randomOAM()
+				# crowd some lines past the limit
+				for sprite in range(0, 64, 5):
+					self.ppu.oam[sprite * 4] = 100
+				for line in range(240):
+					covering = [s for s in range(64) if 0 <= line - self.ppu.oam[s * 4] - 1 < height]
+					assert list(self.ppu.sprites.onLine(line)) == covering[:8], (size, line)
+					assert self.ppu.sprites.overflow[line] == (len(covering) > 8)
+
+	# reference for a pixel with sprites, from the palette index of the background under it
+	def spritePixel(self, line, x, background):
+		ppu = self.ppu
+		height = 16 if ppu.flag_sprite_size else 8
+		covering = [s for s in range(64) if 0 <= line - ppu.oam[s * 4] - 1 < height][:8]
+		for sprite in covering:
+			y, tile, attributes, left = ppu.oam[sprite * 4:sprite * 4 + 4]
+			if not left <= x < left + 8 or (x < 8 and not ppu.flag_show_left_sprites):
+				continue
+			row = line - y - 1
+			if attributes & 0x80:
+				row = height - 1 - row
+			if height == 16:
+				address = ((tile & 1) << 12) + ((tile & 0xFE) + (row >> 3)) * 16 + (row & 7)
+			else:
+				address = (ppu.flag_sprite_table << 12) + tile * 16 + row
+			bit = x - left if attributes & 0x40 else 7 - (x - left)
+			value = ((ppu.read(address) >> bit) & 1) | (((ppu.read(address + 8) >> bit) & 1) << 1)
+			if value:
+				if attributes & 0x20 and background:
+					break
+				return ppu.read(0x3F10 + (attributes & 3) * 4 + value)
+		return ppu.read(0x3F00 + background)
+
+	def test_sprites_match_reference(self):
+		for address in range(0x2000, 0x2400):
+			self.ppu.write(address, self.generator.randrange(256))
+		for address in range(0x3F00, 0x3F20):
+			self.ppu.write(address, self.generator.randrange(64))
+		for ctrl, mask in ((0x00, 0x1E), (0x28, 0x1E), (0x30, 0x18), (0x20, 0x10)):
+			self.randomOAM()
+			self.memory.write(0x2000, ctrl)
+			self.memory.write(0x2001, mask)
+			self.ppu.prepareFrame()
+			for line in range(240):
+				background = np.zeros(256, np.uint8)
+				self.ppu.renderer.renderBackground(background)
+				self.ppu.scanline = line
+				self.ppu.renderScanline()
+				expected = [self.spritePixel(line, x, int(background[x])) for x in range(256)]
+				assert list(self.ppu.renderer.pixels[line]) == expected, (ctrl, mask, line)
+
+	def setSpriteZero(self, y, x):
+		# CHR ROM is read-only, the tile is written to CHR RAM
+		self.nes = console([])
+		self.ppu = self.nes.ppu
+		self.memory = self.nes.cpu.memory
+		# solid tile 1 in pattern table 0 and a solid background from tile 1
+		for address in range(0x10, 0x20):
+			self.ppu.write(address, 0xFF)
+		for address in range(0x2000, 0x23C0):
+			self.ppu.write(address, 1)
+		self.ppu.oam[0:4] = bytes([y, 1, 0, x])
+		self.memory.write(0x2001, 0x1E)
+		self.ppu.prepareFrame()
+
+	def test_sprite_zero_hit(self):
+		self.setSpriteZero(49, 30)
+		# sprites are drawn a line below their Y
+		for line in range(52):
+			self.ppu.scanline = line
+			self.ppu.renderScanline()
+			assert self.ppu.flag_sprite_zero_hit == (line >= 50), line
+		self.ppu.endVBlank()
+		assert self.ppu.flag_sprite_zero_hit == 0
+
+	def test_sprite_zero_hit_predicted_mid_line(self):
+		self.setSpriteZero(99, 30)
+		machine = self.nes
+		# the hit lands on dot 31 of line 100
+		start = machine.ppu.cycleAt(100, 0) - 1
+		machine.cpu.cycles = start + 31
+		assert not machine.cpu.memory.read(0x2002) & 0x40
+		machine.cpu.cycles = start + 32
+		assert machine.cpu.memory.read(0x2002) & 0x40
+		assert machine.ppu.scanline == 100 and machine.ppu.cycle == 32
+
+	def test_oam_in_save_state(self):
+		self.randomOAM()
+		oam = bytes(self.ppu.oam)
+		state = self.nes.saveState()
+		self.memory.write(0x2003, 0)
+		self.memory.write(0x2004, 0x55)
+		self.nes.loadState(state)
+		assert bytes(self.ppu.oam) == oam
+		assert list(self.ppu.sprites.onLine(100)) == [s for s in range(64) if 0 <= 99 - oam[s * 4] < 8][:8]
+
+class FrameSkipTests(unittest.TestCase):
+	# console with a solid background, sprite zero on it and more than 8 sprites on some lines
+	def machine(self, renderInterval):
+		machine = console([])
+		ppu = machine.ppu
+		ppu.renderInterval = renderInterval
+		for address in range(0x10, 0x20):
+			ppu.write(address, 0xFF)
+		for address in range(0x2000, 0x23C0):
+			ppu.write(address, 1)
+		for address in range(0x3F00, 0x3F20):
+			ppu.write(address, address & 0x1F)
+		for sprite in range(64):
+			ppu.oam[sprite * 4:sprite * 4 + 4] = bytes([60 + (sprite % 6) * 10, 1, 0, sprite * 3])
+		machine.cpu.memory.write(0x2001, 0x1E)
+		return machine
+
+	def test_flags_match_drawn_frames(self):
+		drawn = self.machine(1)
+		headless = self.machine(0)
+		for line in range(262 * 2):
+			for machine in (drawn, headless):
+				machine.ppu.stepScanline()
+			state = [(machine.ppu.flag_sprite_zero_hit, machine.ppu.flag_sprite_overflow, machine.ppu.flag_vblank,
+			          machine.ppu.ppuaddr) for machine in (drawn, headless)]
+			assert state[0] == state[1], line
+			if line == 100:
+				assert drawn.ppu.flag_sprite_zero_hit and drawn.ppu.flag_sprite_overflow
+		assert drawn.ppu.renderer.pixels.any() and not headless.ppu.renderer.pixels.any()
+		# the flags of skipped lines do not bring the background bitmap up to date
+		assert drawn.ppu.renderer.background.layout is not None and headless.ppu.renderer.background.layout is None
+
+	def test_background_pixels_match_lines(self):
+		machine = nes.NES()
+		ppu = machine.ppu
+		generator = random.Random(3)
+		for address in range(0x2000, 0x3000):
+			ppu.write(address, generator.randrange(256))
+		machine.cpu.memory.write(0x2001, 0x1A)
+		indices = np.zeros(256, np.uint8)
+		for i in range(50):
+			# coarse Y up to 31 covers the attribute rows
+			ppu.ppuaddr = generator.randrange(0x8000)
+			ppu.fineX = generator.randrange(8)
+			ppu.flag_show_left_background = i & 1
+			ppu.flag_background_table = (i >> 1) & 1
+			ppu.renderer.renderBackground(indices)
+			assert ((ppu.renderer.backgroundPixels(0, 256) != 0) == (indices != 0)).all()
+			start = generator.randrange(256)
+			assert ((ppu.renderer.backgroundPixels(start, 8)[:256 - start] != 0) == (indices[start:start + 8] != 0)).all()
+
+	def test_interval_and_request(self):
+		machine = self.machine(3)
+		ppu = machine.ppu
+		drawing = []
+		for frame in range(6):
+			ppu.stepFrame()
+			drawing.append(ppu.drawing)
+		# stepFrame stops at the start of a frame, drawing is what was decided for frames 0 to 5
+		assert drawing == [True, False, False, True, False, False]
+		ppu.renderInterval = 0
+		ppu.renderer.pixels[:] = 0
+		ppu.stepFrame()
+		assert not ppu.drawing and not ppu.renderer.pixels.any()
+		ppu.requestFrame()
+		ppu.stepFrame()
+		assert ppu.drawing and ppu.renderer.pixels.any()
+		ppu.stepFrame()
+		assert not ppu.drawing
+
+class TileCacheTests(unittest.TestCase):
+	def setUp(self):
+		self.nes = nes.NES()
+		self.ppu = self.nes.ppu
+
+	def tile(self, index):
+		rows = []
+		for y in range(8):
+			low = self.ppu.read(index * 16 + y)
+			high = self.ppu.read(index * 16 + y + 8)
+			rows.append([((low >> (7 - x)) & 1) | (((high >> (7 - x)) & 1) << 1) for x in range(8)])
+		return rows
+
+	def test_built_from_chr(self):
+		for index in (0, 0x41, 0x1FF):
+			assert self.ppu.tiles.tiles[index].tolist() == self.tile(index)
+
+	def test_ppudata_write_updates_tile(self):
+		# CHR ROM ignores writes, the pattern tables of this console are CHR RAM
+		self.nes = console([])
+		self.ppu = self.nes.ppu
+		memory = self.nes.cpu.memory
+		memory.write(0x2006, 0x10)
+		memory.write(0x2006, 0x23)
+		memory.write(0x2007, 0xA5)
+		memory.write(0x2006, 0x10)
+		memory.write(0x2006, 0x2B)
+		memory.write(0x2007, 0xFF)
+		assert self.ppu.tiles.tiles[0x102, 3].tolist() == [3, 2, 3, 2, 2, 3, 2, 3]
+		assert self.ppu.tiles.tiles[0x102].tolist() == self.tile(0x102)
+
+	def test_restore_updates_chr_ram_tiles(self):
+		# one PRG bank and no CHR ROM, so the pattern tables are CHR RAM in PPU memory
+		console = nes.NES(rom.ROM(bytes([0x4e, 0x45, 0x53, 0x1a, 1, 0] + [0] * 10) + bytes(0x4000)))
+		state = console.saveState()
+		for address in range(0x200, 0x210):
+			console.ppu.write(address, 0xFF)
+		assert console.ppu.tiles.tiles[0x20].tolist() == [[3] * 8] * 8
+		console.loadState(state)
+		assert console.ppu.tiles.tiles[0x20].tolist() == [[0] * 8] * 8
+
+if __name__ == '__main__':
+	unittest.main()
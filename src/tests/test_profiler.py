@@ -0,0 +1,63 @@
+import unittest
+import os, sys
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import profiler
+
+class ProfilerTests(unittest.TestCase):
+	def setUp(self):
+		self.cpu = CPU()
+		self.cpu.debug = False
+		self.profiler = profiler.Profiler(self.cpu, interval=1)
+
+	def load(self, program):
+		for i, value in enumerate(program):
+			self.cpu.memory.write(0x200 + i, value)
+		self.cpu.PC = 0x200
+
+	def test_enable_and_disable(self):
+		dispatch = self.cpu.dispatch
+		self.profiler.enable()
+		assert self.cpu.dispatch is not dispatch and self.cpu.profiler is self.profiler
+		assert self.cpu.dispatch[0x69][0].__name__ == 'adc'
+		assert self.cpu.dispatch[0x02] is self.cpu.unmapped
+		self.profiler.disable()
+		assert self.cpu.dispatch is dispatch and self.cpu.profiler is None
+		assert 'getCrossPageCycles' not in vars(self.cpu.absoluteX)
+
+	def test_counts(self):
+		# LDX #$01, LDA $02FF,X, LDA $0210,X, DEX, BPL back to the first LDA taken once
+		self.load([0xA2, 0x01, 0xBD, 0xFF, 0x02, 0xBD, 0x10, 0x02, 0xCA, 0x10, 0xF7])
+		self.profiler.enable()
+		self.cpu.run(max_instructions=9)
+		report = self.profiler.report()
+		assert report['instructions'] == 9
+		assert report['cycles'] == self.cpu.cycles // 3
+		assert report['opcodes']['BD'] == {'name': 'lda', 'mode': 'AbsoluteX', 'count': 4, 'cycles': 4 * 4 + 1}
+		assert report['opcodes']['10']['count'] == 2
+		assert report['modes']['AbsoluteX'] == {'count': 4, 'cycles': 17}
+		assert report['crossPage'] == {'AbsoluteX': {'0': 3, '1': 1}}
+		assert report['hotPCs'][0][1] == 2
+		assert json.loads(self.profiler.toJSON()) == report
+
+	def test_same_result_as_unprofiled_run(self):
+		reference = CPU()
+		reference.PC = 0xc000
+		reference.debug = False
+		reference.run()
+		self.cpu.PC = 0xc000
+		self.profiler.enable()
+		self.cpu.run()
+		assert (self.cpu.PC, self.cpu.A, self.cpu.cycles) == (reference.PC, reference.A, reference.cycles)
+		assert self.profiler.report()['cycles'] == self.cpu.cycles // 3
+
+	def test_sampling(self):
+		sampled = profiler.Profiler(self.cpu, interval=4)
+		self.cpu.PC = 0xc000
+		sampled.enable()
+		self.cpu.run(max_instructions=400)
+		assert sum(count for pc, count in sampled.report(hot=1000)['hotPCs']) == 100
+
+if __name__ == '__main__':
+	unittest.main()
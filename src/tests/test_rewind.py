@@ -0,0 +1,62 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nes
+from rewind import Rewind
+
+class RewindTests(unittest.TestCase):
+	def setUp(self):
+		self.console = nes.NES()
+		self.console.cpu.PC = 0xC000
+		self.rewind = Rewind(self.console.cpu, self.console.ppu, keyframeInterval=8)
+
+	# run a frame's worth of nestest and checkpoint, returns the full state for comparison
+	def frame(self):
+		self.console.cpu.run(max_instructions=100)
+		self.rewind.checkpoint()
+		return bytes(self.console.saveState())
+
+	def test_rewind_restores_checkpoints(self):
+		states = [self.frame() for i in range(20)]
+		for frames in (1, 3, 9):
+			assert self.rewind.rewind(frames) == frames
+			del states[len(states) - frames:]
+			assert bytes(self.console.saveState()) == states[-1]
+		states.append(self.frame())
+		self.rewind.rewind(0)
+		assert bytes(self.console.saveState()) == states[-1]
+
+	def test_replay_after_rewind(self):
+		for i in range(5):
+			self.frame()
+		expected = [self.frame() for i in range(5)]
+		self.rewind.rewind(5)
+		assert [self.frame() for i in range(5)] == expected
+
+	def test_deltas_are_small(self):
+		for i in range(16):
+			self.frame()
+		keyframes = len(self.rewind.groups)
+		assert keyframes == 2
+		assert self.rewind.size < keyframes * len(self.rewind.groups[0].keyframe) * 1.1
+
+	def test_length_and_budget(self):
+		self.rewind.length = 10
+		for i in range(30):
+			self.frame()
+		assert 10 <= len(self.rewind) < 10 + 8
+		self.rewind.budget = 1
+		self.frame()
+		assert len(self.rewind.groups) == 1
+		checkpoints = len(self.rewind.groups[0].checkpoints)
+		assert self.rewind.rewind(100) == checkpoints
+		assert len(self.rewind) == 1
+
+	def test_close(self):
+		self.frame()
+		self.rewind.close()
+		memory = self.console.cpu.memory
+		assert not any(memory.markDirty in (watchers or ()) for watchers in memory.watchers)
+
+if __name__ == '__main__':
+	unittest.main()
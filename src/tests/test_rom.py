@@ -0,0 +1,93 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rom
+import nes
+from cpu import *
+
+def image(header, prg, chr, trainer=b''):
+	return bytes(header) + trainer + prg + chr
+
+class ROMTests(unittest.TestCase):
+	def test_nestest_header(self):
+		cartridge = rom.ROM()
+		assert cartridge.mapper == 0
+		assert not cartridge.nes2
+		assert cartridge.prg_rom_size == 1
+		assert cartridge.chr_rom_size == 1
+		assert len(cartridge.prg_rom) == 0x4000
+		assert len(cartridge.chr_banks) == 1
+		assert cartridge.mirroring == rom.HORIZONTAL
+		assert cartridge.trainer is None
+
+	def test_invalid(self):
+		self.assertRaises(Exception, rom.ROM, b'NEZ\x1a' + bytes(12))
+		self.assertRaises(Exception, rom.ROM, b'NES\x1a\x02' + bytes(11) + bytes(0x4000))
+
+	def test_ines_flags(self):
+		header = [0x4e, 0x45, 0x53, 0x1a, 2, 0, 0x17, 0x40, 0, 0, 0, 0, 0, 0, 0, 0]
+		prg = bytes(range(256)) * 128
+		cartridge = rom.ROM(image(header, prg, b'', b'\xaa' * 0x200))
+		assert cartridge.mapper == 0x41
+		assert cartridge.mirroring == rom.VERTICAL
+		assert cartridge.battery == 1
+		assert bytes(cartridge.trainer) == b'\xaa' * 0x200
+		assert bytes(cartridge.prg_rom) == prg
+		assert len(cartridge.prg_banks) == 2
+		assert cartridge.chr_ram_size == 0x2000
+		assert cartridge.prg_ram_size == 0x2000
+
+	def test_nes2_header(self):
+		header = [0x4e, 0x45, 0x53, 0x1a, 1, 0x09, 0x08, 0x18, 0x21, 0xF0, 0x07, 0x07, 0x01, 0, 0, 0]
+		cartridge = rom.ROM(image(header, bytes(0x4000), bytes(12)))
+		assert cartridge.nes2
+		assert cartridge.mapper == 0x110
+		assert cartridge.submapper == 2
+		assert cartridge.mirroring == rom.FOUR_SCREEN
+		# 2^2 * (1 * 2 + 1)
+		assert len(cartridge.chr_rom) == 12
+		assert cartridge.prg_ram_size == 64 << 7
+		assert cartridge.timing == 1
+
+	def test_zero_copy(self):
+		buffer = bytearray(image([0x4e, 0x45, 0x53, 0x1a, 1, 1] + [0] * 10, bytes(0x4000), bytes(0x2000)))
+		cartridge = rom.ROM(buffer)
+		buffer[16] = 0x5
+		assert cartridge.prg_rom[0] == 0x5
+		assert cartridge.prg_rom.obj is buffer
+
+	def test_prg_mapping(self):
+		cpu = CPU()
+		assert cpu.memory.read(0x8000) == cpu.memory.read(0xC000) == cpu.cartridge.prg_rom[0]
+		assert cpu.memory.read16(0xFFFC) == cpu.cartridge.prg_rom[0x3FFC] + (cpu.cartridge.prg_rom[0x3FFD] << 8)
+
+	def test_read_only_prg(self):
+		buffer = image([0x4e, 0x45, 0x53, 0x1a, 2, 0] + [0] * 10, bytes(range(256)) * 128, b'')
+		cpu = CPU(rom.ROM(buffer))
+		cpu.memory.write(0x8001, 0x55)
+		assert cpu.memory.read(0x8001) == 0x01
+		assert cpu.memory.read(0xC001) == 0x01
+
+	def test_stores_leave_rom_unchanged(self):
+		# a writable source buffer and the memory mapped file are mapped read-only alike
+		buffer = bytearray(image([0x4e, 0x45, 0x53, 0x1a, 2, 1] + [0] * 10, bytes(range(256)) * 128, b'\xaa' * 0x2000))
+		for console in (nes.NES(rom.ROM(buffer)), nes.NES()):
+			cartridge = console.cpu.cartridge
+			prg = bytes(cartridge.prg_rom)
+			chr = bytes(cartridge.chr_rom)
+			for address in range(0x8000, 0x10000, 0x101):
+				console.cpu.memory.write(address, 0x00)
+			console.ppu.write(0x0000, 0x55)
+			assert bytes(cartridge.prg_rom) == prg and bytes(cartridge.chr_rom) == chr
+			assert console.cpu.memory.read(0x8000) == prg[0]
+		assert buffer[16:16 + 0x8000] == bytes(range(256)) * 128
+
+	def test_chr_mapping(self):
+		console = nes.NES()
+		assert console.ppu.read(0x0010) == console.cpu.cartridge.chr_rom[0x10]
+		console.ppu.write(0x2005, 0x7)
+		assert console.ppu.read(0x2405) == 0x7
+		assert console.ppu.read(0x3005) == 0x7
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import nes
+
+REGISTERS = ('PC', 'A', 'X', 'Y', 'SP', 'C', 'Z', 'I', 'D', 'B', 'V', 'N', 'cycles')
+
+class SaveStateTests(unittest.TestCase):
+	def setUp(self):
+		self.cpu = CPU()
+		self.cpu.debug = False
+		self.cpu.PC = 0xC000
+
+	def state(self, cpu):
+		return [int(getattr(cpu, register)) for register in REGISTERS]
+
+	def test_restore_replays(self):
+		self.cpu.run(max_instructions=1000)
+		state = self.cpu.saveState()
+		registers = self.state(self.cpu)
+		self.cpu.run(max_instructions=2000)
+		expected = (self.state(self.cpu), bytes(self.cpu.memory.memory))
+
+		self.cpu.loadState(state)
+		assert self.state(self.cpu) == registers
+		self.cpu.run(max_instructions=2000)
+		assert (self.state(self.cpu), bytes(self.cpu.memory.memory)) == expected
+
+	def test_lazy_flags_cpu(self):
+		self.cpu.run(max_instructions=1500)
+		lazy = LazyFlagsCPU()
+		lazy.loadState(self.cpu.saveState())
+		assert self.state(lazy) == self.state(self.cpu)
+
+	def test_restore_invalidates_blocks(self):
+		# LDA #1; JMP $0200
+		program = [0xa9, 0x01, 0x4c, 0x00, 0x02]
+		for i, value in enumerate(program):
+			self.cpu.memory.write(0x200 + i, value)
+		self.cpu.PC = 0x200
+		state = self.cpu.saveState()
+		self.cpu.memory.write(0x201, 0x02)
+		self.cpu.run(max_instructions=2)
+		assert self.cpu.A == 0x02
+
+		self.cpu.loadState(state)
+		self.cpu.run(max_instructions=2)
+		assert self.cpu.A == 0x01
+
+	def test_console_state(self):
+		console = nes.NES()
+		console.ppu.write(0x2005, 0x42)
+		console.ppu.ppuaddr = 0x2005
+		console.ppu.scanline = 100
+		state = console.saveState()
+		console.ppu.write(0x2005, 0)
+		console.ppu.scanline = 0
+		console.loadState(state)
+		assert console.ppu.read(0x2005) == 0x42
+		assert console.ppu.ppuaddr == 0x2005
+		assert console.ppu.scanline == 100
+
+	def test_invalid_state(self):
+		with self.assertRaises(Exception):
+			self.cpu.loadState(b'NOPE' + bytes(64))
+		with self.assertRaises(Exception):
+			nes.NES().loadState(self.cpu.saveState())
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cpu
+import nes
+import scheduler
+
+class SchedulerTests(unittest.TestCase):
+	def setUp(self):
+		self.scheduler = scheduler.Scheduler()
+		self.log = []
+
+	def event(self, name):
+		return lambda: self.log.append(name)
+
+	def test_order(self):
+		self.scheduler.schedule(30, self.event('c'))
+		self.scheduler.schedule(10, self.event('a'))
+		self.scheduler.schedule(10, self.event('b'))
+		assert self.scheduler.next == 10
+		self.scheduler.run(9)
+		assert self.log == []
+		self.scheduler.run(20)
+		assert self.log == ['a', 'b'] and self.scheduler.next == 30
+		self.scheduler.run(30)
+		assert self.log == ['a', 'b', 'c'] and self.scheduler.next == scheduler.NEVER
+
+	def test_cancel_and_chain(self):
+		event = self.scheduler.schedule(5, self.event('cancelled'))
+		self.scheduler.cancel(event)
+		self.scheduler.schedule(8, lambda: self.scheduler.schedule(8, self.event('chained')))
+		self.scheduler.run(8)
+		assert self.log == ['chained']
+
+	def test_conversions(self):
+		assert scheduler.toDots(513) == 1539
+		assert scheduler.toCycles(1539) == 513 and scheduler.toCycles(1540) == 514
+
+	# events run at the first instruction boundary at or after their time, with or without blocks
+	def test_run_loop(self):
+		boundaries = []
+		for debug in (True, False):
+			processor = cpu.CPU()
+			processor.PC = 0xC000
+			processor.debug = debug
+			times = []
+			processor.scheduler.schedule(1000, lambda: times.append(processor.cycles))
+			processor.run(max_cycles=1000)
+			boundaries.append(times)
+		assert len(boundaries[0]) == 1 and 1000 <= boundaries[0][0] < 1000 + 7 * 3
+		assert boundaries[0] == boundaries[1]
+
+	def test_state_load_reschedules(self):
+		console = nes.NES()
+		state = console.saveState()
+		vblank = console.ppu.vblankEvent.time
+		console.ppu.stepFrame()
+		console.ppu.schedule()
+		assert console.ppu.vblankEvent.time != vblank
+		console.loadState(state)
+		assert console.ppu.vblankEvent.time == vblank and console.cpu.scheduler.next <= vblank
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import tracer
+
+class TraceRecorderTests(unittest.TestCase):
+	def setUp(self):
+		self.cpu = CPU()
+		self.cpu.PC = 0xc000
+
+	def test_record(self):
+		self.cpu.fetch()
+		records = list(self.cpu.trace.records())
+		assert records == [(0xc000, 0x4c, 0xf5, 0xc5, 0, 0, 0, 0x24, 0x1FF, 0)]
+
+	def test_format(self):
+		self.cpu.SP = 0x1FD
+		for x in range(3):
+			self.cpu.fetch()
+		lines = list(self.cpu.trace.lines())
+		assert lines[0] == 'C000  4C F5 C5  JMP $C5F5                       A:00 X:00 Y:00 P:24 SP:FD CYC:  0'
+		assert lines[1] == 'C5F5  A2 00     LDX #$00                        A:00 X:00 Y:00 P:24 SP:FD CYC:  9'
+		assert lines[2] == 'C5F7  86 00     STX $00                         A:00 X:00 Y:00 P:26 SP:FD CYC: 15'
+
+	def test_format_unofficial(self):
+		record = (0xc6f5, 0x3c, 0xa9, 0xa9, 0x55, 0, 0x53, 0x24, 0x1F1, 87)
+		assert self.cpu.trace.format(record).startswith('C6F5  3C A9 A9 *NOP $A9A9')
+
+	def test_ring_buffer(self):
+		self.cpu.trace = tracer.TraceRecorder(self.cpu, 4)
+		for x in range(10):
+			self.cpu.fetch()
+		assert len(self.cpu.trace) == 4
+		assert self.cpu.trace.count == 10
+		records = list(self.cpu.trace.records())
+		assert [record[-1] for record in records] == sorted(record[-1] for record in records)
+		last = list(self.cpu.trace.records(1))[0]
+		assert last == records[-1]
+
+	def test_matches_nestest(self):
+		self.cpu.SP = 0x1FD
+		self.cpu.run(max_instructions=1000)
+		expected = open('nestest.log.txt').read().splitlines()
+		for line, expectedLine in zip(self.cpu.trace.lines(), expected[:60]):
+			assert line[:14] == expectedLine[:14]
+			assert line[48:] == expectedLine[48:]
+
+if __name__ == '__main__':
+	unittest.main()
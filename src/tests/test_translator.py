@@ -0,0 +1,162 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import nes
+import scheduler
+import rom
+
+REGISTERS = ('PC', 'A', 'X', 'Y', 'SP', 'C', 'Z', 'I', 'D', 'B', 'V', 'N', 'cycles')
+
+# LDX #0; LDA $0300,X; CLC; ADC #1; STA $0300,X; INX; BNE $0202; JMP $0200
+LOOP = [0xa2, 0x00, 0xbd, 0x00, 0x03, 0x18, 0x69, 0x01, 0x9d, 0x00, 0x03, 0xe8, 0xd0, 0xf4, 0x4c, 0x00, 0x02]
+
+class TranslatorTests(unittest.TestCase):
+	def setUp(self):
+		self.cpu = CPU()
+		self.cpu.debug = False
+
+	def load(self, address, program):
+		for i, value in enumerate(program):
+			self.cpu.memory.write(address + i, value)
+
+	def state(self, cpu):
+		return [int(getattr(cpu, register)) for register in REGISTERS]
+
+	def test_block_matches_interpreter(self):
+		reference = CPU()
+		reference.debug = False
+		for cpu in (self.cpu, reference):
+			for i, value in enumerate(LOOP):
+				cpu.memory.write(0x200 + i, value)
+			cpu.memory.write(0x305, 0xFF)
+			cpu.PC = 0x200
+		executed = 0
+		while executed < 2000:
+			count = self.cpu.fetchBlock()
+			for i in range(count):
+				reference.fetch()
+			executed += count
+			assert self.state(self.cpu) == self.state(reference)
+		assert self.cpu.memory.memory == reference.memory.memory
+
+	def test_page_crossing_penalty(self):
+		# LDX #1; ADC $02FF,X; AND $02FF,X; NOP; unmapped
+		reference = CPU()
+		for cpu in (self.cpu, reference):
+			for i, value in enumerate([0xa2, 0x01, 0x7d, 0xff, 0x02, 0x3d, 0xff, 0x02, 0xea, 0x02]):
+				cpu.memory.write(0x200 + i, value)
+			cpu.PC = 0x200
+			cpu.run()
+		# 2 + 4 + 1 + 4 + 1 + 2 CPU cycles
+		assert self.cpu.cycles == reference.cycles == scheduler.toDots(14)
+
+	def test_block_ends_at_branch(self):
+		self.load(0x200, LOOP)
+		self.cpu.PC = 0x202
+		assert self.cpu.fetchBlock() == 6
+		assert self.cpu.PC == 0x202
+		block = self.cpu.translator.blocks[0x202]
+		assert (block.start, block.end) == (0x202, 0x20e)
+
+	def test_unmapped_opcode(self):
+		self.cpu.PC = 0x200
+		self.cpu.memory.write(0x200, 0x02)
+		self.assertRaises(Exception, self.cpu.fetchBlock)
+
+	def test_write_invalidates_block(self):
+		self.load(0x200, LOOP)
+		self.cpu.PC = 0x202
+		self.cpu.fetchBlock()
+		self.cpu.memory.write(0x207, 0x02)
+		assert 0x202 not in self.cpu.translator.blocks
+		self.cpu.PC = 0x202
+		self.cpu.fetchBlock()
+		assert self.cpu.memory.read(0x301) == 2
+
+	def test_self_modifying_block(self):
+		# LDA #$01; STA $0206; LDA #$05; NOP
+		self.load(0x200, [0xa9, 0x01, 0x8d, 0x06, 0x02, 0xa9, 0x05, 0xea, 0x02])
+		self.cpu.PC = 0x200
+		assert self.cpu.fetchBlock() == 2
+		assert self.cpu.PC == 0x205
+		self.cpu.fetchBlock()
+		assert self.cpu.A == 0x01
+		# INC $0303 turns the TYA after it into STA $EAEA,Y, the block exits after the INC with
+		# its flags, which the TYA would have overwritten
+		# INC $0303; TYA; NOP; NOP; JMP $0309
+		program = [0xee, 0x03, 0x03, 0x98, 0xea, 0xea, 0x4c, 0x09, 0x03, 0x02]
+		reference = CPU()
+		for cpu in (self.cpu, reference):
+			for i, value in enumerate(program):
+				cpu.memory.write(0x300 + i, value)
+			cpu.PC = 0x300
+			cpu.A, cpu.Y, cpu.Z, cpu.N = 0, 0, 1, 0
+			cpu.run()
+		assert (self.cpu.Z, self.cpu.N) == (reference.Z, reference.N) == (0, 1)
+
+# waits for two vblanks, enables NMI, then polls $10 which the NMI handler sets, counting frames in $11
+POLLING = [
+	0x2c, 0x02, 0x20, 0x10, 0xfb,  # C000 BIT $2002; BPL $C000
+	0x2c, 0x02, 0x20, 0x10, 0xfb,  # C005 BIT $2002; BPL $C005
+	0xa9, 0x80, 0x8d, 0x00, 0x20,  # C00A LDA #$80; STA $2000
+	0xa5, 0x10, 0xf0, 0xfc,        # C00F LDA $10; BEQ $C00F
+	0xa9, 0x00, 0x85, 0x10,        # C013 LDA #0; STA $10
+	0xe6, 0x11, 0x4c, 0x0f, 0xc0,  # C017 INC $11; JMP $C00F
+	0xe6, 0x10, 0x40,              # C01C NMI: INC $10; RTI
+]
+
+def console(program, nmi):
+	prg = bytearray(0x4000)
+	prg[:len(program)] = program
+	prg[0x3FFA:0x3FFE] = bytes([nmi & 0xFF, 0xC0 | (nmi >> 8), 0x00, 0xC0])
+	console = nes.NES(rom.ROM(bytes([0x4e, 0x45, 0x53, 0x1a, 1, 0] + [0] * 10) + bytes(prg)))
+	console.cpu.PC = 0xC000
+	return console
+
+class PollingTests(unittest.TestCase):
+	def test_detection(self):
+		cpu = console(POLLING, 0x1C).cpu
+		translator = cpu.translator
+		for start, idle, status in ((0xC000, True, True), (0xC00F, True, False), (0xC013, False, False)):
+			block = translator.compile(start)
+			assert (block.idle, block.status) == (idle, status)
+		# the loop has to go back to its start without changing what it reads
+		for program in ([0xe8, 0xd0, 0xfd], [0xa5, 0x10, 0x29, 0x01, 0xf0, 0xfa], [0xa5, 0x10, 0x65, 0x11, 0xd0, 0xfa],
+		                [0xb5, 0x10, 0xf0, 0xfc], [0xad, 0x07, 0x20, 0xf0, 0xfb]):
+			cpu = console(program, 0).cpu
+			assert cpu.translator.compile(0xC000).idle == (program[2] == 0x29)
+
+	def test_fast_forward_matches_interpreter(self):
+		fast = console(POLLING, 0x1C)
+		traced = console(POLLING, 0x1C)
+		traced.cpu.debug = True
+		for frame in range(4):
+			fast.runFrame()
+			traced.runFrame()
+			assert [int(getattr(fast.cpu, r)) for r in REGISTERS] == [int(getattr(traced.cpu, r)) for r in REGISTERS]
+			assert fast.cpu.memory.memory == traced.cpu.memory.memory
+			assert fast.ppu.clock == traced.ppu.clock
+		assert fast.cpu.memory.read(0x11) == 2
+		# instructions skipped over count towards limits
+		for cpu in (fast.cpu, traced.cpu):
+			cpu.run(max_instructions=5000)
+		assert (fast.cpu.PC, fast.cpu.cycles) == (traced.cpu.PC, traced.cpu.cycles)
+
+	def test_skips_iterations(self):
+		fast = console(POLLING, 0x1C)
+		for frame in range(3):
+			fast.runFrame()
+		ran = []
+		block = fast.cpu.translator.blocks[0xC00F]
+		function = block.function
+		def counted(*registers):
+			ran.append(1)
+			return function(*registers)
+		block.function = counted
+		fast.runFrame()
+		# the loop goes round twice after the vblank wait and after each return from the NMI
+		assert len(ran) < 10
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+import validator
+
+class ValidatorTests(unittest.TestCase):
+	def setUp(self):
+		self.cpu = CPU()
+		self.cpu.PC = 0xc000
+		self.cpu.SP = 0x1FD
+		self.cpu.debug = False
+
+	# nestest lines the CPU produces, from a separate run
+	def reference(self, count):
+		processor = CPU()
+		processor.PC = 0xc000
+		processor.SP = 0x1FD
+		processor.run(max_instructions=count)
+		return list(processor.trace.lines())
+
+	def test_parse_line(self):
+		line = 'C72A  A9 01     LDA #$01                        A:00 X:00 Y:00 P:27 SP:FB CYC: 17'
+		assert validator.parseLine(line) == (0xC72A, (0xA9, 0x01), 0, 0, 0, 0x27, 0xFB, 17)
+		assert validator.parseLine('') is None
+
+	def test_matches_nestest_log(self):
+		with open('nestest.log.txt') as log:
+			validation = validator.validate(self.cpu, log, limit=60)
+		assert validation.ok and validation.checked == 60
+
+	def test_divergence_with_context(self):
+		lines = self.reference(40)
+		lines[24] = lines[24].replace('Y:00', 'Y:01')
+		validation = validator.validate(self.cpu, lines, context=3)
+		divergence = validation.divergence
+		assert validation.checked == 24
+		assert divergence.line == 25 and divergence.fields == ['Y']
+		assert [number for number, text in divergence.context] == [22, 23, 24]
+		assert divergence.expected == lines[24] and divergence.actual == lines[24].replace('Y:01', 'Y:00')
+		assert str(divergence).startswith('line 25: Y differ')
+
+	def test_selected_fields(self):
+		lines = self.reference(20)
+		lines[5] = lines[5].replace('A:', 'A:1').replace('CYC:', 'CYC:1')
+		assert validator.validate(self.cpu, lines, fields=('PC', 'bytes', 'X', 'Y', 'P', 'SP')).ok
+
+	# the log is only read up to the divergence
+	def test_log_is_read_lazily(self):
+		lines = self.reference(30)
+		lines[9] = lines[9][:6] + '00' + lines[9][8:]
+		read = []
+		def log():
+			for line in lines:
+				read.append(line)
+				yield line
+		validation = validator.validate(self.cpu, log())
+		assert validation.divergence.fields == ['bytes']
+		assert len(read) == 10
+
+	def test_cpu_stops_early(self):
+		self.cpu.memory.write(0x0200, 0x02)
+		self.cpu.PC = 0x0200
+		validation = validator.validate(self.cpu, self.reference(2))
+		assert validation.checked == 0
+		assert validation.divergence.fields == [] and validation.divergence.actual is None
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import *
+from vector import VectorCPU, REGISTERS
+
+class VectorTests(unittest.TestCase):
+	def scalar(self, instructions):
+		reference = CPU()
+		reference.debug = False
+		reference.PC = 0xC000
+		for i in range(instructions):
+			reference.fetch()
+		return reference
+
+	def state(self, cpu):
+		return [int(getattr(cpu, register)) for register in REGISTERS]
+
+	def lane(self, vector, lane):
+		return [int(getattr(vector, register)[lane]) for register in REGISTERS]
+
+	def test_lanes_match_scalar(self):
+		# lanes start at different points of nestest, so they run different opcodes each step
+		offsets = [0, 1, 7, 100, 1000, 3000]
+		references = [self.scalar(offset) for offset in offsets]
+		vector = VectorCPU(len(offsets))
+		for lane, reference in enumerate(references):
+			vector.loadLane(lane, reference)
+		for step in range(2000):
+			vector.step()
+			for lane, reference in enumerate(references):
+				reference.fetch()
+				assert self.lane(vector, lane) == self.state(reference), (step, lane)
+		for lane, reference in enumerate(references):
+			assert bytes(vector.memory[lane, :0x800]) == bytes(reference.memory.memory[:0x800])
+
+	def test_trap_halts_lane(self):
+		vector = VectorCPU(2)
+		vector.PC[:] = 0xC000
+		vector.memory[1, 0x0300] = 0x02
+		vector.PC[1] = 0x0300
+		assert vector.step() == 2
+		assert list(vector.halted) == [False, True]
+		assert vector.PC[1] == 0x0300
+		assert vector.step() == 1
+
+	def test_writes_mirror_ram(self):
+		# LDA #$55; STA $0810; STA $8000; LDA $0010; trap
+		vector = VectorCPU(2)
+		for i, value in enumerate([0xa9, 0x55, 0x8d, 0x10, 0x08, 0x8d, 0x00, 0x80, 0xa5, 0x10, 0x02]):
+			vector.memory[:, 0x0300 + i] = value
+		vector.PC[:] = 0x0300
+		rom = bytes(vector.memory[0, 0x8000:])
+		vector.run(10)
+		assert list(vector.A) == [0x55, 0x55]
+		assert list(vector.memory[:, 0x0010]) == [0x55, 0x55]
+		assert bytes(vector.memory[0, 0x8000:]) == bytes(vector.memory[1, 0x8000:]) == rom
+
+	def test_run_stops_when_halted(self):
+		vector = VectorCPU(3)
+		vector.memory[:, 0x0300] = 0x02
+		vector.PC[:] = 0x0300
+		assert vector.run(10) == 1
+
+if __name__ == '__main__':
+	unittest.main()
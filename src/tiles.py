@@ -0,0 +1,45 @@
+# Decoded CHR tile cache
+# The 512 tiles of the two pattern tables are kept decoded as a (512, 8, 8) array of 2-bit pixel
+# values, so renderers look pixels up instead of combining bit planes. The cache is built when
+# CHR is mapped and the pattern table pages are watched, so a write through PPU.write or PPUDATA
+# re-decodes only the tile it lands in.
+import numpy as np
+
+TILE_COUNT = 512
+PATTERN_PAGES = 0x20
+
+# shift of each pixel in a pattern plane byte, bit 7 is the leftmost pixel
+BITS = np.arange(7, -1, -1, dtype=np.uint8)
+
+# pixel values for bit planes of shape (..., 2, 8), low plane first
+def decode(planes):
+	return ((planes[..., 0, :, None] >> BITS) & 1) | (((planes[..., 1, :, None] >> BITS) & 1) << 1)
+
+class TileCache:
+	def __init__(self, ppu):
+		self.ppu = ppu
+		self.tiles = np.zeros((TILE_COUNT, 8, 8), np.uint8)
+		# called with the index of each re-decoded tile, or None after a rebuild
+		self.listeners = []
+		for page in range(PATTERN_PAGES):
+			ppu.memory.watch(page, self.update)
+
+	# the pattern tables as a (512, 2, 8) array of bit planes
+	def planes(self):
+		pages = self.ppu.memory.readPages[:PATTERN_PAGES]
+		return np.concatenate([np.frombuffer(page, np.uint8) for page in pages]).reshape(TILE_COUNT, 2, 8)
+
+	# decode every tile, after CHR is mapped or banks are switched
+	def rebuild(self):
+		self.tiles[:] = decode(self.planes())
+		for listener in self.listeners:
+			listener(None)
+
+	# pattern table watcher, re-decodes the tile holding address
+	def update(self, address):
+		tile = (address >> 4) & (TILE_COUNT - 1)
+		page = self.ppu.memory.readPages[address >> 8]
+		start = (tile & 0x0F) << 4
+		self.tiles[tile] = decode(np.frombuffer(page, np.uint8)[start:start + 16].reshape(2, 8))
+		for listener in self.listeners:
+			listener(tile)
@@ -0,0 +1,125 @@
+# Instruction trace recorder
+# Each traced instruction is packed as a fixed-size binary record into a preallocated
+# ring buffer, so tracing can stay on and keep the last `capacity` instructions.
+# Records are only formatted as nestest-style text when they are read back.
+import struct
+
+# PC, opcode and two operand bytes, A, X, Y, P, SP, cycles
+RECORD = struct.Struct('<HBBBHHHBHQ')
+
+DEFAULT_CAPACITY = 0x10000
+
+# unofficial opcodes are marked with * in nestest logs
+OFFICIAL_NOP = 0xea
+
+# instruction bytes are peeked, so tracing neither trips read watchpoints nor touches IO registers,
+# which read as 0
+def peek(memory, address):
+	return memory.peek(address & 0xFFFF) or 0
+
+# record of the instruction at the CPU's PC with the state before it executes, in RECORD order
+def capture(cpu):
+	memory = cpu.memory
+	pc = cpu.PC
+	return (pc, peek(memory, pc), peek(memory, pc + 1), peek(memory, pc + 2),
+	        cpu.A, cpu.X, cpu.Y, cpu.getProcessorStatus(), cpu.SP, cpu.cycles)
+
+# bytes taken by an instruction from its dispatch table entry, including those the modes leave to the operation
+def instructionLength(entry):
+	instruction, mode, size, _ = entry
+	name = instruction.__name__.lstrip('_')
+	return size if size > 0 else 1 if name in ('brk', 'rti', 'rts', 'trap') else 3 if name[0] == 'j' else 2
+
+class TraceRecorder:
+	def __init__(self, cpu, capacity=DEFAULT_CAPACITY):
+		self.cpu = cpu
+		self.capacity = capacity
+		self.buffer = bytearray(RECORD.size * capacity)
+		self.end = len(self.buffer)
+		self.offset = 0
+		# total records written, including those since overwritten
+		self.count = 0
+		self.pack = RECORD.pack_into
+
+	def __len__(self):
+		return min(self.count, self.capacity)
+
+	# record the instruction at the CPU's PC along with the state before it executes
+	def record(self):
+		cpu = self.cpu
+		memory = cpu.memory
+		pc = cpu.PC
+		self.pack(self.buffer, self.offset, pc, peek(memory, pc), peek(memory, pc + 1), peek(memory, pc + 2),
+		          cpu.A, cpu.X, cpu.Y, cpu.getProcessorStatus(), cpu.SP, cpu.cycles)
+		self.offset += RECORD.size
+		if self.offset == self.end:
+			self.offset = 0
+		self.count += 1
+
+	# take back the last record, for an instruction that was stopped before it executed
+	def drop(self):
+		self.offset = (self.offset - RECORD.size) % self.end
+		self.count -= 1
+
+	def clear(self):
+		self.offset = 0
+		self.count = 0
+
+	# records oldest first, as (pc, opcode, operand1, operand2, a, x, y, p, sp, cycles)
+	def records(self, last=None):
+		count = len(self)
+		if last is not None:
+			count = min(count, last)
+		start = (self.offset - count * RECORD.size) % self.end
+		for i in range(count):
+			yield RECORD.unpack_from(self.buffer, (start + i * RECORD.size) % self.end)
+
+	def lines(self, last=None):
+		for record in self.records(last):
+			yield self.format(record)
+
+	def dump(self, file, last=None):
+		for line in self.lines(last):
+			file.write(line + '\n')
+
+	# nestest-style line for a record, operands are shown as encoded without the memory annotations
+	def format(self, record):
+		pc, opcode, operand1, operand2, a, x, y, p, sp, cycles = record
+		instruction, mode, size, _ = self.cpu.dispatch[opcode]
+		name = instruction.__name__.lstrip('_')
+		length = instructionLength(self.cpu.dispatch[opcode])
+		code = ' '.join('{:02X}'.format(b) for b in (opcode, operand1, operand2)[:length])
+		official = name != 'lax' and (name != 'nop' or opcode == OFFICIAL_NOP)
+		text = '{} {}'.format(name.upper(), self.formatOperand(pc, mode, operand1, operand2)).rstrip()
+		return '{:04X}  {:<8} {}{:<31} A:{:02X} X:{:02X} Y:{:02X} P:{:02X} SP:{:02X} CYC:{:>3}'.format(
+			pc, code, ' ' if official else '*', text, a, x, y, p, sp & 0xFF, cycles % 341)
+
+	def formatOperand(self, pc, mode, operand1, operand2):
+		kind = mode.__class__.__name__
+		operand16 = operand1 | (operand2 << 8)
+		if kind == 'Immediate':
+			return '#${:02X}'.format(operand1)
+		if kind == 'ZeroPage':
+			return '${:02X}'.format(operand1)
+		if kind == 'ZeroPageX':
+			return '${:02X},X'.format(operand1)
+		if kind == 'ZeroPageY':
+			return '${:02X},Y'.format(operand1)
+		if kind in ('Absolute', 'JumpAbsolute'):
+			return '${:04X}'.format(operand16)
+		if kind == 'AbsoluteX':
+			return '${:04X},X'.format(operand16)
+		if kind == 'AbsoluteY':
+			return '${:04X},Y'.format(operand16)
+		if kind == 'IndirectX':
+			return '(${:02X},X)'.format(operand1)
+		if kind == 'IndirectY':
+			return '(${:02X}),Y'.format(operand1)
+		if kind in ('Indirect', 'JumpIndirect'):
+			return '(${:04X})'.format(operand16)
+		if kind == 'Relative':
+			offset = operand1 - 256 if operand1 > 0x7F else operand1
+			return '${:04X}'.format((pc + offset + 2) & 0xFFFF)
+		if kind == 'Accumulator':
+			return 'A'
+		return ''
@@ -0,0 +1,699 @@
+# Basic-block translator
+# Straight-line runs of 6502 code are compiled into Python functions with the
+# addressing mode arithmetic from addressing.py and the operations from cpu.py
+# inlined, so a whole block runs with registers held in locals.
+# A block ends at a branch, JMP, JSR, RTS, RTI or BRK, before an unmapped opcode or a
+# breakpoint address, or after MAX_BLOCK_SIZE instructions. Operand bytes are baked into the generated
+# code, so cached blocks are invalidated when a write lands on their bytes.
+import scheduler
+
+MAX_BLOCK_SIZE = 32
+
+# register state passed in and out of a compiled block, in order
+REGISTERS = ('A', 'X', 'Y', 'SP', 'C', 'Z', 'I', 'D', 'B', 'V', 'N', 'cycles')
+
+FLAGS = ('C', 'Z', 'V', 'N')
+
+BRANCHES = {
+	'bcc': 'not C', 'bcs': 'C', 'beq': 'Z', 'bmi': 'N',
+	'bne': 'not Z', 'bpl': 'not N', 'bvc': 'not V', 'bvs': 'V',
+}
+
+BLOCK_END = set(BRANCHES) | {'jmp', 'jsr', 'rts', 'rti', 'brk'}
+
+# flags read by an operation, used to drop flag updates that are overwritten before use
+FLAG_READS = {
+	'adc': {'C'}, 'sbc': {'C'}, 'rol': {'C'}, 'ror': {'C'},
+	'php': set(FLAGS), 'brk': set(FLAGS),
+	'bcc': {'C'}, 'bcs': {'C'}, 'beq': {'Z'}, 'bne': {'Z'},
+	'bmi': {'N'}, 'bpl': {'N'}, 'bvc': {'V'}, 'bvs': {'V'},
+}
+
+# cross page penalty charged by each operation, in CPU cycles
+PENALTY = {
+	'adc': 1, '_and': 1, 'cmp': 1, 'eor': 1, 'lax': 1,
+	'lda': 1, 'ldx': 1, 'ldy': 1, 'ora': 1, 'sbc': 1,
+}
+
+# operations a polling loop may use, with the registers each reads and writes. A loop only
+# polls when every register it reads before writing it keeps its value across iterations.
+POLL_OPERATIONS = {
+	'lda': ('', 'A'), 'ldx': ('', 'X'), 'ldy': ('', 'Y'), 'bit': ('A', ''),
+	'cmp': ('A', ''), 'cpx': ('X', ''), 'cpy': ('Y', ''),
+	'_and': ('A', 'A'), 'ora': ('A', 'A'), 'eor': ('A', 'A'), 'nop': ('', ''),
+}
+
+# PPUSTATUS and its mirrors, the only register a polling loop may read
+PPUSTATUS_MASK = 0xE007
+PPUSTATUS = 0x2002
+
+STATUS = '((N << 7) | (V << 6) | 0x20 | (B << 4) | (D << 3) | (I << 2) | (Z << 1) | C) & 0xFF'
+
+class Instruction:
+	def __init__(self, address, name, mode, length, cycles, operand, operand16):
+		self.address = address
+		self.name = name
+		self.mode = mode
+		self.length = length
+		self.cycles = cycles
+		self.operand = operand
+		self.operand16 = operand16
+
+class Block:
+	def __init__(self, start, end, instructions):
+		self.start = start
+		self.end = end
+		self.instructions = instructions
+		self.function = None
+		self.length = len(instructions)
+		# upper bound on the PPU cycles a run through the block takes
+		self.cycles = 0
+		# set when a write invalidates the block, checked by the block itself after writes
+		self.stale = [False]
+		# set for a polling loop: a block branching back to its start that only reads memory nothing
+		# but scheduled events change, the run loop fast-forwards through its iterations
+		self.idle = False
+		# set when the loop reads PPUSTATUS, whose value also changes with the PPU's progress
+		self.status = False
+
+class Translator:
+	def __init__(self, cpu):
+		self.cpu = cpu
+		self.blocks = {}
+		# cached blocks by the pages their bytes cover
+		self.pages = {}
+		# addresses no block may contain, run through the dispatch table instead
+		self.breaks = set()
+
+	# execute the block at the current PC, returns the number of instructions executed
+	def step(self):
+		cpu = self.cpu
+		block = self.blocks.get(cpu.PC)
+		if block is None:
+			block = self.compile(cpu.PC)
+			if block is None:
+				cpu.fetch()
+				return 1
+		(cpu.PC, cpu.A, cpu.X, cpu.Y, cpu.SP, cpu.C, cpu.Z, cpu.I, cpu.D, cpu.B, cpu.V, cpu.N, cpu.cycles,
+		 count) = block.function(cpu.A, cpu.X, cpu.Y, cpu.SP, cpu.C, cpu.Z, cpu.I, cpu.D, cpu.B, cpu.V, cpu.N, cpu.cycles)
+		return count
+
+	# returns the cached block starting at pc, compiling it on a miss
+	def lookup(self, pc):
+		block = self.blocks.get(pc)
+		if block is None:
+			block = self.compile(pc)
+		return block
+
+	# compile and cache the block starting at pc, None if pc holds an unmapped opcode, is in breaks or
+	# is served by handlers
+	def compile(self, pc):
+		instructions = self.decode(pc)
+		if not instructions:
+			return None
+		last = instructions[-1]
+		block = Block(pc, last.address + last.length, instructions)
+		writer = BlockWriter(block)
+		source = writer.source()
+		block.cycles = writer.pending + writer.extra
+		self.detectPolling(block)
+		memory = self.cpu.memory
+		env = {'rp': memory.readPages, 'rh': memory.readHandlers, 'wp': memory.writePages, 'wh': memory.writeHandlers,
+		       'stale': block.stale, 'cpu': self.cpu}
+		exec(compile(source, '<block ${:04x}>'.format(pc), 'exec'), env)
+		block.function = env['block']
+
+		self.blocks[pc] = block
+		for page in range(block.start >> 8, ((block.end - 1) >> 8) + 1):
+			if page not in self.pages:
+				self.pages[page] = []
+				self.cpu.memory.watch(page, self.invalidate)
+			self.pages[page].append(block)
+		return block
+
+	def decode(self, pc):
+		cpu = self.cpu
+		memory = cpu.memory
+		instructions = []
+		predecoded = cpu.disassembly.instructions if cpu.disassembly is not None else {}
+		while len(instructions) < MAX_BLOCK_SIZE and pc < 0xFFFD and pc not in self.breaks:
+			decoded = predecoded.get(pc)
+			if decoded is not None:
+				instructions.append(decoded)
+				pc += decoded.length
+				if decoded.name in BLOCK_END:
+					break
+				continue
+			# code is peeked so decoding trips no read watchpoints, code served by handlers is left to fetch
+			opcode, operand, high = memory.peek(pc), memory.peek(pc + 1), memory.peek(pc + 2)
+			if opcode is None:
+				break
+			instruction, mode, size, cycles = cpu.dispatch[opcode]
+			name = instruction.__name__
+			if name == 'trap':
+				break
+			length = size if size > 0 else 3 if name[0] == 'j' else 2 if name in BRANCHES else 1
+			if None in (operand, high)[:length - 1]:
+				break
+			instructions.append(Instruction(pc, name, mode, length, cycles, operand or 0, (operand or 0) | ((high or 0) << 8)))
+			pc += length
+			if name in BLOCK_END:
+				break
+		return instructions
+
+	# mark block idle when it is a polling loop. Each iteration then takes block.cycles, its only
+	# extra being the taken branch back, and leaves the state as it found it.
+	def detectPolling(self, block):
+		last = block.instructions[-1]
+		kind = last.mode.__class__.__name__
+		if kind == 'Relative':
+			offset = last.operand - 256 if last.operand > 0x7F else last.operand
+			target = (last.address + offset + 2) & 0xFFFF
+		elif last.name == 'jmp' and kind == 'JumpAbsolute':
+			target = last.operand16
+		else:
+			return
+		if target != block.start:
+			return
+		memory = self.cpu.memory
+		body = block.instructions[:-1]
+		writes = {register for i in body for register in POLL_OPERATIONS.get(i.name, ('', ''))[1]}
+		written = set()
+		status = False
+		for i in body:
+			if i.name not in POLL_OPERATIONS:
+				return
+			reads, sets = POLL_OPERATIONS[i.name]
+			if any(register in writes and register not in written for register in reads):
+				return
+			written.update(sets)
+			kind = i.mode.__class__.__name__
+			if kind in ('ZeroPage', 'Absolute'):
+				address = i.operand & 0xFF if kind == 'ZeroPage' else i.operand16
+				if memory.readPages[address >> 8] is not None:
+					continue
+				if (address & PPUSTATUS_MASK) != PPUSTATUS or self.cpu.console is None:
+					return
+				status = True
+			elif kind not in ('Immediate', 'Implied'):
+				return
+		block.idle = True
+		block.status = status
+
+	# memory watcher, drops every cached block covering address
+	def invalidate(self, address):
+		page = address >> 8
+		for block in [b for b in self.pages.get(page, ()) if b.start <= address < b.end]:
+			block.stale[0] = True
+			del self.blocks[block.start]
+			for p in range(block.start >> 8, ((block.end - 1) >> 8) + 1):
+				self.pages[p].remove(block)
+				if not self.pages[p]:
+					del self.pages[p]
+					self.cpu.memory.unwatch(p, self.invalidate)
+
+	def flush(self):
+		for block in list(self.blocks.values()):
+			self.invalidate(block.start)
+
+# generates the source of a single block
+class BlockWriter:
+	def __init__(self, block):
+		self.block = block
+		self.lines = []
+		# PPU cycles accumulated since the last flush into the cycles local
+		self.pending = 0
+		# most PPU cycles added by page crossings and taken branches
+		self.extra = 0
+		self.count = 0
+
+	def source(self):
+		live = self.liveFlags()
+		for instruction, flags in zip(self.block.instructions, live):
+			self.instruction = instruction
+			self.live = flags
+			self.count += 1
+			self.pending += scheduler.toDots(instruction.cycles)
+			getattr(self, 'op' + instruction.name, self.opdefault)()
+		last = self.block.instructions[-1]
+		if last.name not in BLOCK_END:
+			self.exit(last.address + last.length)
+		body = '\n'.join('\t' + line for line in self.lines)
+		return 'def block({}):\n{}\n'.format(', '.join(REGISTERS), body)
+
+	# flags live after each instruction, working backwards from the block exit
+	def liveFlags(self):
+		live = set(FLAGS)
+		result = []
+		for instruction in reversed(self.block.instructions):
+			if self.mayExit(instruction):
+				# the block may exit right after it, where every flag is live
+				result.append(set(FLAGS))
+				live = set(FLAGS)
+			else:
+				result.append(live)
+				live = (live - self.flagWrites(instruction)) | FLAG_READS.get(instruction.name, set())
+		result.reverse()
+		return result
+
+	def flagWrites(self, instruction):
+		name = instruction.name
+		if name in ('plp', 'rti'):
+			return set(FLAGS)
+		if name in ('adc', 'sbc'):
+			return {'C', 'Z', 'V', 'N'}
+		if name in ('asl', 'lsr', 'rol', 'ror', 'cmp', 'cpx', 'cpy'):
+			return {'C', 'Z', 'N'}
+		if name == 'bit':
+			return {'Z', 'V', 'N'}
+		if name in ('clc', 'sec'):
+			return {'C'}
+		if name == 'clv':
+			return {'V'}
+		if name in ('_and', 'dec', 'dex', 'dey', 'eor', 'inc', 'inx', 'iny', 'lax', 'lda', 'ldx', 'ldy',
+		            'ora', 'pla', 'tax', 'tay', 'tsx', 'txa', 'tya'):
+			return {'Z', 'N'}
+		return set()
+
+	# instructions that write memory mid-block may invalidate the block and exit early
+	def mayExit(self, instruction):
+		if instruction.name in ('pha', 'php'):
+			return True
+		if instruction.name not in ('asl', 'dec', 'inc', 'lsr', 'rol', 'ror', 'sta', 'stx', 'sty'):
+			return False
+		address = self.staticAddress(instruction)
+		if address is None:
+			return instruction.mode.__class__.__name__ != 'Accumulator'
+		return self.block.start <= address < self.block.end
+
+	def staticAddress(self, instruction):
+		kind = instruction.mode.__class__.__name__
+		if kind == 'ZeroPage':
+			return instruction.operand & 0xFF
+		if kind == 'Absolute':
+			return instruction.operand16
+		return None
+
+	def emit(self, line):
+		self.lines.append(line)
+
+	def state(self, pc, extra=0):
+		if isinstance(pc, int):
+			pc = '0x{:04x}'.format(pc)
+		registers = ', '.join(REGISTERS[:-1])
+		return 'return ({}, {}, cycles + {}, {})'.format(pc, registers, self.pending + extra, self.count)
+
+	def exit(self, pc):
+		self.emit(self.state(pc))
+
+	def checkStale(self):
+		if self.mayExit(self.instruction):
+			self.emit('if stale[0]: ' + self.state(self.instruction.address + self.instruction.length))
+
+	# effective address of the current instruction, mirrors addressing.py
+	# returns an int when it is known at compile time, otherwise an expression
+	def address(self, store=False):
+		i = self.instruction
+		kind = i.mode.__class__.__name__
+		if kind == 'ZeroPage':
+			return i.operand & 0xFF
+		if kind == 'ZeroPageX':
+			return '(0x{:02x} + X) & 0xFF'.format(i.operand)
+		if kind == 'ZeroPageY':
+			return '(0x{:02x} + Y) & 0xFF'.format(i.operand)
+		if kind == 'Absolute':
+			return i.operand16
+		if kind == 'AbsoluteX':
+			return '0x{:04x} + X'.format(i.operand16)
+		if kind == 'AbsoluteY':
+			return '0x{:04x} + Y'.format(i.operand16) if store else '(0x{:04x} + Y) & 0xFFFF'.format(i.operand16)
+		if kind == 'IndirectX':
+			self.emit('t = (0x{:02x} + X) & 0xFF'.format(i.operand))
+			self.read('lo', 't')
+			self.read('hi', '(t + 1) & 0xFF')
+			return 'lo + (hi << 8)'
+		if kind == 'IndirectY':
+			self.read('lo', i.operand)
+			self.read('hi', (i.operand + 1) & 0xFF)
+			return '(lo + (hi << 8) + Y) & 0xFFFF'
+		raise Exception('No effective address for ' + kind)
+
+	# read a byte into target through the page tables
+	def read(self, target, address):
+		if isinstance(address, int):
+			page = address >> 8
+			self.emit('p = rp[0x{:02x}]'.format(page))
+			self.handler('{} = rh[0x{:02x}](0x{:04x})'.format(target, page, address))
+			self.emit('else: {} = p[0x{:02x}]'.format(target, address & 0xFF))
+		else:
+			self.emit('a = {}'.format(address))
+			self.emit('p = rp[a >> 8]')
+			self.handler('{} = rh[a >> 8](a)'.format(target))
+			self.emit('else: {} = p[a & 0xFF]'.format(target))
+
+	# write a byte through the page tables
+	def write(self, address, value):
+		if not isinstance(value, int):
+			value = '({}) & 0xFF'.format(value)
+		if isinstance(address, int):
+			page = address >> 8
+			self.emit('p = wp[0x{:02x}]'.format(page))
+			self.handler('wh[0x{:02x}](0x{:04x}, {})'.format(page, address, value))
+			self.emit('else: p[0x{:02x}] = {}'.format(address & 0xFF, value))
+		else:
+			self.emit('a = {}'.format(address))
+			self.emit('p = wp[a >> 8]')
+			self.handler('wh[a >> 8](a, {})'.format(value))
+			self.emit('else: p[a & 0xFF] = {}'.format(value))
+
+	# handler call for an unmapped page, cpu.PC and cpu.cycles are brought up to the start of the
+	# instruction for the handler and cycles it adds, like DMA stalls, are taken back
+	def handler(self, call):
+		start = self.pending - scheduler.toDots(self.instruction.cycles)
+		self.emit('if p is None:')
+		self.emit('\tcpu.PC = 0x{:04x}'.format(self.instruction.address))
+		self.emit('\tcpu.cycles = cycles + {}'.format(start))
+		self.emit('\t' + call)
+		self.emit('\tcycles = cpu.cycles - {}'.format(start))
+
+	# operand value, loaded into v
+	def load(self):
+		kind = self.instruction.mode.__class__.__name__
+		if kind == 'Immediate':
+			self.emit('v = {}'.format(self.instruction.operand))
+		elif kind == 'Accumulator':
+			self.emit('v = A')
+		else:
+			self.read('v', self.address())
+
+	def store(self, value):
+		kind = self.instruction.mode.__class__.__name__
+		if kind == 'Accumulator':
+			self.emit('A = ({}) & 0xFF'.format(value))
+		else:
+			self.write(self.address(True), value)
+			self.checkStale()
+
+	def penalty(self):
+		i = self.instruction
+		cycles = scheduler.toDots(PENALTY[i.name])
+		kind = i.mode.__class__.__name__
+		if kind in ('AbsoluteX', 'AbsoluteY'):
+			index = 'X' if kind == 'AbsoluteX' else 'Y'
+			self.emit('if {} > {}: cycles += {}'.format(index, 0xFF - (i.operand16 & 0xFF), cycles))
+			self.extra += cycles
+		elif kind == 'IndirectY':
+			if i.operand == 0xFF:
+				self.pending += cycles
+			else:
+				self.emit('if lo == 0xFF: cycles += {}'.format(cycles))
+				self.extra += cycles
+
+	def setZN(self, value):
+		if 'Z' in self.live:
+			self.emit('Z = 0 if ({}) & 0xFF else 1'.format(value))
+		if 'N' in self.live:
+			self.emit('N = (({}) & 0xFF) >> 7'.format(value))
+
+	def setFlag(self, flag, value):
+		if flag in self.live:
+			self.emit('{} = {}'.format(flag, value))
+
+	def push(self, value):
+		self.write('SP', value)
+		self.emit('SP -= 1')
+
+	def pop(self, target):
+		self.emit('SP += 1')
+		self.read(target, 'SP')
+
+	def opdefault(self):
+		raise Exception('Cannot translate ' + self.instruction.name)
+
+	def branch(self):
+		i = self.instruction
+		offset = i.operand - 256 if i.operand > 0x7F else i.operand
+		target = (i.address + offset + 2) & 0xFFFF
+		taken = scheduler.toDots(2 if ((i.address + 2) >> 8) != (target >> 8) else 1)
+		self.extra += taken
+		self.emit('if {}: {}'.format(BRANCHES[i.name], self.state(target, taken)))
+		self.exit(i.address + 2)
+
+	opbcc = opbcs = opbeq = opbmi = opbne = opbpl = opbvc = opbvs = branch
+
+	def opadc(self):
+		self.load()
+		self.emit('r = v + A + C')
+		self.setFlag('V', '((A ^ v) & 0x80 == 0) and ((A ^ r) & 0x80 == 0x80)')
+		self.emit('A = r & 0xFF')
+		self.setFlag('C', 'r > 0xFF')
+		self.setZN('r')
+		self.penalty()
+
+	def op_and(self):
+		self.load()
+		self.emit('A = v & A')
+		self.setZN('A')
+		self.penalty()
+
+	def opasl(self):
+		self.load()
+		self.emit('r = v << 1')
+		self.setFlag('C', 'r > 0xFF')
+		self.setZN('r')
+		self.store('r & 0xFF')
+
+	def opbit(self):
+		self.load()
+		self.setFlag('Z', 'int((v & A) == 0)')
+		self.setFlag('N', 'v >> 7 & 1')
+		self.setFlag('V', 'v >> 6 & 1')
+
+	def opbrk(self):
+		pc = self.instruction.address
+		self.push((pc >> 8) & 0xFF)
+		self.push(pc & 0xFF)
+		self.push(STATUS)
+		self.emit('B = 1')
+		self.read('lo', 0xFFFE)
+		self.read('hi', 0xFFFF)
+		self.exit('lo + (hi << 8)')
+
+	def opclc(self):
+		self.setFlag('C', 0)
+
+	def opcld(self):
+		self.emit('D = 0')
+
+	def opcli(self):
+		self.emit('I = 0')
+
+	def opclv(self):
+		self.setFlag('V', 0)
+
+	def compare(self, register):
+		self.load()
+		self.setFlag('C', '{} >= v'.format(register))
+		self.setZN('{} - v'.format(register))
+
+	def opcmp(self):
+		self.compare('A')
+		self.penalty()
+
+	def opcpx(self):
+		self.compare('X')
+
+	def opcpy(self):
+		self.compare('Y')
+
+	def opdec(self):
+		self.load()
+		self.emit('r = (v - 1) & 0xFF')
+		self.setZN('r')
+		self.store('r')
+
+	def opdex(self):
+		self.emit('X = (X - 1) & 0xFF')
+		self.setZN('X')
+
+	def opdey(self):
+		self.emit('Y = (Y - 1) & 0xFF')
+		self.setZN('Y')
+
+	def opeor(self):
+		self.load()
+		self.emit('A = A ^ v')
+		self.setZN('A')
+		self.penalty()
+
+	def opinc(self):
+		self.load()
+		self.emit('r = (v + 1) & 0xFF')
+		self.setZN('r')
+		self.store('r')
+
+	def opinx(self):
+		self.emit('X = (X + 1) & 0xFF')
+		self.setZN('X')
+
+	def opiny(self):
+		self.emit('Y = (Y + 1) & 0xFF')
+		self.setZN('Y')
+
+	def opjmp(self):
+		i = self.instruction
+		if i.mode.__class__.__name__ == 'JumpAbsolute':
+			self.exit(i.operand16)
+			return
+		# simulate the JMP ($xxFF) page wrap bug
+		pointer = i.operand16
+		high = pointer & 0xFF00 if pointer & 0xFF == 0xFF else pointer + 1
+		self.read('lo', pointer)
+		self.read('hi', high)
+		self.exit('lo + (hi << 8)')
+
+	def opjsr(self):
+		pc = self.instruction.address + 2
+		self.push((pc >> 8) & 0xFF)
+		self.push(pc & 0xFF)
+		self.exit(self.instruction.operand16)
+
+	def loadRegister(self, register):
+		self.load()
+		self.emit('{} = v'.format(register))
+		self.setZN('v')
+		self.penalty()
+
+	def oplax(self):
+		self.load()
+		self.emit('A = X = v')
+		self.setZN('v')
+		self.penalty()
+
+	def oplda(self):
+		self.loadRegister('A')
+
+	def opldx(self):
+		self.loadRegister('X')
+
+	def opldy(self):
+		self.loadRegister('Y')
+
+	def oplsr(self):
+		self.load()
+		self.emit('r = (v >> 1) & 0x7F')
+		self.setFlag('C', 'v & 1')
+		self.setZN('r')
+		self.store('r')
+
+	def opnop(self):
+		pass
+
+	def opora(self):
+		self.load()
+		self.emit('A = (A | v) & 0xFF')
+		self.setZN('A')
+		self.penalty()
+
+	def oppha(self):
+		self.push('A')
+		self.checkStale()
+
+	def opphp(self):
+		self.push(STATUS)
+		self.checkStale()
+
+	def oppla(self):
+		self.pop('A')
+		self.setZN('A')
+
+	def setStatus(self):
+		self.emit('N = (v >> 7) & 1')
+		self.emit('V = (v >> 6) & 1')
+		self.emit('B = (v >> 4) & 1')
+		self.emit('D = (v >> 3) & 1')
+		self.emit('I = (v >> 2) & 1')
+		self.emit('Z = (v >> 1) & 1')
+		self.emit('C = v & 1')
+
+	def opplp(self):
+		self.pop('v')
+		self.setStatus()
+
+	def oprol(self):
+		self.load()
+		self.emit('r = ((v << 1) | C) & 0xFF')
+		self.setFlag('C', '(v >> 7) & 1')
+		self.setFlag('Z', 'A == 0')
+		self.setFlag('N', '(r >> 7) & 1')
+		self.store('r')
+
+	def opror(self):
+		self.load()
+		self.emit('r = ((v >> 1) | (C << 7)) & 0xFF')
+		self.setFlag('C', 'v & 1')
+		self.setFlag('Z', 'A == 0')
+		self.setFlag('N', '(r >> 7) & 1')
+		self.store('r')
+
+	def oprti(self):
+		self.pop('v')
+		self.setStatus()
+		self.pop('lo')
+		self.pop('hi')
+		self.exit('lo + (hi << 8)')
+
+	def oprts(self):
+		self.pop('lo')
+		self.pop('hi')
+		self.exit('lo + (hi << 8) + 1')
+
+	def opsbc(self):
+		self.load()
+		self.emit('r = A - v - (1 - C)')
+		self.setFlag('C', 'r >> 8 == 0')
+		self.setFlag('V', 'int(((A ^ v) & 0x80 != 0) and ((A ^ r) & 0x80 != 0))')
+		self.emit('A = r & 0xFF')
+		self.setZN('r')
+		self.penalty()
+
+	def opsec(self):
+		self.setFlag('C', 1)
+
+	def opsed(self):
+		self.emit('D = 1')
+
+	def opsei(self):
+		self.emit('I = 1')
+
+	def opsta(self):
+		self.store('A')
+
+	def opstx(self):
+		self.store('X')
+
+	def opsty(self):
+		self.store('Y')
+
+	def optax(self):
+		self.emit('X = A')
+		self.setZN('X')
+
+	def optay(self):
+		self.emit('Y = A')
+		self.setZN('Y')
+
+	def optsx(self):
+		self.emit('X = SP')
+		self.setZN('X')
+
+	def optxa(self):
+		self.emit('A = X')
+		self.setZN('A')
+
+	def optxs(self):
+		self.emit('SP = 0x100 + (X & 0xFF)')
+
+	def optya(self):
+		self.emit('A = Y')
+		self.setZN('A')
@@ -0,0 +1,132 @@
+# Streaming trace validator
+# Runs the CPU against a reference trace like nestest.log and compares each instruction's state
+# with the matching log line as both are produced. The CPU side is a generator of trace records
+# and the log is parsed a line at a time, so nothing is written to disk and a run stops at the
+# first divergence, which is reported with the instructions before it.
+# Lines are compared field by field in the nestest layout: PC, instruction bytes, A, X, Y, P, SP
+# and CYC, the PPU dot. Disassembly text and memory annotations are not compared.
+import argparse
+import collections
+import re
+import sys
+
+import cpu
+import rom
+import tracer
+
+FIELDS = ('PC', 'bytes', 'A', 'X', 'Y', 'P', 'SP', 'CYC')
+
+# register values are not limited to two digits so an out of range register is reported, not skipped
+REGISTERS = re.compile(r'A:([0-9A-F]+) X:([0-9A-F]+) Y:([0-9A-F]+) P:([0-9A-F]+) SP:([0-9A-F]+).*CYC:\s*(-?\d+)')
+
+DEFAULT_CONTEXT = 5
+
+# field values of a nestest-style line in FIELDS order, None when it is not a trace line
+def parseLine(line):
+	match = REGISTERS.search(line)
+	if match is None or len(line) < 16:
+		return None
+	registers = match.groups()
+	return ((int(line[0:4], 16), tuple(int(byte, 16) for byte in line[6:14].split()))
+	        + tuple(int(value, 16) for value in registers[:5]) + (int(registers[5]),))
+
+# parsed lines of a log as (line number, text, fields), read as they are needed
+def parseLog(lines):
+	for number, line in enumerate(lines, 1):
+		line = line.rstrip('\r\n')
+		fields = parseLine(line)
+		if fields is not None:
+			yield number, line, fields
+
+# trace records of the instructions the CPU runs, each taken before the instruction executes,
+# until an unmapped opcode or limit instructions
+def records(processor, limit=None):
+	read = processor.memory.read
+	count = 0
+	while limit is None or count < limit:
+		if processor.dispatch[read(processor.PC)] is processor.unmapped:
+			return
+		yield tracer.capture(processor)
+		processor.fetch()
+		count += 1
+
+class Divergence:
+	# fields lists the fields that differ, or is empty when the CPU stopped before the log ended.
+	# context holds (line number, CPU line) for the instructions before it.
+	def __init__(self, line, fields, actual, expected, context):
+		self.line = line
+		self.fields = fields
+		self.actual = actual
+		self.expected = expected
+		self.context = context
+
+	def __str__(self):
+		if self.fields:
+			header = 'line {}: {} differ'.format(self.line, ', '.join(self.fields))
+		else:
+			header = 'line {}: CPU stopped before the log ended'.format(self.line)
+		lines = [header]
+		lines += ['  {:>6}  {}'.format(number, text) for number, text in self.context]
+		lines.append('> {:>6}  {}'.format(self.line, self.actual if self.actual is not None else '(stopped)'))
+		lines.append('  {:>6}  {}'.format('log', self.expected))
+		return '\n'.join(lines)
+
+class Validation:
+	def __init__(self, checked, divergence):
+		# instructions that matched the log
+		self.checked = checked
+		self.divergence = divergence
+
+	@property
+	def ok(self):
+		return self.divergence is None
+
+# run the CPU from its current state against log lines, any iterable of text lines such as an open
+# file, comparing the given fields. Stops at the first divergence, at the end of the log or after
+# limit instructions.
+def validate(processor, lines, fields=FIELDS, context=DEFAULT_CONTEXT, limit=None):
+	compared = [index for index, field in enumerate(FIELDS) if field in fields]
+	history = collections.deque(maxlen=context)
+	trace = records(processor, limit)
+	checked = 0
+	for number, expectedLine, expected in parseLog(lines):
+		if limit is not None and checked == limit:
+			break
+		record = next(trace, None)
+		if record is None:
+			return Validation(checked, Divergence(number, [], None, expectedLine, list(history)))
+		actualLine = processor.trace.format(record)
+		actual = parseLine(actualLine)
+		different = [FIELDS[index] for index in compared if actual[index] != expected[index]]
+		if different:
+			return Validation(checked, Divergence(number, different, actualLine, expectedLine, list(history)))
+		history.append((number, actualLine))
+		checked += 1
+	return Validation(checked, None)
+
+def main():
+	parser = argparse.ArgumentParser(description='Validate the CPU against a nestest-style trace log')
+	parser.add_argument('log', nargs='?', default='nestest.log.txt')
+	parser.add_argument('--rom', default=rom.filepath)
+	parser.add_argument('--pc', type=lambda value: int(value, 0), default=0xC000)
+	# nestest's log starts with SP at $FD
+	parser.add_argument('--sp', type=lambda value: int(value, 0), default=0x1FD)
+	parser.add_argument('--fields', default=','.join(FIELDS), help='comma separated fields to compare')
+	parser.add_argument('--context', type=int, default=DEFAULT_CONTEXT)
+	parser.add_argument('--limit', type=int)
+	args = parser.parse_args()
+
+	processor = cpu.CPU(rom.ROM(args.rom))
+	processor.PC = args.pc
+	processor.SP = 0x100 | (args.sp & 0xFF)
+	processor.debug = False
+	with open(args.log) as log:
+		validation = validate(processor, log, args.fields.split(','), args.context, args.limit)
+	print('{} instructions match'.format(validation.checked))
+	if not validation.ok:
+		print(validation.divergence)
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,446 @@
+# Lockstep vectorized CPU
+# Runs `count` independent instances of the CPU at once with NumPy. Registers are arrays with a
+# lane per instance and memory is a (count, 0x10000) array holding each instance's flat address
+# space, stores only reach the mirrored RAM. A step fetches the opcode of every lane and executes
+# each distinct opcode once, on the lanes that fetched it, so lanes that diverge only cost an
+# extra pass per distinct opcode.
+# Opcodes are decoded through CPU's dispatch table and the operations and addressing modes
+# follow cpu.py and addressing.py, quirks included, so every lane matches a scalar CPU.
+import numpy as np
+
+import cpu
+import scheduler
+import translator
+
+# condition for taking each branch, as (flag, value)
+BRANCHES = {
+	'bcc': ('C', 0), 'bcs': ('C', 1), 'beq': ('Z', 1), 'bmi': ('N', 1),
+	'bne': ('Z', 0), 'bpl': ('N', 0), 'bvc': ('V', 0), 'bvs': ('V', 1),
+}
+
+REGISTERS = ('PC', 'A', 'X', 'Y', 'SP', 'C', 'Z', 'I', 'D', 'B', 'V', 'N', 'cycles')
+
+# flat copy of a scalar CPU's address space, pages served by handlers read as 0
+def image(source):
+	flat = np.zeros(0x10000, np.uint8)
+	for page, view in enumerate(source.memory.readPages):
+		if view is not None:
+			flat[page << 8:(page + 1) << 8] = np.frombuffer(view, np.uint8)
+	return flat
+
+# RAM at $0000-$07FF is mirrored through $1FFF
+def mirrored(address):
+	return np.where(address < 0x2000, address & 0x7FF, address)
+
+class VectorCPU:
+	def __init__(self, count, cartridge=None):
+		reference = cpu.CPU(cartridge)
+		self.count = count
+		self.cartridge = reference.cartridge
+		# operation name, addressing mode name, size and cycles by opcode
+		self.operations = [(instruction.__name__, mode.__class__.__name__, size, cycles)
+		                   for instruction, mode, size, cycles in reference.dispatch]
+
+		# every lane starts from the scalar CPU's address space, cartridge included
+		self.memory = np.tile(image(reference), (count, 1))
+		for register in REGISTERS:
+			setattr(self, register, np.full(count, int(getattr(reference, register)), np.int64))
+		# lanes stopped on an unmapped opcode
+		self.halted = np.zeros(count, bool)
+
+	# copy the registers and address space of a scalar CPU into a lane
+	def loadLane(self, lane, source):
+		self.memory[lane] = image(source)
+		for register in REGISTERS:
+			getattr(self, register)[lane] = int(getattr(source, register))
+		self.halted[lane] = False
+
+	# execute one instruction on every running lane, returns the number of lanes that ran
+	def step(self):
+		active = np.flatnonzero(~self.halted)
+		if not len(active):
+			return 0
+		opcodes = self.memory[active, mirrored(self.PC[active])]
+		groups = np.unique(opcodes)
+		if len(groups) == 1:
+			self.execute(int(groups[0]), active)
+		else:
+			for opcode in groups:
+				self.execute(int(opcode), active[opcodes == opcode])
+		return len(active)
+
+	# step until every lane has halted or steps have run, returns the number of steps
+	def run(self, steps):
+		for i in range(steps):
+			if not self.step():
+				return i
+		return steps
+
+	def execute(self, opcode, lanes):
+		name, kind, size, cycles = self.operations[opcode]
+		if name == 'trap':
+			self.halted[lanes] = True
+			return
+		getattr(self, 'op' + name)(lanes, kind)
+		if size:
+			self.PC[lanes] = (self.PC[lanes] + size) & 0xFFFF
+		self.cycles[lanes] += scheduler.toDots(cycles)
+
+	def read(self, lanes, address):
+		return self.memory[lanes, mirrored(address)].astype(np.int64)
+
+	# writes land in RAM like memory.py maps it, anywhere else, PRG ROM included, they are dropped
+	def write(self, lanes, address, value):
+		lanes, address, value = np.broadcast_arrays(lanes, address & 0xFFFF, value)
+		ram = address < 0x2000
+		self.memory[lanes[ram], address[ram] & 0x7FF] = value[ram] & 0xFF
+
+	def operand(self, lanes):
+		return self.read(lanes, (self.PC[lanes] + 1) & 0xFFFF)
+
+	def operand16(self, lanes):
+		pc = self.PC[lanes]
+		return self.read(lanes, (pc + 1) & 0xFFFF) | (self.read(lanes, (pc + 2) & 0xFFFF) << 8)
+
+	# effective address and, for modes with a page crossing penalty, the lanes that cross
+	def address(self, lanes, kind):
+		if kind == 'ZeroPage':
+			return self.operand(lanes), None
+		if kind == 'ZeroPageX':
+			return (self.operand(lanes) + self.X[lanes]) & 0xFF, None
+		if kind == 'ZeroPageY':
+			return (self.operand(lanes) + self.Y[lanes]) & 0xFF, None
+		if kind == 'Absolute':
+			return self.operand16(lanes), None
+		if kind in ('AbsoluteX', 'AbsoluteY'):
+			base = self.operand16(lanes)
+			address = base + (self.X[lanes] if kind == 'AbsoluteX' else self.Y[lanes])
+			return address & 0xFFFF, (address >> 8) != (base >> 8)
+		if kind == 'IndirectX':
+			pointer = (self.operand(lanes) + self.X[lanes]) & 0xFF
+			return self.read(lanes, pointer) | (self.read(lanes, (pointer + 1) & 0xFF) << 8), None
+		if kind == 'IndirectY':
+			pointer = self.operand(lanes)
+			low = self.read(lanes, pointer)
+			address = (low + (self.read(lanes, (pointer + 1) & 0xFF) << 8) + self.Y[lanes]) & 0xFFFF
+			return address, (pointer == 0xFF) | (low == 0xFF)
+		raise Exception('No effective address for ' + kind)
+
+	# operand value, its address and the lanes that cross a page
+	def load(self, lanes, kind):
+		if kind == 'Immediate':
+			return self.operand(lanes), None, None
+		if kind == 'Accumulator':
+			return self.A[lanes], None, None
+		address, cross = self.address(lanes, kind)
+		return self.read(lanes, address), address, cross
+
+	def store(self, lanes, kind, address, value):
+		if kind == 'Accumulator':
+			self.A[lanes] = value & 0xFF
+		else:
+			self.write(lanes, address, value)
+
+	def penalty(self, lanes, name, cross):
+		if cross is not None:
+			self.cycles[lanes] += scheduler.toDots(translator.PENALTY[name]) * cross
+
+	def setZN(self, lanes, value):
+		self.Z[lanes] = (value & 0xFF) == 0
+		self.N[lanes] = (value & 0xFF) >> 7
+
+	def push(self, lanes, value):
+		self.write(lanes, self.SP[lanes], value)
+		self.SP[lanes] -= 1
+
+	def pop(self, lanes):
+		self.SP[lanes] += 1
+		return self.read(lanes, self.SP[lanes] & 0xFFFF)
+
+	def status(self, lanes):
+		return ((self.N[lanes] << 7) | (self.V[lanes] << 6) | 0x20 | (self.B[lanes] << 4) | (self.D[lanes] << 3)
+		        | (self.I[lanes] << 2) | (self.Z[lanes] << 1) | self.C[lanes]) & 0xFF
+
+	def setStatus(self, lanes, value):
+		self.N[lanes] = (value >> 7) & 1
+		self.V[lanes] = (value >> 6) & 1
+		self.B[lanes] = (value >> 4) & 1
+		self.D[lanes] = (value >> 3) & 1
+		self.I[lanes] = (value >> 2) & 1
+		self.Z[lanes] = (value >> 1) & 1
+		self.C[lanes] = value & 1
+
+	def branch(self, lanes, kind, name):
+		flag, value = BRANCHES[name]
+		taken = getattr(self, flag)[lanes] == value
+		pc = self.PC[lanes]
+		offset = self.operand(lanes)
+		target = (pc + offset - (offset > 0x7F) * 256 + 2) & 0xFFFF
+		self.PC[lanes] = np.where(taken, target, pc + 2)
+		self.cycles[lanes] += np.where(taken, np.where((pc + 2) >> 8 != target >> 8, scheduler.toDots(2), scheduler.toDots(1)), 0)
+
+	def opbcc(self, lanes, kind):
+		self.branch(lanes, kind, 'bcc')
+
+	def opbcs(self, lanes, kind):
+		self.branch(lanes, kind, 'bcs')
+
+	def opbeq(self, lanes, kind):
+		self.branch(lanes, kind, 'beq')
+
+	def opbmi(self, lanes, kind):
+		self.branch(lanes, kind, 'bmi')
+
+	def opbne(self, lanes, kind):
+		self.branch(lanes, kind, 'bne')
+
+	def opbpl(self, lanes, kind):
+		self.branch(lanes, kind, 'bpl')
+
+	def opbvc(self, lanes, kind):
+		self.branch(lanes, kind, 'bvc')
+
+	def opbvs(self, lanes, kind):
+		self.branch(lanes, kind, 'bvs')
+
+	def opadc(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		a = self.A[lanes]
+		result = value + a + self.C[lanes]
+		self.V[lanes] = (((a ^ value) & 0x80) == 0) & (((a ^ result) & 0x80) == 0x80)
+		self.A[lanes] = result & 0xFF
+		self.C[lanes] = result > 0xFF
+		self.setZN(lanes, result)
+		self.penalty(lanes, 'adc', cross)
+
+	def op_and(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		self.A[lanes] &= value
+		self.setZN(lanes, self.A[lanes])
+		self.penalty(lanes, '_and', cross)
+
+	def opasl(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		result = value << 1
+		self.C[lanes] = result > 0xFF
+		self.setZN(lanes, result)
+		self.store(lanes, kind, address, result)
+
+	def opbit(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		self.Z[lanes] = (value & self.A[lanes]) == 0
+		self.N[lanes] = (value >> 7) & 1
+		self.V[lanes] = (value >> 6) & 1
+
+	def opbrk(self, lanes, kind):
+		pc = self.PC[lanes]
+		self.push(lanes, (pc >> 8) & 0xFF)
+		self.push(lanes, pc & 0xFF)
+		self.push(lanes, self.status(lanes))
+		self.PC[lanes] = self.read(lanes, 0xFFFE) | (self.read(lanes, 0xFFFF) << 8)
+		self.B[lanes] = 1
+
+	def opclc(self, lanes, kind):
+		self.C[lanes] = 0
+
+	def opcld(self, lanes, kind):
+		self.D[lanes] = 0
+
+	def opcli(self, lanes, kind):
+		self.I[lanes] = 0
+
+	def opclv(self, lanes, kind):
+		self.V[lanes] = 0
+
+	def compare(self, lanes, kind, register):
+		value, address, cross = self.load(lanes, kind)
+		register = register[lanes]
+		self.C[lanes] = register >= value
+		self.setZN(lanes, register - value)
+		return cross
+
+	def opcmp(self, lanes, kind):
+		self.penalty(lanes, 'cmp', self.compare(lanes, kind, self.A))
+
+	def opcpx(self, lanes, kind):
+		self.compare(lanes, kind, self.X)
+
+	def opcpy(self, lanes, kind):
+		self.compare(lanes, kind, self.Y)
+
+	def opdec(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		result = (value - 1) & 0xFF
+		self.setZN(lanes, result)
+		self.store(lanes, kind, address, result)
+
+	def opdex(self, lanes, kind):
+		self.X[lanes] = (self.X[lanes] - 1) & 0xFF
+		self.setZN(lanes, self.X[lanes])
+
+	def opdey(self, lanes, kind):
+		self.Y[lanes] = (self.Y[lanes] - 1) & 0xFF
+		self.setZN(lanes, self.Y[lanes])
+
+	def opeor(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		self.A[lanes] ^= value
+		self.setZN(lanes, self.A[lanes])
+		self.penalty(lanes, 'eor', cross)
+
+	def opinc(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		result = (value + 1) & 0xFF
+		self.setZN(lanes, result)
+		self.store(lanes, kind, address, result)
+
+	def opinx(self, lanes, kind):
+		self.X[lanes] = (self.X[lanes] + 1) & 0xFF
+		self.setZN(lanes, self.X[lanes])
+
+	def opiny(self, lanes, kind):
+		self.Y[lanes] = (self.Y[lanes] + 1) & 0xFF
+		self.setZN(lanes, self.Y[lanes])
+
+	def opjmp(self, lanes, kind):
+		pointer = self.operand16(lanes)
+		if kind == 'JumpAbsolute':
+			self.PC[lanes] = pointer
+			return
+		# simulate the JMP ($xxFF) page wrap bug
+		high = np.where(pointer & 0xFF == 0xFF, pointer & 0xFF00, (pointer + 1) & 0xFFFF)
+		self.PC[lanes] = self.read(lanes, pointer) | (self.read(lanes, high) << 8)
+
+	def opjsr(self, lanes, kind):
+		pc = self.PC[lanes] + 2
+		self.push(lanes, (pc >> 8) & 0xFF)
+		self.push(lanes, pc & 0xFF)
+		self.PC[lanes] = self.operand16(lanes)
+
+	def oplax(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		self.A[lanes] = value
+		self.X[lanes] = value
+		self.setZN(lanes, value)
+		self.penalty(lanes, 'lax', cross)
+
+	def loadRegister(self, lanes, kind, register, name):
+		value, address, cross = self.load(lanes, kind)
+		register[lanes] = value
+		self.setZN(lanes, value)
+		self.penalty(lanes, name, cross)
+
+	def oplda(self, lanes, kind):
+		self.loadRegister(lanes, kind, self.A, 'lda')
+
+	def opldx(self, lanes, kind):
+		self.loadRegister(lanes, kind, self.X, 'ldx')
+
+	def opldy(self, lanes, kind):
+		self.loadRegister(lanes, kind, self.Y, 'ldy')
+
+	def oplsr(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		result = (value >> 1) & 0x7F
+		self.C[lanes] = value & 1
+		self.setZN(lanes, result)
+		self.store(lanes, kind, address, result)
+
+	def opnop(self, lanes, kind):
+		pass
+
+	def opora(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		self.A[lanes] = (self.A[lanes] | value) & 0xFF
+		self.setZN(lanes, self.A[lanes])
+		self.penalty(lanes, 'ora', cross)
+
+	def oppha(self, lanes, kind):
+		self.push(lanes, self.A[lanes])
+
+	def opphp(self, lanes, kind):
+		self.push(lanes, self.status(lanes))
+
+	def oppla(self, lanes, kind):
+		self.A[lanes] = self.pop(lanes)
+		self.setZN(lanes, self.A[lanes])
+
+	def opplp(self, lanes, kind):
+		self.setStatus(lanes, self.pop(lanes))
+
+	# rol and ror set Z from A rather than the result, as cpu.py does
+	def oprol(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		result = ((value << 1) | self.C[lanes]) & 0xFF
+		self.C[lanes] = (value >> 7) & 1
+		self.Z[lanes] = self.A[lanes] == 0
+		self.N[lanes] = (result >> 7) & 1
+		self.store(lanes, kind, address, result)
+
+	def opror(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		result = ((value >> 1) | (self.C[lanes] << 7)) & 0xFF
+		self.C[lanes] = value & 1
+		self.Z[lanes] = self.A[lanes] == 0
+		self.N[lanes] = (result >> 7) & 1
+		self.store(lanes, kind, address, result)
+
+	def oprti(self, lanes, kind):
+		self.setStatus(lanes, self.pop(lanes))
+		low = self.pop(lanes)
+		self.PC[lanes] = low + (self.pop(lanes) << 8)
+
+	def oprts(self, lanes, kind):
+		low = self.pop(lanes)
+		self.PC[lanes] = low + (self.pop(lanes) << 8) + 1
+
+	def opsbc(self, lanes, kind):
+		value, address, cross = self.load(lanes, kind)
+		a = self.A[lanes]
+		result = a - value - (1 - self.C[lanes])
+		self.C[lanes] = (result >> 8) == 0
+		self.V[lanes] = (((a ^ value) & 0x80) != 0) & (((a ^ result) & 0x80) != 0)
+		self.A[lanes] = result & 0xFF
+		self.setZN(lanes, result)
+		self.penalty(lanes, 'sbc', cross)
+
+	def opsec(self, lanes, kind):
+		self.C[lanes] = 1
+
+	def opsed(self, lanes, kind):
+		self.D[lanes] = 1
+
+	def opsei(self, lanes, kind):
+		self.I[lanes] = 1
+
+	def opsta(self, lanes, kind):
+		self.store(lanes, kind, self.address(lanes, kind)[0], self.A[lanes])
+
+	def opstx(self, lanes, kind):
+		self.store(lanes, kind, self.address(lanes, kind)[0], self.X[lanes])
+
+	def opsty(self, lanes, kind):
+		self.store(lanes, kind, self.address(lanes, kind)[0], self.Y[lanes])
+
+	def optax(self, lanes, kind):
+		self.X[lanes] = self.A[lanes]
+		self.setZN(lanes, self.X[lanes])
+
+	def optay(self, lanes, kind):
+		self.Y[lanes] = self.A[lanes]
+		self.setZN(lanes, self.Y[lanes])
+
+	def optsx(self, lanes, kind):
+		self.X[lanes] = self.SP[lanes]
+		self.setZN(lanes, self.X[lanes])
+
+	def optxa(self, lanes, kind):
+		self.A[lanes] = self.X[lanes]
+		self.setZN(lanes, self.A[lanes])
+
+	def optxs(self, lanes, kind):
+		self.SP[lanes] = 0x100 + (self.X[lanes] & 0xFF)
+
+	def optya(self, lanes, kind):
+		self.A[lanes] = self.Y[lanes]
+		self.setZN(lanes, self.A[lanes])